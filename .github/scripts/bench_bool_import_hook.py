@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Import-time benchmark: on-disk bool patching vs. the bool_import_hook loader.
+
+Each mode imports the target modules in a fresh interpreter (median of
+--repeat runs); only the import statements are timed:
+
+  unpatched   plain import of the original sources (warm __pycache__), baseline
+  disk        sources patched on disk with the same rules (warm __pycache__)
+  hook-cold   import hook, empty bytecode cache (rewrite + compile + store)
+  hook-warm   import hook, warm bytecode cache (includes loading the rule set)
+  startup     what the .pth adds to every interpreter start: importing the
+              hook module and installing the finder, before any import
+
+By default a synthetic site-packages tree with the bool patterns is generated,
+so the benchmark runs anywhere. With --site-packages the installed `mlc_llm`
+and `tvm` packages are copied to a scratch directory first (installed files
+are never touched) and --modules are imported instead.
+
+Usage:
+    python bench_bool_import_hook.py [--repeat 7] [--json out.json]
+    python bench_bool_import_hook.py --site-packages "$SITE" --modules mlc_llm.compiler_pass tvm.tir
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from bool_rules import BOOL_RULES
+from patch_manifest import PatchManifest
+from tree_patcher import expand_targets, patch_tree
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_OP_KERNEL = '''
+def kernel_{i}():
+    done = _var("bool")
+    pred_shared = T.alloc_buffer((1,), "bool", scope="shared")
+    pred_local = T.alloc_buffer((1,), "bool", scope="local")
+    done[0] = False
+    while T.Not(done[0]):
+        pred_shared[0] = p_child[0] >= uniform_sample[0] * q_child[0]
+        pred_local[0] = pred_shared[0]
+        if pred_local[0]:
+            done[0] = True
+        es[0] = 1 - total_sum_reduce[0] < pivot[pN - 1]
+'''
+
+_SAMPLING_KERNEL = '''
+def kernel_{i}():
+    def compare_bool_not_equal(a: T.bool, b: T.bool) -> T.bool:
+        return T.Cast("int8", a) != T.Cast("int8", b)
+    shared_buf = T.alloc_buffer((TX * TY,), "bool", scope="shared")
+    valid[v] = prob_local > threshold and idx < vocab_size
+    greater_than_u[v] = (
+        cumsum[ty * warp_elem + tx * thread_elem + v] + aggregate[()]
+        >= uniform_sample - eps
+    )
+    mask[v] = mask[v] and valid[v]
+    if mask_local[i]:
+        pass
+'''
+
+_PASS_KERNEL = '''
+def transform_{i}(body, blk):
+    x = tir.BlockRealize(iter_values=[], predicate=True, block=blk)
+    return tir.BlockRealize([], True, body)
+'''
+
+_STMT_KERNEL = '''
+class BlockRealize{i}:
+    def __init__(self, iter_values, predicate, block, span=None):
+        if isinstance(predicate, bool):
+            predicate = const(predicate, "bool")
+        self.predicate = predicate
+'''
+
+SYNTHETIC = {
+    'mlc_llm/op/batch_spec_verify.py': _OP_KERNEL,
+    'mlc_llm/op/top_p_pivot.py': _OP_KERNEL,
+    'tvm/relax/backend/gpu_generic/sampling.py': _SAMPLING_KERNEL,
+    'mlc_llm/compiler_pass/low_batch_specialization.py': _PASS_KERNEL,
+    'mlc_llm/compiler_pass/lift_global_buffer_alloc.py': _PASS_KERNEL,
+    'tvm/tir/stmt.py': _STMT_KERNEL,
+}
+
+
+def make_synthetic_site(root, kernels):
+    for relpath, template in SYNTHETIC.items():
+        path = os.path.join(root, *relpath.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(''.join(template.format(i=i) for i in range(kernels)))
+        # make every directory on the way an importable package
+        d = os.path.dirname(path)
+        while d != root:
+            init = os.path.join(d, '__init__.py')
+            if not os.path.exists(init):
+                open(init, 'w').close()
+            d = os.path.dirname(d)
+    return [r[:-3].replace('/', '.') for r in SYNTHETIC]
+
+
+def copy_installed_site(src_site, root):
+    for pkg in ('mlc_llm', 'tvm'):
+        src = os.path.join(src_site, pkg)
+        if os.path.isdir(src):
+            shutil.copytree(src, os.path.join(root, pkg), symlinks=True,
+                            ignore=shutil.ignore_patterns('__pycache__'))
+
+
+def time_import(site_root, modules, hook_cache=None):
+    setup = ''
+    if hook_cache is not None:
+        setup = f'import bool_import_hook; bool_import_hook.activate({hook_cache!r})\n'
+    code = (
+        'import sys, time, importlib\n'
+        f'sys.path.insert(0, {site_root!r}); sys.path.append({SCRIPTS_DIR!r})\n'
+        + setup +
+        't = time.perf_counter()\n'
+        f'for m in {modules!r}: importlib.import_module(m)\n'
+        'print(time.perf_counter() - t)\n'
+    )
+    # the plain-import modes must be able to use __pycache__ for a fair comparison
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    out = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True, env=env)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def time_startup():
+    code = (
+        'import sys, time\n'
+        f'sys.path.append({SCRIPTS_DIR!r})\n'
+        't = time.perf_counter()\n'
+        'import bool_import_hook; bool_import_hook._activate_from_pth()\n'
+        'print(time.perf_counter() - t)\n'
+    )
+    out = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def measure(site_root, modules, repeat, hook_cache=None, clear_cache=False):
+    samples = []
+    for _ in range(repeat):
+        if clear_cache:
+            shutil.rmtree(hook_cache, ignore_errors=True)
+        samples.append(time_import(site_root, modules, hook_cache))
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark on-disk bool patching vs. import hook')
+    parser.add_argument('--site-packages', default=None, help='copy mlc_llm/tvm from here instead of synthetic modules')
+    parser.add_argument('--modules', nargs='+', default=None, help='modules to import (with --site-packages)')
+    parser.add_argument('--kernels', type=int, default=200, help='synthetic kernels per module')
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--json', default=None, help='write results to this file')
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='bool-hook-bench-')
+    try:
+        original = os.path.join(work, 'original')
+        os.makedirs(original)
+        if args.site_packages:
+            copy_installed_site(args.site_packages, original)
+            modules = args.modules or ['mlc_llm.compiler_pass', 'tvm.tir']
+        else:
+            modules = make_synthetic_site(original, args.kernels)
+
+        patched = os.path.join(work, 'patched')
+        shutil.copytree(original, patched, symlinks=True)
+        manifest = PatchManifest(patched, 'bench', BOOL_RULES.fingerprint())
+        patch_tree(manifest, BOOL_RULES, expand_targets(patched, BOOL_RULES, ['mlc_llm', 'tvm']))
+
+        cache = os.path.join(work, 'hook-cache')
+        # warm __pycache__ for the plain-import modes
+        time_import(original, modules)
+        time_import(patched, modules)
+
+        results = {
+            'modules': modules,
+            'repeat': args.repeat,
+            'unpatched': measure(original, modules, args.repeat),
+            'disk': measure(patched, modules, args.repeat),
+            'hook-cold': measure(original, modules, args.repeat, cache, clear_cache=True),
+        }
+        time_import(original, modules, cache)
+        results['hook-warm'] = measure(original, modules, args.repeat, cache)
+        results['startup'] = statistics.median(time_startup() for _ in range(args.repeat))
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    print(f"Import time, median of {args.repeat} fresh interpreters ({', '.join(modules)}):")
+    base = results['unpatched']
+    for mode in ('unpatched', 'disk', 'hook-cold', 'hook-warm'):
+        t = results[mode]
+        print(f"  {mode:<10} {t * 1000:9.2f} ms  ({(t - base) * 1000:+.2f} ms vs unpatched)")
+    print(f"  {'startup':<10} {results['startup'] * 1000:9.2f} ms  (.pth cost per interpreter start)")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark: json.load + linear scan vs. the compdb_index sidecar, for
+compile_commands.json files of 5k to 50k entries.
+
+Synthetic databases imitate mlc-llm + TVM entries: long clang command lines
+with ~40 include/define flags. Each size is timed for:
+
+  json-scan      json.load the whole file and scan it for one file (old way)
+  index-build    build the sidecar index (once per compile_commands.json mtime)
+  index-lookup   open the existing index and fetch one entry by absolute path
+  index-suffix   open the existing index and fetch one entry by path suffix
+
+Median of --repeat runs, each in-process (the file stays in the page cache,
+which favours json-scan if anything).
+
+Usage:
+    python bench_compdb_index.py [--sizes 5000 10000 25000 50000] [--repeat 5] [--json out.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from compdb_index import CompDB, build_index
+
+FLAGS = ' '.join([f'-I/src/mlc-llm/3rdparty/tvm/3rdparty/dep{i}/include' for i in range(24)]
+                 + [f'-DTVM_FEATURE_{i}=1' for i in range(16)])
+
+
+def make_compdb(path, entries):
+    cmds = []
+    for i in range(entries):
+        sub = 'cpp/json_ffi/json_ffi_engine.cc' if i == entries // 2 else f'3rdparty/tvm/src/mod{i % 97}/file{i}.cc'
+        src = f'/src/mlc-llm/{sub}'
+        cmds.append({
+            'directory': '/src/mlc-llm/build',
+            'command': f'/usr/bin/clang++ {FLAGS} -std=c++17 -O3 -fPIC -o CMakeFiles/obj/{i}.o -c {src}',
+            'file': src,
+        })
+    with open(path, 'w') as f:
+        json.dump(cmds, f, indent=2)
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def bench_size(workdir, entries, repeat):
+    db = os.path.join(workdir, f'compile_commands_{entries}.json')
+    make_compdb(db, entries)
+    target = '/src/mlc-llm/cpp/json_ffi/json_ffi_engine.cc'
+
+    def json_scan():
+        with open(db) as f:
+            cmds = json.load(f)
+        hits = [e for e in cmds if e['file'].endswith('cpp/json_ffi/json_ffi_engine.cc')]
+        assert hits
+
+    def index_build():
+        build_index(db, db + '.idx')
+
+    def index_lookup():
+        with CompDB(db) as c:
+            assert c.lookup(target)
+
+    def index_suffix():
+        with CompDB(db) as c:
+            assert c.find_suffix('cpp/json_ffi/json_ffi_engine.cc')
+
+    result = {
+        'entries': entries,
+        'mb': round(os.path.getsize(db) / (1 << 20), 1),
+        'json-scan': timed(json_scan, repeat),
+        'index-build': timed(index_build, repeat),
+        'index-lookup': timed(index_lookup, repeat),
+        'index-suffix': timed(index_suffix, repeat),
+    }
+    os.remove(db)
+    os.remove(db + '.idx')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark compile_commands.json lookup with and without the index')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5000, 10000, 25000, 50000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', default=None, help='write results to this file')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='compdb-bench-')
+    try:
+        results = [bench_size(workdir, n, args.repeat) for n in args.sizes]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'entries':>8} {'MB':>6} {'json-scan':>11} {'index-build':>12} {'index-lookup':>13} {'index-suffix':>13} {'speedup':>8}")
+    for r in results:
+        print(f"{r['entries']:>8} {r['mb']:>6} {r['json-scan'] * 1000:>9.1f}ms {r['index-build'] * 1000:>10.1f}ms "
+              f"{r['index-lookup'] * 1000:>11.2f}ms {r['index-suffix'] * 1000:>11.2f}ms "
+              f"{r['json-scan'] / r['index-lookup']:>7.0f}x")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Import-hook alternative to patching mlc_llm / tvm sources on disk.
+
+A `sys.meta_path` finder intercepts the modules that have bool→int32 rules in
+scope (bool_rules.py), applies the same single-pass rewrite while the module
+loads, and caches the compiled bytecode keyed by
+
+    sha256(python magic + rule-set fingerprint + relpath + file path + original source)
+
+Relpath and path are part of the key because rules are scoped by relpath and
+the code object records its file: two byte-identical modules (empty
+`__init__.py` files, typically) must not share an entry.
+
+Cost: installed files are never modified, so reinstalling the wheels needs no
+re-patch step, but the hook is not free. The .pth only installs the finder;
+the rule set (every rule regex) and its fingerprint are loaded on the first
+import of a `mlc_llm` / `tvm` module, not at every interpreter start. A warm
+import of a claimed module reads and hashes the whole source before the
+cached code is unmarshalled, so it is slower than a plain import with a warm
+`__pycache__`. bench_bool_import_hook.py measures this: on its synthetic tree
+a warm hook import is about 15 ms slower than a plain one, mostly for loading
+the rule set, and the .pth adds about 5 ms to every interpreter start. A cold
+import also rewrites and compiles. Modules without rules in scope are left to
+the normal import machinery without even a path lookup.
+
+Usage:
+    # persistent: writes mlc_bool_hook.pth (+ a copy of the hook) into site-packages
+    python bool_import_hook.py --install [--site-packages DIR]
+    python bool_import_hook.py --uninstall [--site-packages DIR]
+    python bool_import_hook.py --status
+
+    # in-process
+    import bool_import_hook; bool_import_hook.activate()
+
+Environment:
+    MLC_BOOL_HOOK=0          disable the hook installed by the .pth file
+    MLC_BOOL_HOOK_CACHE=DIR  bytecode cache directory (default ~/.cache/mlc_bool_hook)
+"""
+import importlib.machinery
+import importlib.util
+import marshal
+import os
+import site
+import sys
+
+# argparse, hashlib, shutil and the rules are imported where they are used: the .pth
+# imports this module at every interpreter start, so module level stays minimal
+
+PTH_NAME = 'mlc_bool_hook.pth'
+HOOK_DIR_NAME = 'mlc_bool_hook'
+HOOK_MODULES = ('bool_import_hook.py', 'bool_rules.py', 'rewrite_rules.py', 'tree_patcher.py')
+# top-level packages bool_rules.py has scopes in; known up front so that start-up
+# does not have to load the rule set just to build the finder
+HOOK_TOP_LEVELS = frozenset(('mlc_llm', 'tvm'))
+
+
+def default_cache_dir():
+    return os.environ.get('MLC_BOOL_HOOK_CACHE') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'mlc_bool_hook')
+
+
+class BoolPatchLoader(importlib.machinery.SourceFileLoader):
+    """SourceFileLoader that rewrites the source and caches the result.
+
+    `get_code` is fully overridden, so the regular `__pycache__` entry (which
+    holds *unpatched* bytecode) is neither read nor written.
+    """
+
+    def __init__(self, fullname, path, relpath, finder):
+        super().__init__(fullname, path)
+        self.relpath = relpath
+        self.finder = finder
+
+    def get_code(self, fullname):
+        import hashlib
+        source = self.get_data(self.path)
+        key = hashlib.sha256(self.finder.key_prefix + self.relpath.encode('utf-8') + b'\0'
+                             + os.fsencode(self.path) + b'\0' + source).hexdigest()
+        cache_path = os.path.join(self.finder.cache_dir, key + '.code')
+        try:
+            with open(cache_path, 'rb') as f:
+                return marshal.loads(f.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+
+        result = self.finder.rules.rewrite(source.decode('utf-8'), self.relpath)
+        code = compile(result.text, self.path, 'exec', dont_inherit=True)
+        self.finder.misses += 1
+        from tree_patcher import atomic_write_bytes  # only on a miss: keeps warm imports light
+        try:
+            atomic_write_bytes(cache_path, marshal.dumps(code))
+        except OSError:
+            pass  # read-only cache: still correct, just not cached
+        return code
+
+
+class BoolPatchFinder:
+    """meta_path finder that only claims modules with rules in scope.
+
+    Without explicit `rules`, bool_rules.BOOL_RULES is loaded on the first
+    lookup of a module under HOOK_TOP_LEVELS.
+    """
+
+    def __init__(self, rules=None, cache_dir=None):
+        self._rules = rules
+        self._key_prefix = None
+        self.cache_dir = cache_dir or default_cache_dir()
+        if rules is None:
+            self.top_levels = HOOK_TOP_LEVELS
+        else:
+            self.top_levels = {scope.split('/', 1)[0] for scope in rules.scopes()}
+        self.misses = 0
+
+    @property
+    def rules(self):
+        if self._rules is None:
+            from bool_rules import BOOL_RULES
+            self._rules = BOOL_RULES
+        return self._rules
+
+    @property
+    def key_prefix(self):
+        if self._key_prefix is None:
+            self._key_prefix = importlib.util.MAGIC_NUMBER + self.rules.fingerprint().encode('ascii') + b'\0'
+        return self._key_prefix
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname.partition('.')[0] not in self.top_levels:
+            return None
+        base = fullname.replace('.', '/')
+        module_rel, package_rel = base + '.py', base + '/__init__.py'
+        in_scope = bool(self.rules.rules_for(module_rel)), bool(self.rules.rules_for(package_rel))
+        if not any(in_scope):
+            return None
+        spec = importlib.machinery.PathFinder.find_spec(fullname, path)
+        if spec is None or type(spec.loader) is not importlib.machinery.SourceFileLoader:
+            return None
+        relpath = package_rel if spec.submodule_search_locations is not None else module_rel
+        if not self.rules.rules_for(relpath):
+            return None
+        spec.loader = BoolPatchLoader(fullname, spec.origin, relpath, self)
+        return spec
+
+    def invalidate_caches(self):
+        pass
+
+
+def activate(cache_dir=None):
+    """Install the finder at the front of sys.meta_path (idempotent)."""
+    for finder in sys.meta_path:
+        if isinstance(finder, BoolPatchFinder):
+            return finder
+    finder = BoolPatchFinder(cache_dir=cache_dir)
+    sys.meta_path.insert(0, finder)
+    return finder
+
+
+def deactivate():
+    sys.meta_path[:] = [f for f in sys.meta_path if not isinstance(f, BoolPatchFinder)]
+
+
+def _activate_from_pth():
+    if os.environ.get('MLC_BOOL_HOOK', '1') != '0':
+        activate()
+
+
+def find_site_pkg():
+    for sp in site.getsitepackages():
+        if os.path.isdir(os.path.join(sp, 'mlc_llm')):
+            return sp
+    return site.getsitepackages()[0]
+
+
+def install(site_pkg):
+    """Copy the hook next to site-packages and register it through a .pth file.
+
+    The .pth adds the hook directory to sys.path (appended, so it never
+    shadows anything) and then activates the finder at interpreter start-up.
+    """
+    import shutil
+    here = os.path.dirname(os.path.abspath(__file__))
+    hook_dir = os.path.join(site_pkg, HOOK_DIR_NAME)
+    os.makedirs(hook_dir, exist_ok=True)
+    for name in HOOK_MODULES:
+        shutil.copy2(os.path.join(here, name), os.path.join(hook_dir, name))
+    with open(os.path.join(site_pkg, PTH_NAME), 'w') as f:
+        f.write(hook_dir + '\n')
+        f.write('import bool_import_hook; bool_import_hook._activate_from_pth()\n')
+    return hook_dir
+
+
+def uninstall(site_pkg):
+    import shutil
+    removed = False
+    pth = os.path.join(site_pkg, PTH_NAME)
+    if os.path.exists(pth):
+        os.remove(pth)
+        removed = True
+    hook_dir = os.path.join(site_pkg, HOOK_DIR_NAME)
+    if os.path.isdir(hook_dir):
+        shutil.rmtree(hook_dir)
+        removed = True
+    return removed
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='bool→int32 import hook for mlc_llm / tvm')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--install', action='store_true')
+    group.add_argument('--uninstall', action='store_true')
+    group.add_argument('--status', action='store_true')
+    parser.add_argument('--site-packages', default=None)
+    args = parser.parse_args()
+
+    from bool_rules import BOOL_RULES
+    site_pkg = args.site_packages or find_site_pkg()
+    if args.install:
+        hook_dir = install(site_pkg)
+        print(f"✅ Import hook installed: {os.path.join(site_pkg, PTH_NAME)} -> {hook_dir}")
+        print(f"   rule-set fingerprint: {BOOL_RULES.fingerprint()}")
+        print(f"   bytecode cache: {default_cache_dir()}")
+    elif args.uninstall:
+        if uninstall(site_pkg):
+            print(f"✅ Import hook removed from {site_pkg}")
+        else:
+            print(f"ℹ️  No import hook installed in {site_pkg}")
+    else:
+        installed = os.path.exists(os.path.join(site_pkg, PTH_NAME))
+        cache_dir = default_cache_dir()
+        cached = len([n for n in os.listdir(cache_dir) if n.endswith('.code')]) if os.path.isdir(cache_dir) else 0
+        print(f"site-packages: {site_pkg}")
+        print(f"installed: {installed}")
+        print(f"rule-set fingerprint: {BOOL_RULES.fingerprint()}")
+        print(f"cache: {cache_dir} ({cached} entries)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+bool → int32 rule table for the Metal `IntImm ... bool` bug (GitHub Issue #3389).
+
+Scopes are paths relative to site-packages. Rewrite rules are listed before
+the residual probes on purpose: a probe only counts text that no rewrite
+consumed (see rewrite_rules.py).
+"""
+import re
+
+from rewrite_rules import Rule, RuleSet
+
+BATCH_SPEC_VERIFY = 'mlc_llm/op/batch_spec_verify.py'
+TOP_P_PIVOT = 'mlc_llm/op/top_p_pivot.py'
+OP_FILES = (BATCH_SPEC_VERIFY, TOP_P_PIVOT)
+TVM_SAMPLING = 'tvm/relax/backend/gpu_generic/sampling.py'
+COMPILER_PASSES = 'mlc_llm/compiler_pass/*.py'
+TVM_STMT = 'tvm/tir/stmt.py'
+
+# 항상 True인 bool 표현식 (const(True, "bool")은 Metal 백엔드에서 실패)
+TRUE_EXPR = 'tir.const(1, "int32") > tir.const(0, "int32")'
+
+
+def _int32_buffer(m):
+    return m.group(0).replace('"bool"', '"int32"')
+
+
+def _stmt_predicate(m):
+    # 원래 들여쓰기를 유지한 채 const(predicate, "bool")을 비교 표현식으로 대체
+    ind = m.group(1)
+    return (
+        'if isinstance(predicate, bool):\n'
+        f'{ind}# Patched: avoid const(bool) issue on Metal backend\n'
+        f'{ind}# Use comparison expression instead of const(bool)\n'
+        f'{ind}from tvm import tir as _tir\n'
+        f'{ind}if predicate:\n'
+        f'{ind}    predicate = _tir.const(1, "int32") > _tir.const(0, "int32")\n'
+        f'{ind}else:\n'
+        f'{ind}    predicate = _tir.const(0, "int32") > _tir.const(1, "int32")'
+    )
+
+
+BOOL_RULES = RuleSet([
+    # --- mlc_llm/op: batch_spec_verify.py, top_p_pivot.py ---
+    Rule('var_bool', r'_var\("bool"\)', '_var("int32")', scope=OP_FILES),
+    Rule('shared_bool_buffer',
+         r'T\.alloc_buffer\(\s*\(\s*1\s*,\s*\)\s*,\s*"bool"\s*,\s*scope="shared"\)',
+         'T.alloc_buffer((1,), "int32", scope="shared")', scope=OP_FILES),
+    Rule('local_bool_buffer',
+         r'T\.alloc_buffer\(\s*\(\s*1\s*,\s*\)\s*,\s*"bool"\s*,\s*scope="local"\)',
+         'T.alloc_buffer((1,), "int32", scope="local")', scope=OP_FILES),
+    # pred_shared[0] = 비교식 -> T.Cast("int32", 비교식); 이미 캐스팅된 줄과
+    # True/False 대입은 제외 (아래 규칙이 처리)
+    Rule('pred_shared_cast',
+         r'pred_shared\[0\]\s*=\s*(?!\s|T\.Cast\b|True\b|False\b)(.+?)(\s*#.*)?$',
+         r'pred_shared[0] = T.Cast("int32", \1)\2',
+         scope=BATCH_SPEC_VERIFY, flags=re.MULTILINE),
+    Rule('while_not', r'while\s+T\.Not\((\w+)\[0\]\)\s*:',
+         r'while \1[0] == T.int32(0):', scope=OP_FILES),
+    Rule('assign_false', r'\[0\]\s*=\s*False', '[0] = T.int32(0)', scope=OP_FILES),
+    Rule('assign_true', r'\[0\]\s*=\s*True', '[0] = T.int32(1)', scope=OP_FILES),
+    Rule('not_flag', r'T\.Not\((\w+)\[0\]\)', r'\1[0] == T.int32(0)', scope=OP_FILES),
+    Rule('if_flag', r'if\s+(\w+)\[0\]\s*:', r'if \1[0] != T.int32(0):',
+         scope=BATCH_SPEC_VERIFY),
+    Rule('es_cast',
+         r'es\[0\]\s*=\s*1\s*-\s*total_sum_reduce\[0\]\s*<\s*pivot\[pN\s*-\s*1\]',
+         'es[0] = T.Cast("int32", 1 - total_sum_reduce[0] < pivot[pN - 1])',
+         scope=TOP_P_PIVOT, expect=1),
+
+    # --- tvm/relax/backend/gpu_generic/sampling.py ---
+    Rule('sampling_bool_buffer',
+         r'T\.alloc_buffer\(\s*\([^)]+\)\s*,\s*"bool"\s*,\s*scope="(?:shared|local)"\)',
+         _int32_buffer, scope=TVM_SAMPLING),
+    Rule('compare_bool_not_equal',
+         r'def compare_bool_not_equal\(a:\s*T\.bool,\s*b:\s*T\.bool\)\s*->\s*T\.bool:',
+         'def compare_bool_not_equal(a: T.int32, b: T.int32) -> T.int32:',
+         scope=TVM_SAMPLING, expect=1),
+    Rule('compare_return_cast',
+         r'return T\.Cast\("int8", a\) != T\.Cast\("int8", b\)',
+         'return T.Cast("int32", a != b)', scope=TVM_SAMPLING, expect=1),
+    Rule('valid_cast',
+         r'valid\[v\]\s*=\s*prob_local\s*>\s*threshold\s*and\s*idx\s*<\s*vocab_size',
+         'valid[v] = T.Cast("int32", prob_local > threshold and idx < vocab_size)',
+         scope=TVM_SAMPLING, expect=1),
+    # 여러 줄 표현식: 여는 괄호만 T.Cast("int32", 로 바꾸면 나머지는 그대로 유지됨
+    Rule('greater_than_u_cast', r'greater_than_u\[v\]\s*=\s*\((?=\s*\n\s*cumsum\[)',
+         'greater_than_u[v] = T.Cast("int32",', scope=TVM_SAMPLING, expect=1),
+    Rule('mask_cast', r'mask\[v\]\s*=\s*mask\[v\]\s*and\s*valid\[v\]',
+         'mask[v] = T.Cast("int32", mask[v] != 0 and valid[v] != 0)',
+         scope=TVM_SAMPLING, expect=1),
+    Rule('mask_local_if', r'if mask_local\[i\]:', 'if mask_local[i] != 0:',
+         scope=TVM_SAMPLING),
+
+    # --- mlc_llm/compiler_pass/*.py (low_batch_specialization, lift_global_buffer_alloc, ...) ---
+    Rule('predicate_true', r'predicate=True\b', f'predicate={TRUE_EXPR}', scope=COMPILER_PASSES),
+    Rule('block_realize_true', r'tir\.BlockRealize\(\[\], True,',
+         f'tir.BlockRealize([], {TRUE_EXPR},', scope=COMPILER_PASSES),
+
+    # --- tvm/tir/stmt.py: BlockRealize.__init__ ---
+    Rule('stmt_bool_predicate',
+         r'if isinstance\(predicate, bool\):\n([ \t]+)predicate = const\(predicate, "bool"\)',
+         _stmt_predicate, scope=TVM_STMT, expect=1),
+
+    # --- residual probes: must be zero after patching ---
+    Rule('residual_bool', r'"bool"', scope=OP_FILES, expect=0),
+    Rule('residual_not', r'T\.Not\(', scope=OP_FILES, expect=0),
+    Rule('residual_bool_buffer', r'T\.alloc_buffer\(\s*(?:\([^)]*\)|[^(),]+)\s*,\s*"bool"', scope=TVM_SAMPLING, expect=0),
+])
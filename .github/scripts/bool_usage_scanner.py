@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Indexed, parallel scanner for remaining bool usage in mlc_llm / tvm sources.
+
+Every .py file under the given roots is memory-mapped and searched for all
+patterns at once with one combined bytes regex, across a thread pool. Results
+are kept in an on-disk index keyed by (path, mtime_ns, size), so a rescan only
+opens files that changed since the last run; unchanged files cost one stat()
+from the directory walk.
+
+Output is structured, line-level JSON:
+
+    {"roots": [...], "files": N, "rescanned": M, "elapsed": s,
+     "hits": [{"path": ..., "line": 12, "pattern": "T.Not", "text": "..."}]}
+
+Usage:
+    python bool_usage_scanner.py [--site-packages DIR] [--roots mlc_llm tvm] [--json out.json]
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import site
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tree_patcher import atomic_write_bytes
+
+# name -> bytes regex. Alternatives are tried in this order at each position.
+DEFAULT_PATTERNS = {
+    'dtype="bool"': rb'dtype="bool"',
+    '"bool"': rb'"bool"',
+    'T.bool': rb'\bT\.bool\b',
+    'T.Not': rb'\bT\.Not\(',
+    'predicate=True': rb'\bpredicate=True\b',
+    'BlockRealize True': rb'\bBlockRealize\(\[\],\s*True\s*,',
+    'const bool': rb'\bconst\([^()\n]*,\s*"bool"\)',
+}
+
+INDEX_FORMAT = 1
+
+
+def default_index_dir():
+    return os.environ.get('MLC_BOOL_SCAN_CACHE') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'mlc_bool_scan')
+
+
+def patterns_fingerprint(patterns):
+    return hashlib.sha256(repr(sorted(patterns.items())).encode('utf-8')).hexdigest()[:16]
+
+
+def compile_patterns(patterns):
+    """({group index: name}, combined regex); each pattern is wrapped in one unnamed group.
+
+    A pattern's own groups (named or not) follow its wrapper, so the wrapper's
+    index is found by counting them; the wrapper closes last, so it is always
+    the match's lastindex.
+    """
+    names, parts, index = {}, [], 1
+    for name, regex in patterns.items():
+        names[index] = name
+        parts.append(b'(%s)' % regex)
+        index += 1 + re.compile(regex).groups
+    return names, re.compile(b'|'.join(parts))
+
+
+def iter_sources(roots, skip_tests=False):
+    """Yield (path, mtime_ns, size) for every .py file under `roots` (scandir walk)."""
+    stack = list(roots)
+    while stack:
+        d = stack.pop()
+        try:
+            it = os.scandir(d)
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name != '__pycache__':
+                            stack.append(entry.path)
+                    elif entry.name.endswith('.py'):
+                        if skip_tests and 'test' in entry.name:
+                            continue
+                        st = entry.stat()
+                        yield entry.path, st.st_mtime_ns, st.st_size
+                except OSError:
+                    continue
+
+
+def scan_file(path, names, combined):
+    """Return [(line, pattern_name, text)] for one file using mmap."""
+    hits = []
+    try:
+        with open(path, 'rb') as f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                return hits  # empty file
+    except OSError:
+        return hits
+    with mm:
+        line, last = 1, 0
+        for m in combined.finditer(mm):
+            start = m.start()
+            line += mm[last:start].count(b'\n')
+            last = start
+            bol = mm.rfind(b'\n', 0, start) + 1
+            eol = mm.find(b'\n', start)
+            text = mm[bol:eol if eol != -1 else len(mm)].decode('utf-8', 'replace').strip()
+            hits.append((line, names[m.lastindex], text))
+    return hits
+
+
+class ScanIndex:
+    """On-disk {path: [mtime_ns, size, hits]} map for one pattern set."""
+
+    def __init__(self, path, fingerprint):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.entries = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('format') == INDEX_FORMAT and data.get('patterns') == fingerprint:
+                self.entries = data['files']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def lookup(self, path, mtime_ns, size):
+        entry = self.entries.get(path)
+        if entry and entry[0] == mtime_ns and entry[1] == size:
+            return entry[2]
+        return None
+
+    def save(self, entries):
+        data = {'format': INDEX_FORMAT, 'patterns': self.fingerprint, 'files': entries}
+        try:
+            atomic_write_bytes(self.path, json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        except OSError as e:
+            print(f"⚠️  scan index not written ({self.path}): {e}", file=sys.stderr)
+
+
+def scan(roots, patterns=None, index_path=None, workers=None, skip_tests=False, use_index=True):
+    """Scan `roots` and return the structured result dict described above.
+
+    Hit paths are relative to the parent of each root (e.g. 'mlc_llm/op/x.py'
+    for a root of '<site-packages>/mlc_llm').
+    """
+    patterns = patterns or DEFAULT_PATTERNS
+    fingerprint = patterns_fingerprint(patterns)
+    names, combined = compile_patterns(patterns)
+    roots = [os.path.abspath(r) for r in roots]
+    if index_path is None:
+        key = hashlib.sha256('\0'.join(sorted(roots)).encode('utf-8')).hexdigest()[:16]
+        index_path = os.path.join(default_index_dir(), f'index-{key}-{fingerprint}.json')
+    index = ScanIndex(index_path, fingerprint) if use_index else ScanIndex(os.devnull, None)
+
+    started = time.perf_counter()
+    entries = {}
+    pending = []
+    for path, mtime_ns, size in iter_sources(roots, skip_tests):
+        cached = index.lookup(path, mtime_ns, size)
+        if cached is None:
+            pending.append((path, mtime_ns, size))
+        else:
+            entries[path] = [mtime_ns, size, cached]
+
+    if pending:
+        workers = workers or min(32, (os.cpu_count() or 1) + 4)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(lambda p: scan_file(p[0], names, combined), pending)
+            for (path, mtime_ns, size), hits in zip(pending, results):
+                entries[path] = [mtime_ns, size, hits]
+        if use_index:
+            index.save(entries)
+
+    def display(path):
+        for root in roots:
+            if path.startswith(root + os.sep):
+                return os.path.relpath(path, os.path.dirname(root)).replace(os.sep, '/')
+        return path
+
+    hits = []
+    for path in sorted(entries):
+        for line, pattern, text in entries[path][2]:
+            hits.append({'path': display(path), 'line': line, 'pattern': pattern, 'text': text})
+    return {
+        'roots': roots,
+        'files': len(entries),
+        'rescanned': len(pending),
+        'elapsed': round(time.perf_counter() - started, 4),
+        'hits': hits,
+    }
+
+
+def files_with_hits(result):
+    seen = []
+    for h in result['hits']:
+        if h['path'] not in seen:
+            seen.append(h['path'])
+    return seen
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find remaining bool usage in mlc_llm / tvm sources')
+    parser.add_argument('--site-packages', default=None)
+    parser.add_argument('--roots', nargs='+', default=['mlc_llm', 'tvm'],
+                        help='directories to scan, relative to site-packages or absolute')
+    parser.add_argument('--pattern', action='append', default=[], metavar='NAME=REGEX',
+                        help='custom pattern (repeatable); replaces the default set')
+    parser.add_argument('--json', default=None, help='write the JSON result here (default: stdout)')
+    parser.add_argument('--index', default=None, help='index file (default: under ~/.cache/mlc_bool_scan)')
+    parser.add_argument('--no-index', action='store_true')
+    parser.add_argument('--skip-tests', action='store_true')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    site_pkg = args.site_packages
+    if site_pkg is None:
+        site_pkg = next((sp for sp in site.getsitepackages()
+                         if os.path.isdir(os.path.join(sp, 'mlc_llm'))), site.getsitepackages()[0])
+    roots = [r if os.path.isabs(r) else os.path.join(site_pkg, r) for r in args.roots]
+
+    patterns = None
+    if args.pattern:
+        patterns = {}
+        for spec in args.pattern:
+            name, _, regex = spec.partition('=')
+            patterns[name] = regex.encode('utf-8')
+        try:
+            compile_patterns(patterns)
+        except re.error as e:
+            parser.error(f'--pattern: {e}')
+
+    result = scan(roots, patterns, args.index, args.workers, args.skip_tests, use_index=not args.no_index)
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"{len(result['hits'])} hits in {len(files_with_hits(result))} files "
+              f"({result['files']} scanned, {result['rescanned']} re-read, {result['elapsed'] * 1000:.1f}ms) -> {args.json}")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
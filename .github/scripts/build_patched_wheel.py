@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Build pre-patched mlc_llm / mlc-ai wheels, cached by input-wheel hash.
+
+Instead of installing the nightly wheel and mutating site-packages afterwards,
+this unpacks a downloaded wheel, runs the patch plan (patch_plan.py: bool
+fixes, batch_spec_verify replacement, ...) on the unpacked tree, installs the
+repo's json_ffi_engine.cc, and repacks it with a local version label
+(`0.1.dev0` -> `0.1.dev0+mlcpatch.<fingerprint>`) and a regenerated RECORD.
+Installing is then a single `pip install <patched wheel>` with no post-install
+step, and every runner with the same input wheel gets byte-identical files.
+
+Results are cached under ~/.cache/mlc_patched_wheels (MLC_PATCHED_WHEEL_CACHE)
+keyed by sha256(input wheel) + patch fingerprint (env_snapshot.py), so a
+rebuild for an unchanged wheel and unchanged patch scripts is a cache hit.
+
+Usage:
+    pip download --pre --no-deps -f https://mlc.ai/wheels -d wheels mlc-llm-nightly-cpu mlc-ai-nightly-cpu
+    python build_patched_wheel.py wheels/*.whl --out patched-wheels
+    pip install patched-wheels/*.whl
+"""
+import argparse
+import base64
+import csv
+import hashlib
+import io
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+from env_snapshot import patch_fingerprint
+from patch_manifest import MANIFEST_NAME
+from patch_plan import PlanRun, build_units
+from tree_patcher import atomic_writer
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+JSONFFI_SOURCE = os.path.join(SCRIPTS_DIR, os.pardir, 'patches', 'json_ffi_engine.cc')
+JSONFFI_TARGET = 'mlc_llm/cpp/json_ffi/json_ffi_engine.cc'
+LOCAL_LABEL = 'mlcpatch'
+
+
+def default_cache():
+    return os.environ.get('MLC_PATCHED_WHEEL_CACHE') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'mlc_patched_wheels')
+
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def record_hash(data):
+    return 'sha256=' + base64.urlsafe_b64encode(hashlib.sha256(data).digest()).rstrip(b'=').decode('ascii')
+
+
+def patched_version(version, fingerprint):
+    """PEP 440 local version: append to an existing local label if there is one."""
+    label = f'{LOCAL_LABEL}.{fingerprint[:8]}'
+    return f'{version}.{label}' if '+' in version else f'{version}+{label}'
+
+
+def find_dist_info(names):
+    dist_infos = {n.split('/', 1)[0] for n in names if re.match(r'[^/]+\.dist-info/', n)}
+    if len(dist_infos) != 1:
+        raise ValueError(f'expected one .dist-info directory, found {sorted(dist_infos)}')
+    return dist_infos.pop()
+
+
+def apply_patches(root, batch_spec):
+    """Run the patch plan on an unpacked wheel. Returns {unit: status}."""
+    units = build_units(batch_spec)
+    run = PlanRun(root, units, batch_spec, workers=4)
+    results = run.execute()
+    statuses = {u.name: results[u.name]['status'] for u in units if u.superseded_by is None}
+    if os.path.isdir(os.path.join(root, 'mlc_llm')) and os.path.exists(JSONFFI_SOURCE):
+        target = os.path.join(root, *JSONFFI_TARGET.split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(JSONFFI_SOURCE, target)
+        statuses['jsonffi:engine_source'] = 'applied'
+    manifest = os.path.join(root, MANIFEST_NAME)
+    if os.path.exists(manifest):
+        os.remove(manifest)  # bookkeeping of this build, not part of the package
+    return statuses
+
+
+def repack(src_wheel, root, out_path, fingerprint):
+    """Write the patched tree as a wheel with a bumped version and fresh RECORD."""
+    with zipfile.ZipFile(src_wheel) as zin:
+        infos = [i for i in zin.infolist() if not i.is_dir()]
+    old_dist_info = find_dist_info([i.filename for i in infos])
+    name, version = old_dist_info[:-len('.dist-info')].rsplit('-', 1)
+    new_version = patched_version(version, fingerprint)
+    new_dist_info = f'{name}-{new_version}.dist-info'
+    renames = {old_dist_info: new_dist_info, f'{name}-{version}.data': f'{name}-{new_version}.data'}
+
+    def renamed(arcname):
+        top, sep, rest = arcname.partition('/')
+        return renames.get(top, top) + sep + rest
+
+    # keep the original order and timestamps; add files the patches created (reproducibly)
+    entries = [(i.filename, renamed(i.filename), i.date_time, i.external_attr) for i in infos]
+    known = {i.filename for i in infos}
+    for dirpath, _, filenames in os.walk(root):
+        for fn in sorted(filenames):
+            arc = os.path.relpath(os.path.join(dirpath, fn), root).replace(os.sep, '/')
+            if arc not in known:
+                entries.append((arc, renamed(arc), infos[0].date_time, 0o100644 << 16))
+
+    record_name = f'{new_dist_info}/RECORD'
+    rows = []
+    with atomic_writer(out_path) as fout, zipfile.ZipFile(fout, 'w', zipfile.ZIP_DEFLATED) as zout:
+        for src, arc, date_time, attr in entries:
+            if arc == record_name:
+                continue
+            with open(os.path.join(root, *src.split('/')), 'rb') as f:
+                data = f.read()
+            if arc == f'{new_dist_info}/METADATA':
+                data = re.sub(rb'(?m)^Version: .*$', f'Version: {new_version}'.encode('ascii'), data, count=1)
+            info = zipfile.ZipInfo(arc, date_time=date_time)
+            info.external_attr = attr
+            info.compress_type = zipfile.ZIP_DEFLATED
+            zout.writestr(info, data)
+            rows.append((arc, record_hash(data), str(len(data))))
+        rows.append((record_name, '', ''))
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator='\n').writerows(rows)
+        zout.writestr(zipfile.ZipInfo(record_name, date_time=entries[-1][2]), buf.getvalue())
+    return new_version
+
+
+def output_name(wheel_path, new_version):
+    # {distribution}-{version}(-{build})?-{python}-{abi}-{platform}.whl
+    parts = os.path.basename(wheel_path)[:-len('.whl')].split('-')
+    parts[1] = new_version.replace('-', '_')
+    return '-'.join(parts) + '.whl'
+
+
+def build(wheel_path, cache_dir, batch_spec='stub', force=False):
+    """Return (patched wheel path, cache hit?, unit statuses)."""
+    fingerprint = patch_fingerprint()
+    key = hashlib.sha256(f'{sha256_file(wheel_path)}:{fingerprint}:{batch_spec}'.encode('ascii')).hexdigest()[:24]
+    entry = os.path.join(cache_dir, key)
+    if not force and os.path.isdir(entry):
+        cached = [n for n in os.listdir(entry) if n.endswith('.whl') and not n.startswith('.')]
+        if cached:
+            return os.path.join(entry, cached[0]), True, {}
+
+    work = tempfile.mkdtemp(prefix='mlc-wheel-')
+    try:
+        with zipfile.ZipFile(wheel_path) as z:
+            z.extractall(work)
+        statuses = apply_patches(work, batch_spec)
+        os.makedirs(entry, exist_ok=True)
+        tmp_out = os.path.join(entry, '.building.whl')
+        new_version = repack(wheel_path, work, tmp_out, fingerprint)
+        out = os.path.join(entry, output_name(wheel_path, new_version))
+        os.replace(tmp_out, out)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return out, False, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build pre-patched mlc_llm / mlc-ai wheels')
+    parser.add_argument('wheels', nargs='+', help='downloaded .whl files')
+    parser.add_argument('--out', default=None, help='copy (hardlink) the patched wheels into this directory')
+    parser.add_argument('--cache', default=None, help='cache directory (default ~/.cache/mlc_patched_wheels)')
+    parser.add_argument('--batch-spec', choices=['stub', 'rewrite'], default='stub',
+                        help='batch_spec_verify.py: replace with the stub (default) or rewrite with the bool rules')
+    parser.add_argument('--force', action='store_true', help='rebuild even if cached')
+    args = parser.parse_args()
+
+    cache_dir = args.cache or default_cache()
+    failed = False
+    for wheel in args.wheels:
+        start = time.perf_counter()
+        try:
+            out, hit, statuses = build(wheel, cache_dir, args.batch_spec, args.force)
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            print(f"❌ {wheel}: {e}")
+            failed = True
+            continue
+        if args.out:
+            os.makedirs(args.out, exist_ok=True)
+            dest = os.path.join(args.out, os.path.basename(out))
+            if os.path.exists(dest):
+                os.remove(dest)
+            try:
+                os.link(out, dest)
+            except OSError:
+                shutil.copyfile(out, dest)
+            out = dest
+        elapsed = (time.perf_counter() - start) * 1000
+        if hit:
+            print(f"⏭️  {os.path.basename(wheel)}: cached -> {out} ({elapsed:.1f}ms)")
+            continue
+        print(f"✅ {os.path.basename(wheel)} -> {out} ({elapsed:.1f}ms)")
+        for unit, status in statuses.items():
+            if status != 'missing':
+                print(f"   {unit}: {status}")
+        if any(s == 'failed' or s == 'error' for s in statuses.values()):
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
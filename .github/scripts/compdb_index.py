@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Indexed lookup into large compile_commands.json files.
+
+mlc-llm plus the TVM submodule produce a compile database of tens of MB, and
+most tools only need one or a few entries. Parsing all of it with json.load
+for each lookup is slow. This keeps a sidecar index
+(compile_commands.json.idx) that maps each entry's normalized file path
+(directory + file) to the byte offset and length of its JSON object. A lookup
+mmaps the index, binary-searches it, and json.loads only the entries it
+returns.
+
+The index records the database's size and mtime_ns. It is rebuilt
+automatically when they change, and otherwise never. If the build directory
+is read-only, the sidecar goes to ~/.cache/mlc_compdb_index
+(MLC_COMPDB_INDEX_CACHE) instead.
+
+Keys are stored reversed and sorted, so the same binary search answers both
+exact-path and path-suffix ('cpp/json_ffi/json_ffi_engine.cc') queries.
+
+Index layout (little endian):
+    header   '<8sQqII'         magic, db size, db mtime_ns, entry count, key table size
+    entries  '<QIII' * n       entry offset, entry length, key offset, key length
+    keys     reversed utf-8 paths, in entry order
+
+Usage:
+    python compdb_index.py build/compile_commands.json [FILE_OR_SUFFIX ...] [--rebuild] [--command]
+"""
+import argparse
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+
+from tree_patcher import atomic_write_bytes
+
+MAGIC = b'MLCCDB\x00\x01'
+HEADER = struct.Struct('<8sQqII')
+ENTRY = struct.Struct('<QIII')
+SKIP = re.compile(r'[\s,]*')
+
+
+def default_cache_dir():
+    return os.environ.get('MLC_COMPDB_INDEX_CACHE') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'mlc_compdb_index')
+
+
+def normalize(path, directory=None):
+    path = path.replace('\\', '/')
+    if directory and not os.path.isabs(path):
+        path = os.path.join(directory, path)
+    return os.path.normpath(path).replace('\\', '/')
+
+
+def iter_entries(data):
+    """(object, byte offset, byte length) for every entry of the JSON array `data`.
+
+    JSONDecoder.raw_decode parses each object and reports where it ended, so
+    the offsets come out of the same C-speed pass as the parse.
+    """
+    text = data.decode('utf-8')
+    decoder = json.JSONDecoder()
+    pos = SKIP.match(text).end()
+    if text[pos:pos + 1] != '[':
+        raise ValueError('compile database is not a JSON array')
+    pos += 1
+    ascii_only = data.isascii()
+    char_pos, byte_pos = 0, 0
+    while True:
+        pos = SKIP.match(text, pos).end()
+        if pos >= len(text) or text[pos] == ']':
+            return
+        obj, end = decoder.raw_decode(text, pos)
+        if ascii_only:
+            start, length = pos, end - pos
+        else:
+            byte_pos += len(text[char_pos:pos].encode('utf-8'))
+            length = len(text[pos:end].encode('utf-8'))
+            start, char_pos = byte_pos, pos
+        yield obj, start, length
+        pos = end
+
+
+def entry_key(obj):
+    return normalize(obj.get('file', ''), obj.get('directory'))
+
+
+def build_index(db_path, index_path):
+    """Scan the database once and write the sidecar index. Returns the entry count."""
+    st = os.stat(db_path)
+    with open(db_path, 'rb') as f:
+        data = f.read()
+    rows = [(entry_key(obj)[::-1].encode('utf-8'), offset, length) for obj, offset, length in iter_entries(data)]
+    rows.sort()
+    keys = bytearray()
+    out = bytearray(HEADER.pack(MAGIC, st.st_size, st.st_mtime_ns, len(rows), 0))
+    for key, offset, length in rows:
+        out += ENTRY.pack(offset, length, len(keys), len(key))
+        keys += key
+    HEADER.pack_into(out, 0, MAGIC, st.st_size, st.st_mtime_ns, len(rows), len(keys))
+    out += keys
+    atomic_write_bytes(os.path.abspath(index_path), bytes(out))
+    return len(rows)
+
+
+def _index_is_current(index_path, st):
+    try:
+        with open(index_path, 'rb') as f:
+            magic, size, mtime_ns, _, _ = HEADER.unpack(f.read(HEADER.size))
+    except (OSError, struct.error):
+        return False
+    return magic == MAGIC and size == st.st_size and mtime_ns == st.st_mtime_ns
+
+
+class CompDB:
+    """compile_commands.json with an mmap'ed sidecar index.
+
+        db = CompDB('build/compile_commands.json')
+        db.lookup('/abs/path/cpp/json_ffi/json_ffi_engine.cc')   # exact
+        db.find_suffix('cpp/json_ffi/json_ffi_engine.cc')        # by suffix
+    """
+
+    def __init__(self, db_path, index_path=None, rebuild=False):
+        self.db_path = os.path.abspath(db_path)
+        self.rebuilt = False
+        st = os.stat(self.db_path)
+        self.index_path = index_path or self._pick_index_path()
+        if rebuild or not _index_is_current(self.index_path, st):
+            try:
+                build_index(self.db_path, self.index_path)
+            except OSError:
+                # read-only build dir: fall back to the cache directory
+                self.index_path = self._cache_index_path()
+                if rebuild or not _index_is_current(self.index_path, st):
+                    build_index(self.db_path, self.index_path)
+            self.rebuilt = True
+        with open(self.index_path, 'rb') as f:
+            self._idx = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _, _, _, self.count, _ = HEADER.unpack_from(self._idx, 0)
+        self._keys_at = HEADER.size + self.count * ENTRY.size
+        self._db = open(self.db_path, 'rb')
+
+    def _cache_index_path(self):
+        tag = hashlib.sha256(self.db_path.encode('utf-8')).hexdigest()[:24]
+        return os.path.join(default_cache_dir(), tag + '.idx')
+
+    def _pick_index_path(self):
+        sidecar = self.db_path + '.idx'
+        if os.access(os.path.dirname(self.db_path), os.W_OK) or os.path.exists(sidecar):
+            return sidecar
+        return self._cache_index_path()
+
+    def close(self):
+        self._idx.close()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def _row(self, i):
+        return ENTRY.unpack_from(self._idx, HEADER.size + i * ENTRY.size)
+
+    def _key(self, i):
+        _, _, key_off, key_len = self._row(i)
+        start = self._keys_at + key_off
+        return self._idx[start:start + key_len]
+
+    def _entry(self, i):
+        offset, length, _, _ = self._row(i)
+        self._db.seek(offset)
+        return json.loads(self._db.read(length))
+
+    def _range(self, rkey, exact):
+        keys = _Keys(self)
+        lo = bisect.bisect_left(keys, rkey)
+        hi = lo
+        while hi < self.count:
+            k = self._key(hi)
+            if k == rkey if exact else k.startswith(rkey):
+                hi += 1
+            else:
+                break
+        return range(lo, hi)
+
+    def lookup(self, path):
+        """All entries whose normalized file path equals `path`."""
+        rkey = normalize(os.path.abspath(path))[::-1].encode('utf-8')
+        return [self._entry(i) for i in self._range(rkey, True)]
+
+    def find_suffix(self, suffix):
+        """All entries whose file path ends with `suffix` (at a path-component boundary)."""
+        suffix = normalize(suffix).lstrip('/')
+        rkey = suffix[::-1].encode('utf-8')
+        out = []
+        for i in self._range(rkey, False):
+            key = self._key(i)
+            if len(key) == len(rkey) or key[len(rkey):len(rkey) + 1] == b'/':
+                out.append(self._entry(i))
+        return out
+
+    def files(self):
+        """Normalized paths of all entries (from the index only; nothing is parsed)."""
+        return [self._key(i).decode('utf-8')[::-1] for i in range(self.count)]
+
+    def entries_for(self, paths):
+        """Entries for an iterable of normalized paths (as returned by files())."""
+        return [e for p in dict.fromkeys(paths) for e in self.lookup(p)]
+
+
+class _Keys:
+    __slots__ = ('db',)
+
+    def __init__(self, db):
+        self.db = db
+
+    def __len__(self):
+        return self.db.count
+
+    def __getitem__(self, i):
+        return self.db._key(i)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Indexed lookup into compile_commands.json')
+    parser.add_argument('compdb')
+    parser.add_argument('files', nargs='*', help='absolute paths or path suffixes to look up')
+    parser.add_argument('--rebuild', action='store_true', help='rebuild the index even if it is current')
+    parser.add_argument('--command', action='store_true', help='print only the command of each match')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with CompDB(args.compdb, rebuild=args.rebuild) as db:
+        opened = time.perf_counter() - start
+        state = 'rebuilt' if db.rebuilt else 'current'
+        print(f"📇 {db.index_path}: {len(db)} entries ({state}, {opened * 1000:.1f}ms)", file=sys.stderr)
+        missing = 0
+        for f in args.files:
+            matches = db.lookup(f) if os.path.isabs(f) else db.find_suffix(f)
+            if not matches:
+                missing += 1
+                print(f"   {f}: no entry", file=sys.stderr)
+            for e in matches:
+                print(e.get('command') or ' '.join(e.get('arguments', [])) if args.command
+                      else json.dumps(e, indent=2))
+    return 1 if missing else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
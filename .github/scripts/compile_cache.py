@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache for the `mlc_llm compile` output (model-iphone.tar).
+
+compile_gpu_lib_only_fallback.py used to recompile the tar from scratch on
+every run: a multi-minute TVM build, even when nothing that goes into it had
+changed. The cache key is a hash of everything the compile reads:
+  - mlc-chat-config.json, normalized: keys sorted, and the runtime-only
+    fields (sampling parameters, conv_template, tokenizer lists) dropped
+  - the --overrides values (sorted), --device, --host and --system-lib-prefix
+  - versions of the installed mlc-llm* / mlc-ai* / tvm* wheels
+  - sha256 of every .py file of the mlc_llm and tvm packages the compile
+    imports. This covers the site-packages patch scripts and a source tree
+    on PYTHONPATH alike.
+  - the host platform (OS and machine)
+
+Entries live under ~/.cache/mlc_compile_cache (MLC_COMPILE_CACHE_DIR) as
+<k[:2]>/<k>.tar. Next to each tar are <k>.json, which holds the sha256, size
+and key inputs, and <k>.log, the compile log. On a hit, the tar is copied
+out and hashed in a single pass. A mismatch drops the entry and counts as a
+miss. The copy is a real file, not a link, because the workflow appends to
+the tar afterwards. A hit refreshes the entry's mtime. `cleanup` evicts the
+least recently used entries down to 90% of MLC_COMPILE_CACHE_MAX_SIZE
+(default 4G). MLC_COMPILE_CACHE_DISABLE=1 always compiles.
+
+Usage:
+    python compile_cache.py key MODEL_DIR_OR_CONFIG [--system-lib-prefix auto] [--overrides 'k=v;...'] [--json]
+    python compile_cache.py list
+    python compile_cache.py verify                  re-hash every entry, drop corrupt ones
+    python compile_cache.py cleanup [--max-size 4G] evict LRU entries over the limit
+"""
+import argparse
+import hashlib
+import importlib.metadata
+import importlib.util
+import json
+import os
+import platform
+import re
+import shutil
+import sys
+import time
+
+from memory_planner import parse_bytes
+from tree_patcher import atomic_write_bytes, atomic_writer
+
+CACHE_FORMAT = 1
+# mlc-chat-config.json fields only the runtime reads; they do not change the compiled library
+RUNTIME_ONLY_KEYS = {'temperature', 'top_p', 'repetition_penalty', 'presence_penalty', 'frequency_penalty',
+                     'conv_template', 'tokenizer_files', 'tokenizer_info'}
+WHEEL_PREFIXES = ('mlc-llm', 'mlc-ai', 'tvm', 'apache-tvm')
+SOURCE_PACKAGES = ('mlc_llm', 'tvm')
+
+
+def default_cache_dir():
+    return os.environ.get('MLC_COMPILE_CACHE_DIR') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'mlc_compile_cache')
+
+
+def default_max_size():
+    return parse_bytes(os.environ.get('MLC_COMPILE_CACHE_MAX_SIZE') or '4G')
+
+
+def normalized_config(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        cfg = json.load(f)
+    for key in RUNTIME_ONLY_KEYS:
+        cfg.pop(key, None)
+    return json.dumps(cfg, sort_keys=True, separators=(',', ':'))
+
+
+def normalized_overrides(overrides):
+    """'b=2;a=1' or {'b': 2, 'a': 1} -> 'a=1;b=2'."""
+    if isinstance(overrides, str):
+        items = (part.partition('=') for part in overrides.split(';') if part.strip())
+        values = {k.strip(): v.strip() for k, _, v in items}
+    else:
+        values = {k: str(v) for k, v in overrides.items()}
+    return ';'.join(f'{k}={values[k]}' for k in sorted(values))
+
+
+def wheel_versions():
+    versions = {}
+    for dist in importlib.metadata.distributions():
+        name = re.sub(r'[-_.]+', '-', dist.metadata['Name'] or '').lower()
+        if name.startswith(WHEEL_PREFIXES):
+            versions[name] = dist.version
+    return dict(sorted(versions.items()))
+
+
+def source_fingerprints(packages=SOURCE_PACKAGES):
+    """{package: hash of its .py files (path + sha256)} as this interpreter would import it, or None."""
+    out = {}
+    for name in packages:
+        try:
+            spec = importlib.util.find_spec(name)
+        except (ImportError, ValueError):
+            spec = None
+        if spec is None or not spec.submodule_search_locations:
+            out[name] = None
+            continue
+        h = hashlib.sha256()
+        for root in spec.submodule_search_locations:
+            files = []
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = [d for d in dirnames if d != '__pycache__']
+                files.extend(os.path.join(dirpath, fn) for fn in filenames if fn.endswith('.py'))
+            for path in sorted(files):
+                with open(path, 'rb') as f:
+                    digest = hashlib.sha256(f.read()).digest()
+                h.update(os.path.relpath(path, root).replace(os.sep, '/').encode('utf-8') + b'\0' + digest)
+        out[name] = h.hexdigest()[:16]
+    return out
+
+
+def compile_key(config, overrides, sys_prefix, device, host):
+    """(key, inputs): the cache key for one compile and the inputs it was derived from."""
+    inputs = {
+        'format': CACHE_FORMAT,
+        'config': hashlib.sha256(normalized_config(config).encode('utf-8')).hexdigest(),
+        'overrides': normalized_overrides(overrides),
+        'device': device,
+        'host': host,
+        'system_lib_prefix': sys_prefix,
+        'wheels': wheel_versions(),
+        'sources': source_fingerprints(),
+        'platform': f'{platform.system()}-{platform.machine()}',
+    }
+    key = hashlib.sha256(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+    return key, inputs
+
+
+def _copy_hashed(src, dest, expected=None):
+    """Copy `src` onto `dest` atomically, hashing it on the way. Returns (sha256, size).
+
+    With `expected`, a copy whose sha256 differs raises ValueError and `dest`
+    is left untouched.
+    """
+    h = hashlib.sha256()
+    size = 0
+    with open(src, 'rb') as fin, atomic_writer(dest) as fout:
+        for chunk in iter(lambda: fin.read(1 << 20), b''):
+            h.update(chunk)
+            size += len(chunk)
+            fout.write(chunk)
+        if expected is not None and h.hexdigest() != expected:
+            raise ValueError(f'{src}: sha256 {h.hexdigest()[:12]} != {expected[:12]}')
+    return h.hexdigest(), size
+
+
+class CompileCache:
+    """Compiled tars under <k[:2]>/<k>.tar with <k>.json (metadata) and <k>.log (compile log)."""
+
+    def __init__(self, root=None):
+        self.root = root or default_cache_dir()
+
+    def _path(self, key, ext):
+        return os.path.join(self.root, key[:2], key + ext)
+
+    def meta(self, key):
+        try:
+            with open(self._path(key, '.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get('format') == CACHE_FORMAT else None
+
+    def copy_log(self, key, fout):
+        """Stream the stored compile log for `key` into the open binary file `fout`."""
+        try:
+            with open(self._path(key, '.log'), 'rb') as fin:
+                shutil.copyfileobj(fin, fout, 1 << 20)
+        except OSError:
+            pass
+
+    def drop(self, key):
+        for ext in ('.json', '.tar', '.log'):
+            try:
+                os.remove(self._path(key, ext))
+            except OSError:
+                pass
+
+    def get(self, key, dest):
+        """Copy the cached tar for `key` to `dest` after checking its sha256; the metadata, or None on a miss."""
+        meta = self.meta(key)
+        if meta is None:
+            return None
+        try:
+            _copy_hashed(self._path(key, '.tar'), dest, meta.get('sha256'))
+        except (OSError, ValueError):
+            self.drop(key)
+            return None
+        now = time.time()
+        for ext in ('.json', '.tar', '.log'):
+            try:
+                os.utime(self._path(key, ext), (now, now))
+            except OSError:
+                pass
+        return meta
+
+    def put(self, key, tar, inputs, log_path=None, **extra):
+        """Store `tar` under `key`. The .json goes last, so readers never see a partial entry."""
+        digest, size = _copy_hashed(tar, self._path(key, '.tar'))
+        if log_path:
+            _copy_hashed(log_path, self._path(key, '.log'))
+        meta = {'format': CACHE_FORMAT, 'key': key, 'sha256': digest, 'size': size, 'created': time.time(),
+                'inputs': inputs}
+        meta.update(extra)
+        atomic_write_bytes(self._path(key, '.json'), json.dumps(meta, indent=1, sort_keys=True).encode('utf-8'))
+        return meta
+
+    def _entries(self):
+        """[(mtime, size, key, [paths])] per cache entry; a tar, its .json and .log are one entry."""
+        groups = {}
+        if not os.path.isdir(self.root):
+            return []
+        for sub in os.scandir(self.root):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.startswith('.'):
+                    continue  # an in-flight atomic_writer temp file
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                key = entry.name.split('.', 1)[0]
+                group = groups.setdefault(key, [0, 0, key, []])
+                group[0] = max(group[0], st.st_mtime)
+                group[1] += st.st_size
+                group[3].append(entry.path)
+        return [tuple(g) for g in groups.values()]
+
+    def keys(self):
+        return [key for _, _, key, _ in sorted(self._entries(), reverse=True)]
+
+    def size(self):
+        return sum(size for _, size, _, _ in self._entries())
+
+    def verify(self):
+        """Re-hash every entry; returns (ok, dropped keys)."""
+        ok, dropped = 0, []
+        for key in self.keys():
+            meta = self.meta(key)
+            try:
+                h = hashlib.sha256()
+                with open(self._path(key, '.tar'), 'rb') as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b''):
+                        h.update(chunk)
+                good = meta is not None and h.hexdigest() == meta.get('sha256')
+            except OSError:
+                good = False
+            if good:
+                ok += 1
+            else:
+                self.drop(key)
+                dropped.append(key)
+        return ok, dropped
+
+    def cleanup(self, max_size):
+        """Evict least recently used entries until the cache is at most 90% of max_size."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _, _ in entries)
+        removed = 0
+        if total <= max_size:
+            return total, removed
+        target = max_size * 9 // 10
+        for _, size, _, paths in entries:
+            if total <= target:
+                break
+            for p in paths:
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        return total, removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Content-addressed cache for mlc_llm compile output')
+    parser.add_argument('command', choices=('key', 'list', 'verify', 'cleanup'))
+    parser.add_argument('model', nargs='?', help='key: model directory or mlc-chat-config.json')
+    parser.add_argument('--system-lib-prefix', default='auto')
+    parser.add_argument('--overrides', default=None, help='key: overrides string (default: the fallback script\'s)')
+    parser.add_argument('--cache', default=None, help='cache directory (default ~/.cache/mlc_compile_cache)')
+    parser.add_argument('--max-size', default=None,
+                        help='size bound for cleanup, e.g. 4G (default MLC_COMPILE_CACHE_MAX_SIZE)')
+    parser.add_argument('--json', action='store_true', help='key: print the key inputs as JSON')
+    args = parser.parse_args()
+
+    cache = CompileCache(args.cache)
+    if args.command == 'key':
+        # imported here: compile_gpu_lib_only_fallback imports this module
+        from compile_gpu_lib_only_fallback import BASE_OVERRIDES, DEVICE, HOST, find_config
+        if not args.model:
+            parser.error('key needs MODEL_DIR_OR_CONFIG')
+        config = args.model if os.path.isfile(args.model) else find_config(args.model)
+        if not config:
+            print(f"ERROR: mlc-chat-config.json not found under {args.model}", file=sys.stderr)
+            return 1
+        overrides = args.overrides if args.overrides is not None else BASE_OVERRIDES
+        key, inputs = compile_key(config, overrides, args.system_lib_prefix, DEVICE, HOST)
+        if args.json:
+            print(json.dumps({'key': key, 'cached': cache.meta(key) is not None, 'inputs': inputs}, indent=2))
+        else:
+            print(key)
+    elif args.command == 'list':
+        entries = {key: (mtime, size) for mtime, size, key, _ in cache._entries()}
+        for key in cache.keys():
+            meta = cache.meta(key) or {}
+            inputs = meta.get('inputs', {})
+            mtime, size = entries[key]
+            print(f"{key[:16]}  {size / (1 << 20):8.1f} MB  used {time.strftime('%Y-%m-%d %H:%M', time.localtime(mtime))}"
+                  f"  {inputs.get('overrides', '?')}  prefix={inputs.get('system_lib_prefix', '?')}")
+        print(f"📦 {len(entries)} entries, {cache.size() / (1 << 20):.1f} MB in {cache.root}")
+    elif args.command == 'verify':
+        ok, dropped = cache.verify()
+        for key in dropped:
+            print(f"❌ dropped {key[:16]} (missing or sha256 mismatch)")
+        print(f"{'✅' if not dropped else '⚠️ '} {ok} entries verified, {len(dropped)} dropped")
+        return 1 if dropped else 0
+    else:
+        limit = parse_bytes(args.max_size) if args.max_size else default_max_size()
+        total, removed = cache.cleanup(limit)
+        print(f"📦 compile cache cleanup: evicted {removed} entries; {total / (1 << 20):.1f} MB "
+              f"(limit {limit / (1 << 20):.0f} MB)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
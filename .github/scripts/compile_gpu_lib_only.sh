@@ -35,9 +35,9 @@ echo " - system_lib_prefix: $SYS_LIB_PREFIX"
 
 if [ -n "$REQUESTED_SHARDS" ]; then
   echo "Using requested tensor_parallel_shards=$REQUESTED_SHARDS"
-  OVERRIDES="tensor_parallel_shards=${REQUESTED_SHARDS};context_window_size=1024;prefill_chunk_size=32;max_batch_size=1"
+  OVERRIDES="tensor_parallel_shards=${REQUESTED_SHARDS};max_batch_size=1"
 else
-  OVERRIDES="tensor_parallel_shards=1;context_window_size=1024;prefill_chunk_size=32;max_batch_size=1"
+  OVERRIDES="tensor_parallel_shards=1;max_batch_size=1"
 fi
 
 echo "Running mlc_llm compile (via python -m mlc_llm)"
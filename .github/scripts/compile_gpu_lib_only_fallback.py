@@ -7,8 +7,11 @@ Usage: compile_gpu_lib_only_fallback.py <model_dir> <out_tar> <system_lib_prefix
 The script:
 - validates inputs
 - finds mlc-chat-config.json under model_dir
-- runs `mlc_llm compile` with GPU-friendly overrides
-- writes `compile_iphone_libonly_log.txt` in cwd
+- runs `mlc_llm compile` with GPU-friendly overrides, or restores the tar from
+  compile_cache.py when the config, overrides, wheels and patched sources are unchanged
+- streams the compile output, line by line, into `compile_iphone_libonly_log.txt` (cwd) and
+  the console (prefixed `[compile] `), announcing each compile phase as it starts; only the
+  last 200 lines stay in memory, for the failure tail
 - extracts the produced tar and reports presence/size of devc.o and lib0.o
 
 Exit codes:
@@ -17,11 +20,64 @@ Exit codes:
 """
 
 import argparse
+import collections
 import os
+import re
 import subprocess
 import sys
 import tarfile
 import tempfile
+import time
+
+from compile_cache import CompileCache, compile_key, default_max_size
+
+# context_window_size / prefill_chunk_size are not overridden: the compile uses the values in
+# mlc-chat-config.json (solved by memory_planner.py), so the library matches the shipped config
+BASE_OVERRIDES = {'tensor_parallel_shards': 1, 'max_batch_size': 1}
+DEVICE = 'iphone'
+HOST = 'arm64-apple-ios'
+TAIL_LINES = 200
+MAX_LINE = 1 << 16
+# (phase, log pattern) in the order mlc_llm compile reaches them
+COMPILE_PHASES = (
+    ('configure', r'Compiling with arguments|Found model configuration|Creating target from'),
+    ('create model', r'Creating model from'),
+    ('export', r'Exporting the model to TVM Unity'),
+    ('optimize', r'Running optimizations using TVM Unity'),
+    ('build', r'Registering metadata'),
+    ('write', r'Generated: '),
+)
+
+
+def format_overrides(values):
+    """{'tensor_parallel_shards': 1, ...} -> 'tensor_parallel_shards=1;...' (mlc_llm --overrides)."""
+    return ';'.join(f'{k}={v}' for k, v in values.items())
+
+
+def compile_command(config, out_tar, sys_prefix, overrides, python=None, module='mlc_llm'):
+    """`python -m mlc_llm compile` for an iPhone GPU-only system lib."""
+    # Invoke mlc_llm via the current python interpreter to avoid PATH/entrypoint issues
+    # Request host triple to ensure arm64 iOS objects are produced (matches CPU workflow)
+    return [
+        python or sys.executable, '-m', module, 'compile',
+        config,
+        '--device', DEVICE,
+        '--host', HOST,
+        '--system-lib-prefix', sys_prefix,
+        '--overrides', overrides if isinstance(overrides, str) else format_overrides(overrides),
+        '--output', out_tar,
+    ]
+
+
+def object_sizes(out_tar, names=('devc.o', 'lib0.o')):
+    """{name: size or None} for the objects in the compiled tar, read from the tar headers."""
+    sizes = dict.fromkeys(names)
+    with tarfile.open(out_tar, 'r:*') as tf:
+        for member in tf.getmembers():
+            base = os.path.basename(member.name)
+            if base in sizes and member.isfile():
+                sizes[base] = member.size
+    return sizes
 
 
 def find_config(model_dir):
@@ -33,82 +89,76 @@ def find_config(model_dir):
     return None
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument('model_dir')
-    parser.add_argument('out_tar')
-    parser.add_argument('system_lib_prefix')
-    args = parser.parse_args()
+class PhaseTracker:
+    """Notices mlc_llm compile phases from its log lines, in order, and times them."""
 
-    model_dir = args.model_dir
-    out_tar = args.out_tar
-    sys_prefix = args.system_lib_prefix
+    def __init__(self, phases=COMPILE_PHASES):
+        self.phases = [(name, re.compile(pattern)) for name, pattern in phases]
+        self.index = -1
+        self.started = []  # [(name, perf_counter)]
 
-    if not os.path.isdir(model_dir):
-        print(f"ERROR: model_dir does not exist: {model_dir}", file=sys.stderr)
-        sys.exit(1)
+    @property
+    def current(self):
+        return self.started[-1][0] if self.started else None
 
-    config = find_config(model_dir)
-    if not config:
-        # try shell find
-        try:
-            res = subprocess.run(['find', model_dir, '-maxdepth', '2', '-type', 'f', '-name', 'mlc-chat-config.json', '-print', '-quit'], text=True, capture_output=True)
-            found = res.stdout.strip()
-            if found:
-                config = found
-        except Exception:
-            config = None
+    def feed(self, line):
+        """Returns the phase `line` starts, or None. Phases only move forward."""
+        for i in range(self.index + 1, len(self.phases)):
+            name, pattern = self.phases[i]
+            if pattern.search(line):
+                self.index = i
+                self.started.append((name, time.perf_counter()))
+                return name
+        return None
 
-    if not config:
-        print(f"ERROR: mlc-chat-config.json not found under model dir: {model_dir}", file=sys.stderr)
-        sys.exit(1)
+    def durations(self, end):
+        marks = self.started + [(None, end)]
+        return [(name, marks[i + 1][1] - t) for i, (name, t) in enumerate(self.started)]
 
-    print("Found config:", config)
-    out_dir = os.path.dirname(out_tar)
-    os.makedirs(out_dir, exist_ok=True)
 
-    # Optionally accept a tensor_parallel_shards override from a 4th positional argument
-    requested_shards = None
-    if len(sys.argv) >= 5:
-        requested_shards = sys.argv[4]
+def stream_command(cmd, log_path, prefix='[compile] ', tail_lines=TAIL_LINES, tracker=None):
+    """Run `cmd` and tee its merged stdout/stderr into `log_path` and the console, line by line.
 
-    if requested_shards:
-        overrides = f"tensor_parallel_shards={requested_shards};context_window_size=1024;prefill_chunk_size=32;max_batch_size=1"
-    else:
-        overrides = "tensor_parallel_shards=1;context_window_size=1024;prefill_chunk_size=32;max_batch_size=1"
+    Only the last `tail_lines` lines are kept in memory, so a multi-hundred-MB
+    --debug-dump log costs no more than a short one. Returns (returncode, tail).
+    """
+    tail = collections.deque(maxlen=tail_lines)
+    env = dict(os.environ, PYTHONUNBUFFERED='1')  # the compile's log lines arrive as they are written
+    start = time.perf_counter()
+    with open(log_path, 'w', encoding='utf-8') as logf:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env,
+                                text=True, encoding='utf-8', errors='replace')
+        # readline(limit) bounds a single enormous line (IR dumps) as well
+        for line in iter(lambda: proc.stdout.readline(MAX_LINE), ''):
+            logf.write(line)
+            tail.append(line)
+            print(prefix + line, end='' if line.endswith('\n') else '\n', flush=True)
+            if tracker is not None:
+                phase = tracker.feed(line)
+                if phase:
+                    print(f"▶️  phase: {phase} (+{time.perf_counter() - start:.1f}s)", flush=True)
+        proc.stdout.close()
+        rc = proc.wait()
+    return rc, tail
 
-    # Try to ensure mlc_llm is installed into the active Python environment to avoid "command not found" issues
-    try:
-        print('Attempting to ensure mlc_llm is installed in this Python environment...')
-        subprocess.run([sys.executable, '-m', 'pip', 'install', '--pre', '-U', '-f', 'https://mlc.ai/wheels', 'mlc-llm-nightly-cpu', 'mlc-ai-nightly-cpu'], check=True)
-    except subprocess.CalledProcessError:
-        print('Warning: pip install of mlc_llm failed (continuing and attempting compile; may still fail)')
 
-    # Invoke mlc_llm via the current python interpreter to avoid PATH/entrypoint issues
-    # Request host triple to ensure arm64 iOS objects are produced (matches CPU workflow)
-    cmd = [
-        sys.executable, '-m', 'mlc_llm', 'compile',
-        config,
-        '--device', 'iphone',
-        '--host', 'arm64-apple-ios',
-        '--system-lib-prefix', sys_prefix,
-        '--overrides', overrides,
-        '--output', out_tar,
-    ]
+def run_compile(config, out_tar, sys_prefix, overrides, model_dir, log_path='compile_iphone_libonly_log.txt'):
+    """Run the compile, streaming it into `log_path`, and exit(1) on failure. Returns `log_path`."""
+    cmd = compile_command(config, out_tar, sys_prefix, overrides)
 
     print('Running:', ' '.join(cmd))
 
-    # Run compile and capture output
-    with open('compile_iphone_libonly_log.txt', 'w') as logf:
-        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-        logf.write(proc.stdout)
-        # Always print the last part of the compile log for diagnostics
-        tail = '\n'.join(proc.stdout.splitlines()[-200:])
-        print("--- tail of compile log (last 200 lines) ---")
-        print(tail)
-        if proc.returncode != 0:
-            print("ERROR: mlc_llm compile failed (non-zero exit). See compile_iphone_libonly_log.txt for full details", file=sys.stderr)
-            sys.exit(1)
+    tracker = PhaseTracker()
+    start = time.perf_counter()
+    rc, tail = stream_command(cmd, log_path, tracker=tracker)
+    timings = ', '.join(f"{name} {seconds:.1f}s" for name, seconds in tracker.durations(time.perf_counter()))
+    print(f"Compile phases: {timings or 'none detected'}")
+    if rc != 0:
+        print(f"--- tail of compile log (last {len(tail)} lines) ---")
+        print(''.join(tail), end='')
+        print(f"ERROR: mlc_llm compile failed (exit {rc}) in phase {tracker.current or 'startup'} after "
+              f"{time.perf_counter() - start:.1f}s. See {log_path} for full details", file=sys.stderr)
+        sys.exit(1)
 
     if not os.path.isfile(out_tar):
         # Try to discover any .tar files in common output locations for debugging
@@ -170,6 +220,90 @@ def main():
             print('mlc_llm not found in PATH or --version failed')
         print('PATH=' + os.environ.get('PATH', ''))
         sys.exit(1)
+    return log_path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('model_dir')
+    parser.add_argument('out_tar')
+    parser.add_argument('system_lib_prefix')
+    args = parser.parse_args()
+
+    model_dir = args.model_dir
+    out_tar = args.out_tar
+    sys_prefix = args.system_lib_prefix
+
+    if not os.path.isdir(model_dir):
+        print(f"ERROR: model_dir does not exist: {model_dir}", file=sys.stderr)
+        sys.exit(1)
+
+    config = find_config(model_dir)
+    if not config:
+        # try shell find
+        try:
+            res = subprocess.run(['find', model_dir, '-maxdepth', '2', '-type', 'f', '-name', 'mlc-chat-config.json', '-print', '-quit'], text=True, capture_output=True)
+            found = res.stdout.strip()
+            if found:
+                config = found
+        except Exception:
+            config = None
+
+    if not config:
+        print(f"ERROR: mlc-chat-config.json not found under model dir: {model_dir}", file=sys.stderr)
+        sys.exit(1)
+
+    print("Found config:", config)
+    out_dir = os.path.dirname(out_tar)
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Optionally accept a tensor_parallel_shards override from a 4th positional argument
+    requested_shards = None
+    if len(sys.argv) >= 5:
+        requested_shards = sys.argv[4]
+
+    overrides = dict(BASE_OVERRIDES)
+    if requested_shards:
+        overrides['tensor_parallel_shards'] = requested_shards
+
+    # Try to ensure mlc_llm is installed into the active Python environment to avoid "command not found" issues
+    try:
+        print('Attempting to ensure mlc_llm is installed in this Python environment...')
+        subprocess.run([sys.executable, '-m', 'pip', 'install', '--pre', '-U', '-f', 'https://mlc.ai/wheels', 'mlc-llm-nightly-cpu', 'mlc-ai-nightly-cpu'], check=True)
+    except subprocess.CalledProcessError:
+        print('Warning: pip install of mlc_llm failed (continuing and attempting compile; may still fail)')
+
+    hit = key = inputs = None
+    cache = None if os.environ.get('MLC_COMPILE_CACHE_DISABLE') else CompileCache()
+    if cache is not None:
+        # keyed after the pip install above, so a new nightly wheel is a miss
+        try:
+            key, inputs = compile_key(config, overrides, sys_prefix, DEVICE, HOST)
+            hit = cache.get(key, out_tar)
+        except Exception as e:
+            print(f"Warning: compile cache lookup failed ({e}); compiling")
+            cache = None
+
+    if hit:
+        print(f"Compile cache hit {key[:16]}: restored {out_tar} ({hit['size']} bytes, sha256 verified)")
+        with open('compile_iphone_libonly_log.txt', 'wb') as logf:
+            logf.write(f"[compile cache hit {key}; log of the original compile follows]\n".encode('utf-8'))
+            cache.copy_log(key, logf)
+    else:
+        if cache is not None:
+            print(f"Compile cache miss {key[:16]}")
+        log_path = run_compile(config, out_tar, sys_prefix, overrides, model_dir)
+        if cache is not None:
+            try:
+                sizes = object_sizes(out_tar)
+                if all(sizes.values()):
+                    cache.put(key, out_tar, inputs, log_path, objects=sizes)
+                    total, _ = cache.cleanup(default_max_size())
+                    print(f"Stored in compile cache as {key[:16]} (cache size {total / (1 << 20):.1f} MB)")
+                else:
+                    print("Not caching: devc.o / lib0.o missing from the tar")
+            except Exception as e:
+                print(f"Warning: could not store the compile output in the cache: {e}")
 
     print("Compile finished. Checking output tar contents ...")
     try:
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Run `mlc_llm compile` over a grid of --overrides values, several at a time, and tabulate the results.
+
+compile_gpu_lib_only_fallback.py / compile_gpu_lib_only.sh compile one
+override string. This expands a grid, e.g.
+
+    --grid context_window_size=1024,2048,4096 --grid prefill_chunk_size=32,128 --grid tensor_parallel_shards=1
+
+into its cartesian product, on top of the base overrides
+(BASE_OVERRIDES, plus --set KEY=VALUE). Each variant is compiled into its
+own directory under --out-dir. The scheduler starts a variant only while
+both budgets allow it:
+  - CPU: at most --cpus // --threads-per-job compiles at once. Each one gets
+    TVM_NUM_THREADS / OMP_NUM_THREADS = --threads-per-job.
+  - memory: the reserved RSS of the running compiles stays under
+    --mem-budget (default 80% of RAM). The reservation starts at
+    --mem-per-job and then follows the largest peak RSS of a successful
+    compile so far (+10%), never dropping below --mem-per-job.
+Variants start largest first, ordered by memory_planner.estimate for the
+model in the config (or by their numeric override values when the config
+has no model shape). The peaks the reservation learns from therefore come
+from the biggest compiles, not from the small ones that finish first.
+Children are reaped with os.wait4, which gives each compile's peak RSS
+without polling.
+
+Each row records:
+  variant, overrides, exit code, wall time, peak RSS,
+  output tar size, and devc.o / lib0.o sizes (read from the tar headers)
+Rows are written to sweep.csv and sweep.json, and each compile's output goes
+to its compile.log.
+
+The compile runs as `PYTHON -m MODULE compile ...` (--python, --module). The
+stub package in testdata/stub_mlc_llm, put on PYTHONPATH, is enough to
+exercise the scheduler on Linux without Metal; test_compile_sweep.py does
+that.
+
+Usage:
+    python compile_sweep.py MODEL_DIR_OR_CONFIG --grid KEY=V1,V2 [--grid ...] [--set KEY=VALUE ...]
+                            [--out-dir tmp_ci_diagnostics/sweep] [--cpus N] [--threads-per-job N]
+                            [--mem-budget 12G] [--mem-per-job 4G] [--system-lib-prefix auto]
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+import memory_planner
+from compile_gpu_lib_only_fallback import BASE_OVERRIDES, compile_command, find_config, format_overrides, object_sizes
+from config_session import parse_value
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_OUT_DIR = os.path.join(REPO_ROOT, 'tmp_ci_diagnostics', 'sweep')
+COLUMNS = ('variant', 'overrides', 'rc', 'wall_s', 'peak_rss', 'tar_bytes', 'devc_bytes', 'lib0_bytes', 'log')
+
+
+def physical_memory():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return 8 << 30
+
+
+def maxrss_bytes(rusage):
+    # ru_maxrss is bytes on macOS and KiB on Linux
+    return rusage.ru_maxrss if sys.platform == 'darwin' else rusage.ru_maxrss * 1024
+
+
+def expand_grid(grid, base):
+    """[{key: value}] for the cartesian product of `grid` ({key: [values]}) over `base`."""
+    keys = list(grid)
+    variants = []
+    for combo in itertools.product(*(grid[k] for k in keys)):
+        values = dict(base)
+        values.update(zip(keys, combo))
+        variants.append(values)
+    return variants
+
+
+def variant_name(values, keys):
+    short = {'context_window_size': 'ctx', 'prefill_chunk_size': 'pf', 'tensor_parallel_shards': 'tp',
+             'max_batch_size': 'bs'}
+    name = '-'.join(f"{short.get(k, k)}{values[k]}" for k in keys) or 'base'
+    return re.sub(r'[^\w.=-]', '_', name)
+
+
+class Job:
+    __slots__ = ('name', 'overrides', 'dir', 'tar', 'log', 'proc', 'logf', 'start', 'reserved', 'row')
+
+    def __init__(self, name, overrides, out_dir):
+        self.name = name
+        self.overrides = overrides
+        self.dir = os.path.join(out_dir, name)
+        self.tar = os.path.join(self.dir, 'model-iphone.tar')
+        self.log = os.path.join(self.dir, 'compile.log')
+        self.proc = self.logf = None
+        self.start = 0.0
+        self.reserved = 0
+        self.row = None
+
+
+class Scheduler:
+    """Starts compiles while the CPU slots and the memory budget allow, and reaps them with os.wait4."""
+
+    def __init__(self, config, sys_prefix, slots, threads_per_job, mem_budget, mem_per_job,
+                 python=None, module='mlc_llm', log=print):
+        self.config = config
+        self.sys_prefix = sys_prefix
+        self.slots = max(1, slots)
+        self.threads = threads_per_job
+        self.mem_budget = mem_budget
+        self.mem_per_job = mem_per_job
+        self.estimate = mem_per_job
+        self.largest_peak = 0
+        self.python = python
+        self.module = module
+        self.log = log
+        self.running = {}  # pid -> Job
+
+    def _reserved(self):
+        return sum(j.reserved for j in self.running.values())
+
+    def _can_start(self):
+        if len(self.running) >= self.slots:
+            return False
+        # always let one compile run, even if the estimate alone exceeds the budget
+        return not self.running or self._reserved() + self.estimate <= self.mem_budget
+
+    def _start(self, job):
+        os.makedirs(job.dir, exist_ok=True)
+        env = dict(os.environ)
+        if self.threads:
+            env['TVM_NUM_THREADS'] = env['OMP_NUM_THREADS'] = str(self.threads)
+        cmd = compile_command(self.config, job.tar, self.sys_prefix, job.overrides, self.python, self.module)
+        job.logf = open(job.log, 'w')
+        job.logf.write('Running: ' + ' '.join(cmd) + '\n')
+        job.logf.flush()
+        job.start = time.perf_counter()
+        job.reserved = self.estimate
+        job.proc = subprocess.Popen(cmd, stdout=job.logf, stderr=subprocess.STDOUT, env=env, cwd=job.dir)
+        self.running[job.proc.pid] = job
+        self.log(f"▶️  {job.name} (running {len(self.running)}, reserved {self._reserved() / (1 << 30):.1f} GB)")
+
+    def _reap(self):
+        pid, status, rusage = os.wait4(-1, 0)
+        job = self.running.pop(pid, None)
+        if job is None:
+            return None  # not ours
+        wall = time.perf_counter() - job.start
+        job.proc.returncode = rc = os.waitstatus_to_exitcode(status)
+        job.logf.close()
+        peak = maxrss_bytes(rusage)
+        if rc == 0:
+            # later reservations follow the largest successful compile seen so far
+            self.largest_peak = max(self.largest_peak, peak)
+            self.estimate = max(self.mem_per_job, int(self.largest_peak * 1.1))
+        job.row = result_row(job, rc, wall, peak)
+        state = '✅' if rc == 0 else '❌'
+        self.log(f"{state} {job.name}: rc={rc} {wall:.1f}s peak RSS {peak / (1 << 20):.0f} MB")
+        return job
+
+    def run(self, jobs):
+        pending = list(jobs)
+        while pending or self.running:
+            while pending and self._can_start():
+                self._start(pending.pop(0))
+            self._reap()
+        return [j.row for j in jobs]
+
+
+def largest_first(jobs, config):
+    """`jobs` ordered by descending estimated memory (memory_planner), falling back to their numeric overrides.
+
+    context / prefill / batch not in a job's overrides are taken from the config, as mlc_llm compile does.
+    """
+    def numeric(job):
+        return tuple(v for v in job.overrides.values() if isinstance(v, (int, float)) and not isinstance(v, bool))
+
+    def setting(job, cfg, key, default=None):
+        # an override wins; otherwise mlc_llm compile uses the config's value
+        if key in job.overrides:
+            return int(job.overrides[key])
+        value = cfg.get(key, cfg.get('model_config', {}).get(key, default))
+        if value is None:
+            raise KeyError(key)
+        return int(value)
+
+    try:
+        cfg = memory_planner.load_config(config)
+        shape = memory_planner.ModelShape(cfg)
+        weights, _ = memory_planner.weights_bytes(config, shape)
+        sizes = {id(j): memory_planner.estimate(shape, weights, setting(j, cfg, 'context_window_size'),
+                                                setting(j, cfg, 'prefill_chunk_size'),
+                                                setting(j, cfg, 'max_batch_size', 1))['total'] for j in jobs}
+        return sorted(jobs, key=lambda j: sizes[id(j)], reverse=True)
+    except (OSError, ValueError, KeyError, TypeError):
+        return sorted(jobs, key=numeric, reverse=True)
+
+
+def result_row(job, rc, wall, peak):
+    row = {'variant': job.name, 'overrides': format_overrides(job.overrides), 'rc': rc,
+           'wall_s': round(wall, 2), 'peak_rss': peak, 'tar_bytes': None, 'devc_bytes': None,
+           'lib0_bytes': None, 'log': job.log}
+    if os.path.isfile(job.tar):
+        row['tar_bytes'] = os.path.getsize(job.tar)
+        try:
+            sizes = object_sizes(job.tar)
+            row['devc_bytes'], row['lib0_bytes'] = sizes['devc.o'], sizes['lib0.o']
+        except Exception:
+            pass
+    return row
+
+
+def write_tables(rows, out_dir, meta):
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, 'sweep.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(os.path.join(out_dir, 'sweep.json'), 'w') as f:
+        json.dump(dict(meta, results=rows), f, indent=2)
+
+
+def _mb(n):
+    return '-' if n is None else f'{n / (1 << 20):.1f}'
+
+
+def print_table(rows):
+    print(f"{'variant':<28} {'rc':>3} {'wall s':>8} {'RSS MB':>8} {'tar MB':>8} {'devc MB':>8} {'lib0 MB':>8}")
+    for r in rows:
+        print(f"{r['variant']:<28} {r['rc']:>3} {r['wall_s']:>8.1f} {_mb(r['peak_rss']):>8} {_mb(r['tar_bytes']):>8} "
+              f"{_mb(r['devc_bytes']):>8} {_mb(r['lib0_bytes']):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel mlc_llm compile sweep over --overrides values')
+    parser.add_argument('model', help='model directory or mlc-chat-config.json')
+    parser.add_argument('--grid', action='append', default=[], help='KEY=V1,V2,... (repeatable)')
+    parser.add_argument('--set', action='append', default=[], help='KEY=VALUE added to every variant')
+    parser.add_argument('--out-dir', default=DEFAULT_OUT_DIR)
+    parser.add_argument('--system-lib-prefix', default='auto')
+    parser.add_argument('--cpus', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads-per-job', type=int, default=None,
+                        help='threads per compile (default: cpus / number of variants, at least 1)')
+    parser.add_argument('--mem-budget', default=None, help='total RSS for concurrent compiles (default 80%% of RAM)')
+    parser.add_argument('--mem-per-job', default='4G', help='reservation before the first compile finishes')
+    parser.add_argument('--python', default=None, help='interpreter for the compiles (default: this one)')
+    parser.add_argument('--module', default='mlc_llm', help='module run with -m (a stub works for testing)')
+    args = parser.parse_args()
+
+    config = args.model if os.path.isfile(args.model) else find_config(args.model)
+    if not config:
+        print(f"ERROR: mlc-chat-config.json not found under {args.model}", file=sys.stderr)
+        return 1
+    config = os.path.abspath(config)
+    grid = {}
+    for spec in args.grid:
+        key, sep, values = spec.partition('=')
+        if not sep:
+            print(f"ERROR: bad --grid {spec!r} (expected KEY=V1,V2)", file=sys.stderr)
+            return 1
+        grid[key] = [parse_value(v) for v in values.split(',') if v]
+        if not grid[key]:
+            print(f"ERROR: bad --grid {spec!r} (no values)", file=sys.stderr)
+            return 1
+    base = dict(BASE_OVERRIDES)
+    for spec in args.set:
+        key, _, value = spec.partition('=')
+        base[key] = parse_value(value)
+
+    variants = expand_grid(grid, base)
+    out_dir = os.path.abspath(args.out_dir)
+    jobs = [Job(variant_name(v, list(grid)), v, out_dir) for v in variants]
+    threads = args.threads_per_job or max(1, args.cpus // len(jobs))
+    slots = max(1, args.cpus // threads)
+    mem_budget = memory_planner.parse_bytes(args.mem_budget) if args.mem_budget else int(physical_memory() * 0.8)
+    print(f"🧪 {len(jobs)} variants, up to {slots} at once ({threads} threads each), "
+          f"memory budget {mem_budget / (1 << 30):.1f} GB")
+
+    start = time.perf_counter()
+    scheduler = Scheduler(config, args.system_lib_prefix, slots, threads, mem_budget,
+                          memory_planner.parse_bytes(args.mem_per_job), args.python, args.module)
+    scheduler.run(largest_first(jobs, config))
+    rows = [j.row for j in jobs]
+    elapsed = time.perf_counter() - start
+    write_tables(rows, out_dir, {'config': config, 'grid': grid, 'base': base, 'slots': slots,
+                                 'threads_per_job': threads, 'mem_budget': mem_budget, 'wall_s': round(elapsed, 2)})
+    print_table(rows)
+    failed = sum(1 for r in rows if r['rc'] != 0)
+    print(f"{'✅' if not failed else '⚠️ '} {len(rows)} variants in {elapsed:.1f}s, {failed} failed; "
+          f"table in {os.path.join(out_dir, 'sweep.csv')}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
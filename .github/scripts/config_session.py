@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Load mlc-chat-config.json once, apply an ordered list of named transforms, and write once.
+
+This replaces the load / mutate / rewrite cycle that update_config.py,
+update_mlc_config.py, set_cpu_shard_config.py and set_gpu_shard_config.py
+each ran on the same file. Those scripts are now thin wrappers over a session.
+
+Transforms (applied in the order given):
+    set:KEY=VALUE          always set KEY (VALUE is parsed as JSON, else kept as a string)
+    default:KEY=VALUE      set KEY only where it is missing
+    memory-budget=TARGET   context_window_size / prefill_chunk_size solved by memory_planner.py
+                           for a device preset (iphone-6gb) or a byte budget (3.3G)
+    gpu | cpu | ios-compact | ios-large
+                           named profiles, expanded to the set:/default: steps in PROFILES
+
+Every key has one placement rule, so the scripts no longer disagree:
+context/prefill/sliding-window/sharding keys go both at the top level and
+under model_config (the compiler reads either), max_batch_size and dtype go
+under model_config only, and anything else goes at the top level.
+
+The file is rewritten only if the parsed content actually changed, atomically
+(temp file + os.replace). A single backup, <config>.bak, holds the last
+config this tool did not write itself. Repeated runs therefore never back up
+their own output, and a freshly downloaded config replaces the stale backup.
+The sha256 of the last write is kept in <config>.session for that check.
+
+Paths may be config files or directories (searched for mlc-chat-config.json).
+The default is every model under ./model_weights.
+
+Usage:
+    python config_session.py [PATH ...] -t gpu -t memory-budget=iphone-6gb [-t set:max_batch_size=1] [--dry-run]
+    python config_session.py --list-profiles
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+import memory_planner
+from tree_patcher import atomic_write_bytes
+
+CONFIG_NAME = 'mlc-chat-config.json'
+DEFAULT_ROOT = './model_weights'
+BACKUP_SUFFIX = '.bak'
+STATE_SUFFIX = '.session'
+# written at the top level and under model_config
+DUAL_KEYS = {'context_window_size', 'prefill_chunk_size', 'sliding_window_size', 'attention_sink_size',
+             'tensor_parallel_shards', 'pipeline_parallel_stages'}
+# written under model_config only
+MODEL_KEYS = {'max_batch_size', 'dtype'}
+
+PROFILES = {
+    # GPU-only Metal compile (was set_gpu_shard_config.py); mmap loads the 74 weight shards at runtime
+    'gpu': ['default:tensor_parallel_shards=1', 'default:prefill_chunk_size=32', 'default:context_window_size=1024',
+            'default:max_batch_size=1', 'default:dtype=float16', 'default:device=metal'],
+    # CPU-only sharded compile (was set_cpu_shard_config.py)
+    'cpu': ['default:tensor_parallel_shards=4', 'default:prefill_chunk_size=32', 'default:context_window_size=1024',
+            'default:max_batch_size=1'],
+    # fixed small buffers for iPhone (was update_mlc_config.py)
+    'ios-compact': ['set:prefill_chunk_size=32', 'set:context_window_size=1024', 'set:max_batch_size=1',
+                    'set:dtype=float16'],
+    # fixed larger buffers (was update_config.py)
+    'ios-large': ['set:prefill_chunk_size=128', 'set:context_window_size=4096', 'set:max_batch_size=1',
+                  'set:dtype=float16'],
+}
+
+
+def locations(cfg, key):
+    """The dicts `key` belongs in."""
+    if key in DUAL_KEYS:
+        return [('top', cfg), ('model_config', cfg.setdefault('model_config', {}))]
+    if key in MODEL_KEYS:
+        return [('model_config', cfg.setdefault('model_config', {}))]
+    return [('top', cfg)]
+
+
+def parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def sha256_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class ConfigSession:
+    """One mlc-chat-config.json: loaded once, transformed in memory, saved once."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.original_bytes = f.read()
+        self.original = json.loads(self.original_bytes.decode('utf-8'))
+        self.cfg = json.loads(self.original_bytes.decode('utf-8'))
+        self.changes = []  # [(transform, location, key, old, new)]
+        self.status = None
+
+    def set(self, key, value, only_if_missing=False, transform=None):
+        for where, target in locations(self.cfg, key):
+            if only_if_missing and key in target:
+                continue
+            old = target.get(key)
+            if old != value or key not in target:
+                target[key] = value
+                self.changes.append((transform, where, key, old, value))
+
+    def apply(self, spec):
+        """Apply one transform spec (see the module docstring)."""
+        if spec in PROFILES:
+            for step in PROFILES[spec]:
+                self._apply_step(step, spec)
+        else:
+            self._apply_step(spec, spec)
+        return self
+
+    def _apply_step(self, step, transform):
+        if step.startswith(('set:', 'default:')):
+            mode, _, assignment = step.partition(':')
+            key, sep, value = assignment.partition('=')
+            if not sep or not key:
+                raise ValueError(f'bad transform {step!r} (expected {mode}:KEY=VALUE)')
+            self.set(key, parse_value(value), only_if_missing=(mode == 'default'), transform=transform)
+        elif step.startswith('memory-budget='):
+            self._memory_budget(step.partition('=')[2], transform)
+        else:
+            raise ValueError(f'unknown transform {step!r} (profiles: {", ".join(sorted(PROFILES))})')
+
+    def _memory_budget(self, target, transform):
+        shape = memory_planner.ModelShape(self.cfg)
+        weights, _ = memory_planner.weights_bytes(self.path, shape)
+        if target in memory_planner.DEVICES:
+            budget = int(memory_planner.DEVICES[target] * memory_planner.DEFAULT_USABLE_FRACTION)
+        else:
+            budget = memory_planner.parse_bytes(target)
+        batch = self.cfg.get('model_config', {}).get('max_batch_size') or 1
+        solved = memory_planner.solve(shape, weights, budget, batch)
+        if solved is None:
+            raise ValueError(f'no context/prefill fits {memory_planner.fmt(budget)} '
+                             f'(weights {memory_planner.fmt(weights)})')
+        context, prefill = solved
+        self.set('context_window_size', context, transform=transform)
+        self.set('prefill_chunk_size', prefill, transform=transform)
+
+    @property
+    def changed(self):
+        return self.cfg != self.original
+
+    def _backup(self):
+        """Keep <config>.bak equal to the last config this tool did not write itself."""
+        backup, state_path = self.path + BACKUP_SUFFIX, self.path + STATE_SUFFIX
+        current = sha256_bytes(self.original_bytes)
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        if os.path.exists(backup) and (state.get('written') == current or state.get('backup') == current):
+            return state.get('backup')
+        atomic_write_bytes(backup, self.original_bytes)
+        return current
+
+    def save(self, dry_run=False):
+        """'unchanged', 'would write' or 'written'."""
+        if not self.changed:
+            return 'unchanged'
+        if dry_run:
+            return 'would write'
+        backup_sha = self._backup()
+        data = (json.dumps(self.cfg, indent=2) + '\n').encode('utf-8')
+        atomic_write_bytes(self.path, data)
+        atomic_write_bytes(self.path + STATE_SUFFIX,
+                           json.dumps({'written': sha256_bytes(data), 'backup': backup_sha}).encode('utf-8'))
+        return 'written'
+
+
+def run(path, transforms, dry_run=False):
+    """Load `path`, apply `transforms` in order, save once. Returns the session."""
+    session = ConfigSession(path)
+    for spec in transforms:
+        session.apply(spec)
+    session.status = session.save(dry_run)
+    return session
+
+
+def find_configs(paths):
+    out, seen = [], set()
+    for p in paths:
+        if os.path.isdir(p):
+            found = []
+            for dirpath, dirnames, filenames in os.walk(p):
+                dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+                if CONFIG_NAME in filenames:
+                    found.append(os.path.join(dirpath, CONFIG_NAME))
+            candidates = found
+        else:
+            candidates = [p]
+        for c in candidates:
+            key = os.path.realpath(c)
+            if key not in seen:
+                seen.add(key)
+                out.append(c)
+    return out
+
+
+def print_session(session):
+    icon = {'written': '✅', 'would write': '📝', 'unchanged': '⏭️ '}[session.status]
+    print(f"{icon} {session.path}: {session.status}")
+    for transform, where, key, old, new in session.changes:
+        print(f"   [{transform}] {where}.{key}: {json.dumps(old)} -> {json.dumps(new)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply ordered transforms to mlc-chat-config.json files')
+    parser.add_argument('paths', nargs='*', help=f'config files or model directories (default {DEFAULT_ROOT})')
+    parser.add_argument('-t', '--transform', action='append', default=[], help='transform spec (repeatable, in order)')
+    parser.add_argument('--dry-run', action='store_true', help='show the changes without writing')
+    parser.add_argument('--list-profiles', action='store_true')
+    args = parser.parse_args(argv)
+
+    if args.list_profiles:
+        for name, steps in PROFILES.items():
+            print(f"{name}: {' '.join(steps)}")
+        return 0
+    configs = find_configs(args.paths or [DEFAULT_ROOT])
+    if not configs:
+        print(f"ERROR: no {CONFIG_NAME} found under {', '.join(args.paths or [DEFAULT_ROOT])}")
+        return 1
+    failed = 0
+    for path in configs:
+        try:
+            print_session(run(path, args.transform, args.dry_run))
+        except (OSError, ValueError, KeyError) as e:
+            failed += 1
+            print(f"❌ {path}: {e}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Content-addressed install of one source file (json_ffi_engine.cc) into many
+targets.
+
+The source is read and hashed once. A target whose size and sha256 already
+match is left alone: it is not rewritten and its mtime is not touched, so
+CMake and other timestamp-based build caches keep their results. A changed
+target is backed up (hardlinked to <name>.bak, since the target is replaced
+by rename and not written in place) and replaced atomically. It gets a fresh
+mtime, so anything built from it is correctly considered stale.
+
+Diagnostic copies are hardlinks where possible, then reflinks (FICLONE on
+Linux), and plain copies only as a last resort.
+
+Everything that happened is recorded in a JSON manifest.
+
+Usage:
+    python content_install.py SOURCE TARGET [TARGET ...] [--manifest install_manifest.json] [--no-backup]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+from tree_patcher import atomic_write_bytes
+
+FICLONE = 0x40049409  # _IOW(0x94, 9, int), linux/fs.h
+
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _same_inode(a, b):
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
+
+
+def reflink(src, dest):
+    """Copy-on-write clone of src at dest (Linux btrfs/xfs); raises OSError if unsupported."""
+    import fcntl
+    with open(src, 'rb') as fin, open(dest, 'wb') as fout:
+        try:
+            fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+        except OSError:
+            fout.close()
+            os.remove(dest)
+            raise
+
+
+class ContentInstaller:
+    """Install one source into many targets, skipping identical ones."""
+
+    def __init__(self, source):
+        self.source = os.path.abspath(str(source))
+        with open(self.source, 'rb') as f:
+            self.data = f.read()
+        self.sha256 = hashlib.sha256(self.data).hexdigest()
+        self.mode = os.stat(self.source).st_mode & 0o777
+        self.actions = []
+
+    def _record(self, **action):
+        self.actions.append(action)
+        return action
+
+    def matches(self, path):
+        """True if `path` already holds exactly the source bytes."""
+        try:
+            if os.path.getsize(path) != len(self.data):
+                return False
+            return _same_inode(path, self.source) or sha256_file(path) == self.sha256
+        except OSError:
+            return False
+
+    def install(self, target, backup=True, role='target'):
+        """Install into `target`. action is 'identical', 'installed' or 'failed'."""
+        target = str(target)
+        if self.matches(target):
+            return self._record(path=target, role=role, action='identical', sha256_before=self.sha256)
+        existed = os.path.exists(target)
+        before = None
+        try:
+            before = sha256_file(target) if existed else None
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            bak = None
+            if backup and existed:
+                bak = target + '.bak'
+                if not os.path.exists(bak):
+                    try:
+                        os.link(target, bak)  # the old inode survives the rename below
+                    except OSError:
+                        shutil.copy2(target, bak)
+                else:
+                    bak = None
+            atomic_write_bytes(target, self.data, self.mode)
+        except OSError as e:
+            return self._record(path=target, role=role, action='failed', sha256_before=before, error=str(e))
+        return self._record(path=target, role=role, action='installed', sha256_before=before,
+                            backup=bak, bytes_written=len(self.data))
+
+    def mirror(self, src, dest, role='diagnostic'):
+        """Place a copy of `src` at `dest`: hardlink, else reflink, else copy."""
+        src, dest = str(src), str(dest)
+        if _same_inode(src, dest):
+            return self._record(path=dest, role=role, action='identical', method='hardlink', source=src)
+        try:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            if os.path.lexists(dest):
+                os.remove(dest)
+            for method, fn in (('hardlink', os.link), ('reflink', reflink), ('copy', shutil.copy2)):
+                try:
+                    fn(src, dest)
+                    break
+                except OSError:
+                    if method == 'copy':
+                        raise
+        except OSError as e:
+            return self._record(path=dest, role=role, action='failed', source=src, error=str(e))
+        return self._record(path=dest, role=role, action='linked' if method != 'copy' else 'copied',
+                            method=method, source=src)
+
+    def summary(self):
+        counts = {}
+        for a in self.actions:
+            counts[a['action']] = counts.get(a['action'], 0) + 1
+        return counts
+
+    def save(self, path):
+        path = str(path)
+        data = {'source': self.source, 'sha256': self.sha256, 'size': len(self.data),
+                'created': time.time(), 'summary': self.summary(), 'actions': self.actions}
+        atomic_write_bytes(os.path.abspath(path), json.dumps(data, indent=2).encode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Install a file into many targets, skipping identical ones')
+    parser.add_argument('source')
+    parser.add_argument('targets', nargs='+')
+    parser.add_argument('--manifest', default=None, help='write the JSON manifest here')
+    parser.add_argument('--no-backup', action='store_true', help='do not keep <target>.bak of replaced files')
+    args = parser.parse_args()
+
+    installer = ContentInstaller(args.source)
+    for target in args.targets:
+        action = installer.install(target, backup=not args.no_backup)
+        icon = {'identical': '⏭️ ', 'installed': '✅', 'failed': '❌'}[action['action']]
+        print(f"{icon} {action['action']}: {target}" + (f" ({action['error']})" if 'error' in action else ''))
+    if args.manifest:
+        installer.save(args.manifest)
+    return 1 if installer.summary().get('failed') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Single-pass C++ lexer for brace / namespace balance checks.
+
+One compiled token regex walks the file. Comments (// with line
+continuations, /* */), string and char literals (with u8/u/U/L prefixes),
+raw strings R"delim(...)delim", digit separators (1'000) and preprocessor
+lines are skipped, so braces inside them are never counted. A '//' inside a
+string such as "https://..." is not treated as a comment.
+
+Each '{' is pushed with its offset and kind: namespace, extern, class,
+struct, union, enum or block. The report lists the exact line and column of
+every unmatched '{' and '}'. It also lists lexical errors (unterminated
+comment, string or raw string), because when there are any the brace counts
+cannot be trusted.
+
+Used by fix_jsonffi_braces.py. A whole tree can be checked in parallel.
+
+Usage:
+    python cpp_brace_lexer.py FILE_OR_DIR [...] [--json] [--workers N]
+"""
+import argparse
+import bisect
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+CPP_SUFFIXES = ('.cc', '.cpp', '.cxx', '.c', '.h', '.hh', '.hpp', '.hxx', '.mm', '.m', '.inl')
+SCOPE_KEYWORDS = ('namespace', 'extern', 'class', 'struct', 'union', 'enum')
+
+TOKEN = re.compile(r'''
+      (?P<pp>^[ \t]*\#)
+    | (?P<lc>//)
+    | (?P<bc>/\*)
+    | (?P<raw>(?:u8|[uUL])?R"(?P<delim>[^()\\\s"]{0,16})\()
+    | (?P<str>(?:u8|[uUL])?")
+    | (?P<chr>(?:u8|[uUL])?')
+    | (?P<num>\.?\d(?:'?[\w.]|[eEpP][+-])*)
+    | (?P<ident>[A-Za-z_]\w*)
+    | (?P<open>\{)
+    | (?P<close>\})
+    | (?P<punct>[;()=])
+''', re.M | re.X)
+STR_TAIL = re.compile(r'(?:[^"\\\n]|\\(?:.|\n))*"', re.S)
+CHR_TAIL = re.compile(r"(?:[^'\\\n]|\\(?:.|\n))*'", re.S)
+
+
+class Brace:
+    __slots__ = ('offset', 'kind', 'name', 'line', 'col')
+
+    def __init__(self, offset, kind='block', name=''):
+        self.offset = offset
+        self.kind = kind
+        self.name = name
+        self.line = self.col = 0
+
+    def as_dict(self):
+        return {'line': self.line, 'col': self.col, 'kind': self.kind, 'name': self.name}
+
+    def __repr__(self):
+        label = f'{self.kind} {self.name}'.strip()
+        return f'{self.line}:{self.col} {label}'
+
+
+class BraceReport:
+    """Result of one scan: unmatched braces and lexical errors, with positions."""
+
+    __slots__ = ('path', 'opens', 'closes', 'unmatched_open', 'unmatched_close', 'errors')
+
+    def __init__(self, path=None):
+        self.path = path
+        self.opens = 0
+        self.closes = 0
+        self.unmatched_open = []
+        self.unmatched_close = []
+        self.errors = []  # [(line, col, message)]
+
+    @property
+    def balanced(self):
+        return not self.unmatched_open and not self.unmatched_close and not self.errors
+
+    @property
+    def trustworthy(self):
+        return not self.errors
+
+    def as_dict(self):
+        return {
+            'path': self.path, 'opens': self.opens, 'closes': self.closes, 'balanced': self.balanced,
+            'unmatched_open': [b.as_dict() for b in self.unmatched_open],
+            'unmatched_close': [b.as_dict() for b in self.unmatched_close],
+            'errors': [{'line': l, 'col': c, 'message': m} for l, c, m in self.errors],
+        }
+
+
+def _scope_of(words, saw_paren):
+    """Kind and name of a '{' from the identifiers of the statement it opens."""
+    if saw_paren:
+        return 'block', ''
+    # last keyword wins: `template <class T> struct X {` is a struct
+    for i in range(len(words) - 1, -1, -1):
+        w = words[i]
+        if w not in SCOPE_KEYWORDS:
+            continue
+        if w == 'extern':
+            return 'extern', ''
+        if w in ('class', 'struct') and i and words[i - 1] == 'enum':
+            w = 'enum'
+        rest = [x for x in words[i + 1:] if x not in ('final', 'inline')]
+        if w == 'namespace':
+            return w, '::'.join(rest)
+        return w, rest[0] if rest else ''
+    return 'block', ''
+
+
+def scan(text, path=None):
+    """Lex `text` once and return a BraceReport."""
+    report = BraceReport(path)
+    stack = []
+    words = []          # identifiers of the current statement
+    saw_paren = False
+    pos, n = 0, len(text)
+    search = TOKEN.search
+    error_at = []       # [(offset, message)]
+
+    while pos < n:
+        m = search(text, pos)
+        if m is None:
+            break
+        kind = m.lastgroup if m.lastgroup != 'delim' else 'raw'
+        end = m.end()
+        if kind == 'ident':
+            words.append(m.group())
+            if len(words) > 16:
+                del words[:-16]
+            pos = end
+        elif kind == 'num':
+            pos = end
+        elif kind == 'open':
+            report.opens += 1
+            scope, name = _scope_of(words, saw_paren)
+            stack.append(Brace(m.start(), scope, name))
+            words, saw_paren = [], False
+            pos = end
+        elif kind == 'close':
+            report.closes += 1
+            if stack:
+                stack.pop()
+            else:
+                report.unmatched_close.append(Brace(m.start(), 'close'))
+            words, saw_paren = [], False
+            pos = end
+        elif kind == 'punct':
+            if m.group() == ';':
+                words, saw_paren = [], False
+            else:
+                saw_paren = True
+            pos = end
+        elif kind == 'str':
+            t = STR_TAIL.match(text, end)
+            if t is None:
+                error_at.append((m.start(), 'unterminated string literal'))
+                nl = text.find('\n', end)
+                pos = n if nl < 0 else nl + 1
+            else:
+                pos = t.end()
+        elif kind == 'chr':
+            t = CHR_TAIL.match(text, end)
+            if t is None:
+                error_at.append((m.start(), 'unterminated character literal'))
+                nl = text.find('\n', end)
+                pos = n if nl < 0 else nl + 1
+            else:
+                pos = t.end()
+        elif kind == 'raw':
+            close = ')' + m.group('delim') + '"'
+            e = text.find(close, end)
+            if e < 0:
+                error_at.append((m.start(), 'unterminated raw string'))
+                break
+            pos = e + len(close)
+        elif kind == 'bc':
+            e = text.find('*/', end)
+            if e < 0:
+                error_at.append((m.start(), 'unterminated /* comment'))
+                break
+            pos = e + 2
+        else:  # 'lc' and 'pp' run to the first newline not escaped by a backslash
+            e = end
+            while True:
+                if kind == 'pp':
+                    # a /* comment inside a directive may span lines
+                    nl = text.find('\n', e)
+                    bc = text.find('/*', e, n if nl < 0 else nl)
+                    if bc >= 0:
+                        ce = text.find('*/', bc + 2)
+                        if ce < 0:
+                            error_at.append((bc, 'unterminated /* comment'))
+                            e = n
+                            break
+                        e = ce + 2
+                        continue
+                else:
+                    nl = text.find('\n', e)
+                if nl < 0:
+                    e = n
+                    break
+                if nl and (text[nl - 1] == '\\' or (text[nl - 1] == '\r' and nl > 1 and text[nl - 2] == '\\')):
+                    e = nl + 1
+                    continue
+                e = nl + 1
+                break
+            pos = e
+
+    report.unmatched_open = stack
+    _locate(text, report.unmatched_open + report.unmatched_close)
+    starts = _line_starts(text) if error_at else None
+    for offset, message in error_at:
+        line = bisect.bisect_right(starts, offset)
+        report.errors.append((line, offset - starts[line - 1] + 1, message))
+    return report
+
+
+def _line_starts(text):
+    return [0] + [m.end() for m in re.finditer('\n', text)]
+
+
+def _locate(text, braces):
+    if not braces:
+        return
+    starts = _line_starts(text)
+    for b in braces:
+        b.line = bisect.bisect_right(starts, b.offset)
+        b.col = b.offset - starts[b.line - 1] + 1
+
+
+def check_file(path):
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            text = f.read()
+    except OSError as e:
+        report = BraceReport(path)
+        report.errors.append((0, 0, str(e)))
+        return report
+    return scan(text, path)
+
+
+def closing_text(report):
+    """Text that closes the unmatched '{' in `report` innermost first, or ''."""
+    lines = []
+    for b in reversed(report.unmatched_open):
+        if b.kind == 'namespace':
+            lines.append(f'}}  // namespace {b.name}'.rstrip())
+        elif b.kind in ('class', 'struct', 'union', 'enum'):
+            lines.append('};')
+        else:
+            lines.append('}')
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+def iter_sources(paths):
+    for p in paths:
+        if os.path.isdir(p):
+            for dirpath, dirnames, filenames in os.walk(p):
+                dirnames[:] = sorted(d for d in dirnames if not d.startswith('.') and d not in ('build', '3rdparty'))
+                for fn in sorted(filenames):
+                    if fn.endswith(CPP_SUFFIXES):
+                        yield os.path.join(dirpath, fn)
+        else:
+            yield p
+
+
+def check_tree(paths, workers=None):
+    """BraceReports for every C/C++ source under `paths`, checked in parallel processes."""
+    files = list(iter_sources(paths))
+    if len(files) < 8 or workers == 1:
+        return [check_file(f) for f in files]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(check_file, files, chunksize=16))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check brace / namespace balance in C++ sources')
+    parser.add_argument('paths', nargs='+', help='files or directories (e.g. mlc-llm-source/cpp)')
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    reports = check_tree(args.paths, args.workers)
+    bad = [r for r in reports if not r.balanced]
+    if args.json:
+        print(json.dumps({'files': len(reports), 'unbalanced': [r.as_dict() for r in bad]}, indent=2))
+    else:
+        for r in bad:
+            print(f"❌ {r.path}: {r.opens} '{{' / {r.closes} '}}'")
+            for line, col, message in r.errors:
+                print(f"   {r.path}:{line}:{col}: {message}")
+            for b in r.unmatched_open:
+                print(f"   {r.path}:{b.line}:{b.col}: unmatched '{{' ({f'{b.kind} {b.name}'.strip()})")
+            for b in r.unmatched_close:
+                print(f"   {r.path}:{b.line}:{b.col}: unmatched '}}'")
+        print(f"{'✅' if not bad else '⚠️ '} {len(reports)} files checked, {len(bad)} unbalanced")
+    return 1 if bad else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
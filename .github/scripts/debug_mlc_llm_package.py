@@ -5,11 +5,19 @@ Gracefully handles missing `mlc_llm` imports and inspects common locations:
  - repo-local `mlc-llm-source` (when present)
  - `.github/patches` fallback
 Prints the head of any found `json_ffi_engine.cc` files (up to 80 lines).
+All roots are walked once into a package inventory (package_inventory.py),
+written to tmp_ci_diagnostics/inventory/ as JSON plus a binary index. A copy
+is kept in MLC_INVENTORY_CACHE (default ~/.cache/mlc_inventory, persisted by
+the workflow's actions/cache), and the changes since that previous run's
+inventory are listed.
 """
 import os
 import sys
 from pathlib import Path
 
+import package_inventory
+from jsonffi_locator import JSONFFI_NAME
+
 REPO_ROOT = Path(__file__).resolve().parents[2]
 
 try:
@@ -39,6 +47,34 @@ patch_dir = REPO_ROOT / '.github' / 'patches'
 if patch_dir.exists():
     candidates.append(str(patch_dir))
 
+inventory_dir = REPO_ROOT / 'tmp_ci_diagnostics' / 'inventory'
+inventory_json = inventory_dir / 'package_inventory.json'
+cache_dir = Path(os.environ.get('MLC_INVENTORY_CACHE') or Path.home() / '.cache' / 'mlc_inventory')
+cached_index = cache_dir / 'package_inventory.idx'
+previous = None
+for earlier in (cached_index, inventory_json):
+    if earlier.exists():
+        try:
+            previous = package_inventory.load(str(earlier))
+            break
+        except Exception as e:
+            print('previous inventory unreadable:', earlier, e)
+
+print('\nBuilding inventory of candidate roots (one pass)...')
+inventory = package_inventory.build([p for p in candidates if p], previous)
+files = inventory['files']
+try:
+    package_inventory.write_json(inventory, str(inventory_json))
+    package_inventory.write_index(inventory, str(inventory_dir / 'package_inventory.idx'))
+    package_inventory.write_index(inventory, str(cached_index))
+    print('inventory written to', inventory_dir, 'and', cache_dir)
+except OSError as e:
+    print('inventory write failed:', e)
+package_inventory.print_summary(inventory)
+if previous is not None:
+    print('Changes since the previous inventory:')
+    package_inventory.print_diff(package_inventory.diff(previous, inventory))
+
 seen = set()
 print('\nScanning candidate roots for json_ffi_engine.cc...')
 for p in candidates:
@@ -57,33 +93,30 @@ for p in candidates:
     except Exception:
         pass
 
-    for r, dirs, files in os.walk(p):
-        for name in files:
-            if name == 'json_ffi_engine.cc':
-                f = os.path.join(r, name)
-                print('FOUND:', f)
-                try:
-                    with open(f, 'r', encoding='utf-8', errors='replace') as fh:
-                        print('--- head of file ---')
-                        for i, l in enumerate(fh):
-                            if i >= 80:
-                                break
-                            print(l.rstrip())
-                    count += 1
-                except Exception as e:
-                    print('  read failed:', e)
+    prefix = os.path.realpath(p).rstrip(os.sep) + os.sep
+    under = [f for f in files if f.startswith(prefix)]
+    for f in under:
+        if os.path.basename(f) != JSONFFI_NAME:
+            continue
+        print('FOUND:', f, f"(sha256 {files[f]['sha256']})")
+        try:
+            with open(f, 'r', encoding='utf-8', errors='replace') as fh:
+                print('--- head of file ---')
+                for i, l in enumerate(fh):
+                    if i >= 80:
+                        break
+                    print(l.rstrip())
+            count += 1
+        except Exception as e:
+            print('  read failed:', e)
         # quick break to avoid huge output
         if count > 6:
             break
 
-    # Also search for compiled extension modules or object files
-    try:
-        print('\nSearching for .so, .dylib, .o files in', p)
-        for r, dirs, files in os.walk(p):
-            for name in files:
-                if name.endswith(('.so', '.dylib', '.o')):
-                    print('  compiled:', os.path.join(r, name))
-    except Exception:
-        pass
+    # Also list compiled extension modules or object files
+    print('\nCompiled .so, .dylib, .o files in', p)
+    for f in under:
+        if files[f]['kind'] != 'source':
+            print('  compiled:', f, f"{files[f]['size']} bytes")
 
 print('\nDone')
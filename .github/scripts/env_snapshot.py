@@ -0,0 +1,588 @@
+#!/usr/bin/env python3
+"""
+Content-addressed snapshot / restore of the installed and patched mlc_llm + tvm environment.
+
+`capture` records the site-packages files of the mlc-llm / mlc-ai / tvm
+distributions (plus everything they require that is installed, the patch
+manifest and the bool import hook) after pip install and all patch scripts
+have run. Exactly the files their RECORDs list are captured (plus the
+bytecode compiled for those modules), never whole top-level directories, so
+files of other distributions sharing a directory (__pycache__, namespace
+packages) are left alone. File contents go into a shared object store keyed
+by sha256; the snapshot itself is a small JSON file listing (path, object,
+mode, mtime) and the distribution versions, and its id is the hash of that
+listing together with the patch fingerprint (hash of .github/scripts,
+.github/patches and the workflow patcher). `restore` removes only the files
+the snapshot lists and the files the installed versions of its distributions
+list in their RECORD, then recreates the snapshot's files as fresh copies of
+the store objects, or with a single tar extract when the snapshot was
+captured with --archive.
+
+Nightly wheels change under the same patch fingerprint, so `key` and
+`restore` first ask pip which versions of the candidate wheels
+(mlc-llm-nightly-cpu, mlc-ai-nightly-cpu from https://mlc.ai/wheels) it
+would install now (`pip index versions`, no download). The key includes
+them, and `restore` rejects a snapshot whose captured versions differ. When
+the index cannot be reached, `restore` says so and falls back to the newest
+snapshot without the version check.
+
+Mtimes are restored exactly, so the patch manifest still sees every patched
+file as fresh and the captured __pycache__ stays valid. `restore --link`
+hardlinks the read-only store objects instead of copying them, which is
+faster but shares their inode with the store: a later in-place write either
+fails (EPERM) or, as root, silently changes the store for every snapshot
+using that object. Use it only when everything that runs afterwards replaces
+files (tree_patcher.atomic_write_bytes) rather than writing them in place.
+
+Store layout (default ~/.cache/mlc_env_snapshot, or MLC_ENV_SNAPSHOT_STORE):
+    objects/ab/<sha256>[x]     file contents (read-only, 'x' suffix = executable)
+    snapshots/<id>.json        snapshot listing and metadata
+    archives/<id>.tar          optional single-archive form
+    refs/<name>                named pointer to a snapshot id
+
+Usage:
+    python env_snapshot.py key                      # python tag + patch fingerprint + candidate versions, for CI cache keys
+    python env_snapshot.py capture [--ref NAME] [--archive] [--site-packages DIR]
+    python env_snapshot.py restore (--latest | --ref NAME | --id ID) [--archive] [--link] [--any-version]
+                                   [--site-packages DIR]
+    python env_snapshot.py verify  (--latest | --ref NAME | --id ID) [--site-packages DIR]
+    python env_snapshot.py list
+
+`restore` exits with status 1 when no matching snapshot exists, so a
+pipeline can fall back to the full install.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import re
+import shutil
+import site
+import stat
+import subprocess
+import sys
+import tarfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from patch_manifest import MANIFEST_NAME
+from tree_patcher import atomic_write_bytes, atomic_writer
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+GITHUB_DIR = os.path.dirname(SCRIPTS_DIR)
+
+DEFAULT_DISTS = (
+    'mlc-llm-nightly-cpu', 'mlc-ai-nightly-cpu', 'mlc-llm', 'mlc-ai',
+    'tvm', 'tvm-ffi', 'apache-tvm', 'huggingface-hub',
+)
+# site-packages entries written by the patch scripts that no RECORD lists
+EXTRA_PATHS = (MANIFEST_NAME, 'mlc_bool_hook.pth', 'mlc_bool_hook')
+# what the workflow pip-installs from WHEEL_FIND_LINKS; their current versions are part of the key
+CANDIDATE_WHEELS = ('mlc-llm-nightly-cpu', 'mlc-ai-nightly-cpu')
+WHEEL_FIND_LINKS = 'https://mlc.ai/wheels'
+SNAPSHOT_FORMAT = 2
+
+
+def default_store():
+    return os.environ.get('MLC_ENV_SNAPSHOT_STORE') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'mlc_env_snapshot')
+
+
+def python_tag():
+    return f"cp{sys.version_info.major}{sys.version_info.minor}-{sys.platform}-{platform.machine()}"
+
+
+def patch_fingerprint():
+    """Hash of every input that decides how the environment gets patched."""
+    h = hashlib.sha256()
+    inputs = []
+    for sub, suffixes in (('scripts', ('.py', '.sh')), ('patches', None), ('workflows', ('.py',))):
+        d = os.path.join(GITHUB_DIR, sub)
+        if os.path.isdir(d):
+            for name in sorted(os.listdir(d)):
+                path = os.path.join(d, name)
+                if os.path.isfile(path) and (suffixes is None or name.endswith(suffixes)):
+                    inputs.append((f'{sub}/{name}', path))
+    for rel, path in inputs:
+        with open(path, 'rb') as f:
+            h.update(rel.encode('utf-8') + b'\0' + hashlib.sha256(f.read()).digest())
+    return h.hexdigest()[:16]
+
+
+def normalize(name):
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def candidate_versions(names=CANDIDATE_WHEELS, find_links=WHEEL_FIND_LINKS, timeout=60):
+    """{name: version pip would install now, or None when it cannot be resolved}."""
+    def resolve(name):
+        cmd = [sys.executable, '-m', 'pip', 'index', 'versions', name, '--pre', '--disable-pip-version-check']
+        if find_links:
+            cmd += ['-f', find_links]
+        try:
+            res = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        except (OSError, subprocess.SubprocessError):
+            return None
+        m = re.match(r'\S+ \(([^)]+)\)', res.stdout.strip()) if res.returncode == 0 else None
+        return m.group(1) if m else None
+
+    with ThreadPoolExecutor(max_workers=max(1, len(names))) as pool:
+        return dict(zip(names, pool.map(resolve, names)))
+
+
+def versions_fingerprint(candidates):
+    if not any(candidates.values()):
+        return 'unresolved'
+    return hashlib.sha256(json.dumps(candidates, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+
+def version_mismatches(snapshot, candidates):
+    """[(name, wanted, captured)] for resolved candidates the snapshot does not hold at that version."""
+    have = {normalize(n): v for n, v in snapshot['distributions'].items()}
+    return [(name, wanted, have.get(normalize(name))) for name, wanted in sorted(candidates.items())
+            if wanted and have.get(normalize(name)) != wanted]
+
+
+def find_site_pkg():
+    for sp in site.getsitepackages():
+        if os.path.isdir(os.path.join(sp, 'mlc_llm')):
+            return sp
+    return site.getsitepackages()[0]
+
+
+# ---------------------------------------------------------------------------
+# installed distributions
+
+def installed_distributions(site_pkg):
+    """{normalized name: {'name', 'version', 'dist_info', 'requires', 'record'}}"""
+    dists = {}
+    for entry in os.scandir(site_pkg):
+        if not (entry.is_dir() and entry.name.endswith('.dist-info')):
+            continue
+        info = {'name': None, 'version': None, 'dist_info': entry.name, 'requires': [], 'record': []}
+        try:
+            with open(os.path.join(entry.path, 'METADATA'), 'r', encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    if not line.strip():
+                        break  # end of headers
+                    key, _, value = line.partition(':')
+                    value = value.strip()
+                    if key == 'Name':
+                        info['name'] = value
+                    elif key == 'Version':
+                        info['version'] = value
+                    elif key == 'Requires-Dist' and 'extra ==' not in value:
+                        m = re.match(r'[A-Za-z0-9][A-Za-z0-9._-]*', value)
+                        if m:
+                            info['requires'].append(normalize(m.group(0)))
+        except OSError:
+            continue
+        try:
+            with open(os.path.join(entry.path, 'RECORD'), 'r', encoding='utf-8') as f:
+                info['record'] = [line.split(',', 1)[0] for line in f if line.strip()]
+        except OSError:
+            pass
+        if info['name']:
+            dists[normalize(info['name'])] = info
+    return dists
+
+
+def dependency_closure(dists, wanted):
+    """Installed distributions in `wanted` plus everything they (transitively) require."""
+    selected = []
+    stack = [normalize(w) for w in wanted]
+    while stack:
+        name = stack.pop()
+        if name in dists and name not in selected:
+            selected.append(name)
+            stack.extend(dists[name]['requires'])
+    return sorted(selected)
+
+
+def tree_files(site_pkg, rel):
+    """site-packages relative paths of the file/symlink `rel`, or of every file/symlink under directory `rel`."""
+    top = os.path.join(site_pkg, rel)
+    if not os.path.lexists(top):
+        return []
+    if not os.path.isdir(top) or os.path.islink(top):
+        return [rel]
+    out = []
+    for dirpath, dirnames, filenames in os.walk(top):
+        dirnames.sort()
+        for name in sorted(filenames) + [d for d in dirnames if os.path.islink(os.path.join(dirpath, d))]:
+            out.append(os.path.relpath(os.path.join(dirpath, name), site_pkg).replace(os.sep, '/'))
+    return out
+
+
+def record_paths(info):
+    """The RECORD entries of one distribution, normalized ('../' entries are console scripts in <prefix>/bin)."""
+    return [os.path.normpath(rel).replace(os.sep, '/') for rel in info['record']]
+
+
+def capture_paths(site_pkg, dists, selected):
+    """site-packages relative paths of every file to capture.
+
+    That is each selected distribution's RECORD entries and .dist-info,
+    the bytecode compiled next to its modules (the patch scripts recompile
+    it, RECORD may not list it) and EXTRA_PATHS. Directories are never
+    captured wholesale, so other distributions' files in a shared
+    directory stay out of the snapshot.
+    """
+    paths = set()
+    pycache = {}
+    for name in selected:
+        info = dists[name]
+        paths.update(tree_files(site_pkg, info['dist_info']))
+        for rel in record_paths(info):
+            paths.add(rel)
+            if rel.endswith('.py') and not rel.startswith('../'):
+                directory, base = os.path.split(rel)
+                cache_dir = os.path.join(directory, '__pycache__')
+                if cache_dir not in pycache:
+                    try:
+                        pycache[cache_dir] = os.listdir(os.path.join(site_pkg, cache_dir))
+                    except OSError:
+                        pycache[cache_dir] = []
+                prefix = base[:-len('.py')] + '.'
+                paths.update(f"{cache_dir}/{fn}" for fn in pycache[cache_dir]
+                             if fn.startswith(prefix) and fn.endswith('.pyc'))
+    for rel in EXTRA_PATHS:
+        paths.update(tree_files(site_pkg, rel))
+    return sorted(p for p in paths
+                  if os.path.islink(os.path.join(site_pkg, p)) or os.path.isfile(os.path.join(site_pkg, p)))
+
+
+# ---------------------------------------------------------------------------
+# store
+
+class SnapshotStore:
+    def __init__(self, root=None):
+        self.root = root or default_store()
+
+    def _dir(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def object_path(self, sha, executable):
+        return self._dir('objects', sha[:2], sha + ('x' if executable else ''))
+
+    def put_object(self, path, st):
+        """Hash `path` and add it to the store. Returns (sha, executable)."""
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        sha = h.hexdigest()
+        executable = bool(st.st_mode & 0o111)
+        obj = self.object_path(sha, executable)
+        if not os.path.exists(obj):
+            with open(path, 'rb') as src, atomic_writer(obj, 0o555 if executable else 0o444) as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+            os.utime(obj, ns=(st.st_atime_ns, st.st_mtime_ns))
+        return sha, executable
+
+    def write_json(self, sub, name, data):
+        atomic_write_bytes(self._dir(sub, name), json.dumps(data, indent=1, sort_keys=True).encode('utf-8'))
+
+    def set_ref(self, ref, snapshot_id):
+        atomic_write_bytes(self._dir('refs', ref), (snapshot_id + '\n').encode('utf-8'))
+
+    def snapshots(self):
+        d = self._dir('snapshots')
+        out = []
+        if os.path.isdir(d):
+            for name in os.listdir(d):
+                if name.endswith('.json'):
+                    try:
+                        with open(os.path.join(d, name), 'r', encoding='utf-8') as f:
+                            snapshot = json.load(f)
+                    except (OSError, ValueError):
+                        continue
+                    if snapshot.get('format') == SNAPSHOT_FORMAT:
+                        out.append(snapshot)
+        return sorted(out, key=lambda s: s['created'])
+
+    def load(self, snapshot_id=None, ref=None, latest=False, candidates=None):
+        """The requested snapshot; with `latest`, the newest one for this python, patch
+        fingerprint and (when given) candidate versions."""
+        if ref:
+            try:
+                with open(self._dir('refs', ref), 'r') as f:
+                    snapshot_id = f.read().strip()
+            except OSError:
+                return None
+        if latest:
+            tag, fingerprint = python_tag(), patch_fingerprint()
+            matching = [s for s in self.snapshots()
+                        if s['python'] == tag and s['patch_fingerprint'] == fingerprint
+                        and not version_mismatches(s, candidates or {})]
+            return matching[-1] if matching else None
+        try:
+            with open(self._dir('snapshots', snapshot_id + '.json'), 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, TypeError, ValueError):
+            return None
+        return snapshot if snapshot.get('format') == SNAPSHOT_FORMAT else None
+
+    def archive_path(self, snapshot_id):
+        return self._dir('archives', snapshot_id + '.tar')
+
+
+# ---------------------------------------------------------------------------
+# capture / restore
+
+def capture(site_pkg, store, wanted=DEFAULT_DISTS, ref=None, archive=False, workers=None):
+    dists = installed_distributions(site_pkg)
+    selected = dependency_closure(dists, wanted)
+    if not any(normalize(w) in selected for w in wanted):
+        print(f"❌ None of {', '.join(wanted)} is installed in {site_pkg}")
+        return None
+    paths = capture_paths(site_pkg, dists, selected)
+
+    def add(rel):
+        path = os.path.join(site_pkg, rel)
+        st = os.lstat(path)
+        if stat.S_ISLNK(st.st_mode):
+            return {'path': rel, 'link': os.readlink(path)}
+        sha, executable = store.put_object(path, st)
+        return {'path': rel, 'sha256': sha, 'x': executable, 'mtime_ns': st.st_mtime_ns}
+
+    workers = workers or min(32, (os.cpu_count() or 1) + 4)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        files = list(pool.map(add, paths))
+
+    body = {
+        'format': SNAPSHOT_FORMAT,
+        'python': python_tag(),
+        'patch_fingerprint': patch_fingerprint(),
+        'distributions': {dists[n]['name']: dists[n]['version'] for n in selected},
+        'dist_infos': sorted(dists[n]['dist_info'] for n in selected),
+        'files': files,
+    }
+    snapshot_id = hashlib.sha256(json.dumps(body, sort_keys=True).encode('utf-8')).hexdigest()[:24]
+    body.update(id=snapshot_id, created=time.time())
+    store.write_json('snapshots', snapshot_id + '.json', body)
+    if ref:
+        store.set_ref(ref, snapshot_id)
+    if archive:
+        write_archive(store, body)
+    return body
+
+
+def write_archive(store, snapshot):
+    path = store.archive_path(snapshot['id'])
+    if os.path.exists(path):
+        return path
+    with atomic_writer(path) as f, tarfile.open(fileobj=f, mode='w') as tar:
+        for entry in snapshot['files']:
+            info = tarfile.TarInfo(entry['path'])
+            if 'link' in entry:
+                info.type, info.linkname = tarfile.SYMTYPE, entry['link']
+                tar.addfile(info)
+                continue
+            obj = store.object_path(entry['sha256'], entry['x'])
+            info.size = os.path.getsize(obj)
+            info.mode = 0o755 if entry['x'] else 0o644
+            info.mtime = entry['mtime_ns'] / 1e9
+            with open(obj, 'rb') as src:
+                tar.addfile(info, src)
+    return path
+
+
+def _clear_targets(site_pkg, snapshot):
+    """Remove what the snapshot replaces, file by file.
+
+    That is every file the snapshot lists and every file an installed
+    version of one of its distributions lists in its RECORD (plus that
+    .dist-info). Shared directories are never removed wholesale; only
+    directories this leaves empty are pruned.
+    """
+    names = {normalize(n) for n in snapshot['distributions']}
+    paths = {entry['path'] for entry in snapshot['files']}
+    for name, info in installed_distributions(site_pkg).items():
+        if name in names:
+            paths.update(record_paths(info))
+            paths.update(tree_files(site_pkg, info['dist_info']))
+    emptied = set()
+    for rel in paths:
+        path = os.path.normpath(os.path.join(site_pkg, rel))
+        if os.path.islink(path) or os.path.isfile(path):
+            os.unlink(path)
+            emptied.add(os.path.dirname(path))
+    _prune_empty_dirs(site_pkg, emptied)
+
+
+def _prune_empty_dirs(site_pkg, dirs):
+    """rmdir each of `dirs` and its parents while empty, never leaving site_pkg."""
+    root = os.path.abspath(site_pkg)
+    for d in sorted(dirs, key=len, reverse=True):
+        d = os.path.abspath(d)
+        while d.startswith(root + os.sep):
+            try:
+                os.rmdir(d)
+            except OSError:
+                break
+            d = os.path.dirname(d)
+
+
+def _materialize(site_pkg, store, entry, link):
+    dest = os.path.normpath(os.path.join(site_pkg, entry['path']))
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    if os.path.lexists(dest):
+        os.unlink(dest)
+    if 'link' in entry:
+        os.symlink(entry['link'], dest)
+        return 'symlink'
+    obj = store.object_path(entry['sha256'], entry['x'])
+    if link and os.stat(obj).st_mtime_ns == entry['mtime_ns']:
+        try:
+            os.link(obj, dest)
+            return 'link'
+        except OSError:
+            pass  # cross-device or unsupported: copy instead
+    shutil.copyfile(obj, dest)
+    os.chmod(dest, 0o755 if entry['x'] else 0o644)
+    os.utime(dest, ns=(entry['mtime_ns'], entry['mtime_ns']))
+    return 'copy'
+
+
+def restore(site_pkg, store, snapshot, link=False, use_archive=False, workers=None):
+    """Replace the snapshot's packages in `site_pkg`. Returns {method: count}.
+
+    Files are copied out of the store unless `link` is set (see the module
+    docstring for what hardlinking requires of later steps).
+    """
+    _clear_targets(site_pkg, snapshot)
+    counts = {}
+    archive = store.archive_path(snapshot['id'])
+    if use_archive and os.path.exists(archive):
+        with tarfile.open(archive, 'r') as tar:
+            for member in tar:
+                dest = os.path.normpath(os.path.join(site_pkg, member.name))
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                if member.issym():
+                    os.symlink(member.linkname, dest)
+                else:
+                    with tar.extractfile(member) as src, open(dest, 'wb') as out:
+                        shutil.copyfileobj(src, out)
+                    os.chmod(dest, member.mode)
+                    mtime_ns = _entry_for(snapshot, member.name)['mtime_ns']
+                    os.utime(dest, ns=(mtime_ns, mtime_ns))
+                counts['archive'] = counts.get('archive', 0) + 1
+        return counts
+
+    workers = workers or min(32, (os.cpu_count() or 1) + 4)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for method in pool.map(lambda e: _materialize(site_pkg, store, e, link), snapshot['files']):
+            counts[method] = counts.get(method, 0) + 1
+    return counts
+
+
+def _entry_for(snapshot, relpath):
+    index = snapshot.get('_index')
+    if index is None:
+        index = snapshot['_index'] = {e['path']: e for e in snapshot['files']}
+    return index[relpath]
+
+
+def verify(site_pkg, snapshot):
+    """Paths whose content, mode or mtime differ from the snapshot."""
+    bad = []
+    for entry in snapshot['files']:
+        path = os.path.normpath(os.path.join(site_pkg, entry['path']))
+        try:
+            if 'link' in entry:
+                ok = os.readlink(path) == entry['link']
+            else:
+                st = os.stat(path)
+                with open(path, 'rb') as f:
+                    ok = (hashlib.sha256(f.read()).hexdigest() == entry['sha256']
+                          and st.st_mtime_ns == entry['mtime_ns']
+                          and bool(st.st_mode & 0o111) == entry['x'])
+        except OSError:
+            ok = False
+        if not ok:
+            bad.append(entry['path'])
+    return bad
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Snapshot / restore the patched mlc_llm + tvm site-packages')
+    parser.add_argument('command', choices=['key', 'capture', 'restore', 'verify', 'list'])
+    parser.add_argument('--site-packages', default=None)
+    parser.add_argument('--store', default=None, help='object store (default: ~/.cache/mlc_env_snapshot)')
+    parser.add_argument('--dist', nargs='+', default=list(DEFAULT_DISTS), help='distributions to capture')
+    parser.add_argument('--ref', default=None, help='named reference to write (capture) or read')
+    parser.add_argument('--id', default=None, help='snapshot id')
+    parser.add_argument('--latest', action='store_true',
+                        help='newest snapshot for this python/platform and patch fingerprint')
+    parser.add_argument('--archive', action='store_true', help='write (capture) or extract (restore) a single tar')
+    parser.add_argument('--link', action='store_true',
+                        help='hardlink read-only store objects instead of copying (later steps must not write in place)')
+    parser.add_argument('--candidate', nargs='+', default=list(CANDIDATE_WHEELS),
+                        help='wheels whose current index version must match the snapshot (key, restore)')
+    parser.add_argument('--find-links', default=WHEEL_FIND_LINKS, help='where pip looks for the candidates')
+    parser.add_argument('--any-version', action='store_true',
+                        help='restore: skip resolving the candidates and the version check')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    store = SnapshotStore(args.store)
+    if args.command == 'key':
+        candidates = candidate_versions(args.candidate, args.find_links)
+        print(f"{python_tag()}-{patch_fingerprint()}-{versions_fingerprint(candidates)}")
+        return 0
+    if args.command == 'list':
+        for s in store.snapshots():
+            dists = ', '.join(f"{k}=={v}" for k, v in sorted(s['distributions'].items()))
+            print(f"{s['id']}  {time.strftime('%Y-%m-%d %H:%M', time.localtime(s['created']))}  "
+                  f"{s['python']}  patches={s['patch_fingerprint']}  {len(s['files'])} files  {dists}")
+        return 0
+
+    site_pkg = args.site_packages or find_site_pkg()
+    start = time.perf_counter()
+    if args.command == 'capture':
+        snapshot = capture(site_pkg, store, args.dist, args.ref, args.archive, args.workers)
+        if snapshot is None:
+            return 1
+        print(f"✅ Snapshot {snapshot['id']}: {len(snapshot['files'])} files from {site_pkg} "
+              f"({time.perf_counter() - start:.2f}s)")
+        for name, version in sorted(snapshot['distributions'].items()):
+            print(f"   {name}=={version}")
+        return 0
+
+    candidates = {}
+    if args.command == 'restore' and not args.any_version:
+        candidates = candidate_versions(args.candidate, args.find_links)
+        if not any(candidates.values()):
+            print(f"⚠️  Could not resolve {', '.join(args.candidate)} from {args.find_links}; "
+                  "restoring without the wheel version check")
+    snapshot = store.load(args.id, args.ref, args.latest, candidates)
+    if snapshot is None:
+        wanted = ', '.join(f"{k}=={v}" for k, v in sorted(candidates.items()) if v)
+        print(f"ℹ️  No matching snapshot in {store.root} (python {python_tag()}, patches {patch_fingerprint()}"
+              f"{', ' + wanted if wanted else ''})")
+        return 1
+    mismatches = version_mismatches(snapshot, candidates)
+    if mismatches:
+        for name, wanted, captured in mismatches:
+            print(f"❌ Snapshot {snapshot['id']} has {name}=={captured}, the index now has {wanted}")
+        return 1
+    if args.command == 'restore':
+        counts = restore(site_pkg, store, snapshot, args.link, args.archive, args.workers)
+        summary = ', '.join(f"{v} {k}" for k, v in sorted(counts.items()))
+        print(f"✅ Restored snapshot {snapshot['id']} into {site_pkg}: {summary} "
+              f"({time.perf_counter() - start:.2f}s)")
+        return 0
+    bad = verify(site_pkg, snapshot)
+    if bad:
+        print(f"❌ {len(bad)} files differ from snapshot {snapshot['id']}:")
+        for rel in bad[:20]:
+            print(f"   {rel}")
+        return 1
+    print(f"✅ {site_pkg} matches snapshot {snapshot['id']} ({len(snapshot['files'])} files)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,54 +1,102 @@
 #!/usr/bin/env python3
 """
-Attempt to repair unbalanced braces in json_ffi_engine.cc by counting braces
-after removing string literals and comments. This is a conservative, best-effort
-repair: if there are more unclosed '{' than '}', it appends closing braces at the end
-and records a backup in tmp_patched_jsonffi.
+Attempt to repair unbalanced braces in json_ffi_engine.cc (and every other
+source we patch) using the single-pass lexer in cpp_brace_lexer.py, which
+skips comments, string/char/raw-string literals and preprocessor lines.
+
+This is a conservative, best-effort repair:
+ - every unmatched '{' / '}' is reported with its line, column and kind
+ - if the only problem is unclosed '{', the matching closers are appended at
+   the end (`}  // namespace x` for namespaces) and a backup is recorded in
+   tmp_patched_jsonffi
+ - files with extra '}' or an unterminated comment/string are reported and
+   left alone, since appending braces there would only make them worse
+
+Usage:
+    python fix_jsonffi_braces.py [FILE ...]
+Default: mlc-llm-source's json_ffi_engine.cc plus every C++ file listed in
+tmp_patched_jsonffi/patched_targets.txt.
 """
-import re
-from pathlib import Path
+import hashlib
+import os
 import sys
+from pathlib import Path
+
+from cpp_brace_lexer import CPP_SUFFIXES, check_file, closing_text
+from tree_patcher import atomic_write_bytes
 
 REPO_ROOT = Path(__file__).resolve().parents[2]
 SRC = REPO_ROOT / 'mlc-llm-source' / 'cpp' / 'json_ffi' / 'json_ffi_engine.cc'
 OUT_DIR = REPO_ROOT / 'tmp_patched_jsonffi'
-OUT_DIR.mkdir(parents=True, exist_ok=True)
-
-if not SRC.exists():
-    print(f"Source file not found: {SRC}")
-    sys.exit(0)
-
-text = SRC.read_text(encoding='utf-8', errors='replace')
-# remove // comments
-no_line_comments = re.sub(r'//.*', '', text)
-# remove /* */ comments
-no_block_comments = re.sub(r'/\*.*?\*/', '', no_line_comments, flags=re.DOTALL)
-# remove string literals (basic)
-no_strings = re.sub(r'"(?:\\.|[^"\\])*"', '""', no_block_comments)
-# count braces
-opens = no_strings.count('{')
-closes = no_strings.count('}')
-print(f"Brace counts: opens={opens} closes={closes}")
-if opens <= closes:
-    print("Braces appear balanced or too many closing braces; nothing to do.")
-    sys.exit(0)
-missing = opens - closes
-print(f"Detected {missing} missing closing brace(s); appending to {SRC}")
-# backup
-bak = OUT_DIR / (SRC.name + '.bak')
-SRC.replace(SRC)  # noop to ensure path exists
-SRC.write_text(text, encoding='utf-8')
-# write backup copy
-with open(bak, 'w', encoding='utf-8') as f:
-    f.write(text)
-# append closing braces with comment
-append_lines = '\n' + ('}' + '\n') * missing
-with open(SRC, 'a', encoding='utf-8') as f:
-    f.write('\n// Appended by fix_jsonffi_braces.py to close unbalanced namespaces\n')
-    f.write(append_lines)
-print(f"Appended {missing} closing brace(s) to {SRC}; backup at {bak}")
-# write marker file
-with open(OUT_DIR / 'brace_fix_applied.txt', 'w') as f:
-    f.write(str(missing))
-
-sys.exit(0)
+
+
+def default_targets():
+    targets = [SRC]
+    listed = OUT_DIR / 'patched_targets.txt'
+    if listed.exists():
+        for line in listed.read_text(encoding='utf-8', errors='replace').splitlines():
+            if line.strip().endswith(CPP_SUFFIXES):
+                targets.append(Path(line.strip()))
+    seen, out = set(), []
+    for t in targets:
+        key = os.path.realpath(t)
+        if key not in seen and t.exists():
+            seen.add(key)
+            out.append(t)
+    return out
+
+
+def fix_file(path):
+    """Returns the number of closing braces appended (0 if nothing was changed)."""
+    report = check_file(str(path))
+    print(f"Brace counts for {path}: opens={report.opens} closes={report.closes}")
+    for line, col, message in report.errors:
+        print(f"  {path}:{line}:{col}: {message}")
+    for b in report.unmatched_close:
+        print(f"  {path}:{b.line}:{b.col}: unmatched '}}'")
+    for b in report.unmatched_open:
+        print(f"  {path}:{b.line}:{b.col}: unmatched '{{' ({f'{b.kind} {b.name}'.strip()})")
+    if report.balanced:
+        print("Braces balanced; nothing to do.")
+        return 0
+    if not report.trustworthy or report.unmatched_close:
+        print("Not auto-fixing: unterminated literal/comment or extra closing braces (see locations above).")
+        return 0
+
+    missing = len(report.unmatched_open)
+    print(f"Detected {missing} missing closing brace(s); appending to {path}")
+    data = path.read_bytes()
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    bak = OUT_DIR / (path.name + '.bak')
+    if bak.exists():
+        bak = OUT_DIR / f'{path.name}.{hashlib.sha1(str(path.resolve()).encode()).hexdigest()[:8]}.bak'
+    bak.write_bytes(data)
+    tail = '' if data.endswith(b'\n') else '\n'
+    tail += '\n// Appended by fix_jsonffi_braces.py to close unbalanced scopes\n' + closing_text(report)
+    # replace, not append in place: installed copies may be hardlinked (env_snapshot, content_install)
+    atomic_write_bytes(str(path), data + tail.encode('utf-8'))
+    print(f"Appended {missing} closing brace(s) to {path}; backup at {bak}")
+    return missing
+
+
+def main():
+    targets = [Path(p) for p in sys.argv[1:]] or default_targets()
+    if not targets:
+        print(f"Source file not found: {SRC}")
+        return 0
+    fixed = 0
+    for path in targets:
+        if not path.exists():
+            print(f"Source file not found: {path}")
+            continue
+        fixed += fix_file(path)
+    if fixed:
+        # marker file for later CI steps
+        OUT_DIR.mkdir(parents=True, exist_ok=True)
+        with open(OUT_DIR / 'brace_fix_applied.txt', 'w') as f:
+            f.write(str(fixed))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
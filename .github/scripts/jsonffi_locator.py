@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Shared, cached file locator for json_ffi_engine.cc copies (and other build files).
+
+Walks each root once with os.scandir, pruning directories that never hold
+the files we look for (__pycache__, *.dist-info, include, test dirs, conda
+package caches, ...), and skips roots nested in another root (site-packages
+inside sys.prefix is walked once, not twice).
+
+The result is cached per (roots, names, suffixes) as a directory tree:
+{dir: [mtime_ns, subdirs, matching files]}. Creating, deleting or renaming
+an entry changes its parent directory's mtime, so a warm lookup only stats
+the cached directories and re-lists the ones whose mtime changed.
+
+Used by verify_jsonffi_patch.py, debug_mlc_llm_package.py and
+show_installed_mlc_llm.py.
+
+Usage:
+    python jsonffi_locator.py [ROOT ...] [--name json_ffi_engine.cc] [--suffix .so ...] [--no-cache]
+"""
+import argparse
+import hashlib
+import json
+import os
+import site
+import sys
+import time
+
+from tree_patcher import atomic_write_bytes
+
+JSONFFI_NAME = 'json_ffi_engine.cc'
+PRUNE_NAMES = {'__pycache__', 'include', 'test', 'tests', 'testing', '.git', 'conda-meta', 'pkgs', 'node_modules'}
+PRUNE_SUFFIXES = ('.dist-info', '.egg-info')
+CACHE_FORMAT = 1
+
+
+def default_cache_dir():
+    return os.environ.get('MLC_LOCATOR_CACHE') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'mlc_locator')
+
+
+def pruned(name, names=PRUNE_NAMES):
+    return name in names or name.endswith(PRUNE_SUFFIXES)
+
+
+def normalize_roots(roots):
+    """Existing absolute roots with duplicates and nested roots removed."""
+    out = []
+    for root in sorted({os.path.realpath(r) for r in roots if r and os.path.isdir(r)}):
+        if not any(root == o or root.startswith(o.rstrip(os.sep) + os.sep) for o in out):
+            out.append(root)
+    return out
+
+
+def default_roots():
+    """site-packages of this interpreter plus sys.prefix (venv layouts vary)."""
+    roots = [sys.prefix]
+    try:
+        roots.extend(site.getsitepackages())
+    except Exception:
+        pass
+    try:
+        roots.append(site.getusersitepackages())
+    except Exception:
+        pass
+    return roots
+
+
+class Locator:
+    """Find files by exact name and/or suffix under a set of roots."""
+
+    def __init__(self, names=(JSONFFI_NAME,), suffixes=(), use_cache=True, cache_dir=None, prune=PRUNE_NAMES):
+        self.names = frozenset(names)
+        self.suffixes = tuple(suffixes)
+        self.prune = frozenset(prune)
+        self.use_cache = use_cache
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.dirs_visited = 0
+        self.dirs_listed = 0
+        self.seconds = 0.0
+
+    def _matches(self, name):
+        return name in self.names or (self.suffixes and name.endswith(self.suffixes))
+
+    def _cache_path(self, roots):
+        key = json.dumps([roots, sorted(self.names), sorted(self.suffixes), sorted(self.prune)])
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode('utf-8')).hexdigest()[:24] + '.json')
+
+    def _load(self, path):
+        if not self.use_cache:
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('format') == CACHE_FORMAT:
+                return data['dirs']
+        except (OSError, ValueError, KeyError):
+            pass
+        return {}
+
+    def _save(self, path, dirs):
+        try:
+            data = json.dumps({'format': CACHE_FORMAT, 'dirs': dirs}, separators=(',', ':'))
+            atomic_write_bytes(path, data.encode('utf-8'))
+        except OSError:
+            pass  # read-only cache: still correct, just not cached
+
+    def find(self, roots=None):
+        """Sorted absolute paths of matching files under `roots`."""
+        start = time.perf_counter()
+        roots = normalize_roots(default_roots() if roots is None else roots)
+        cache_path = self._cache_path(roots)
+        cached = self._load(cache_path)
+        tree = {}
+        stack = list(reversed(roots))
+        while stack:
+            d = stack.pop()
+            try:
+                mtime = os.stat(d).st_mtime_ns
+            except OSError:
+                continue
+            self.dirs_visited += 1
+            entry = cached.get(d)
+            if entry is None or entry[0] != mtime:
+                subdirs, files = [], []
+                try:
+                    with os.scandir(d) as it:
+                        for e in it:
+                            try:
+                                if e.is_dir(follow_symlinks=False):
+                                    if not pruned(e.name, self.prune):
+                                        subdirs.append(e.name)
+                                elif self._matches(e.name):
+                                    files.append(e.name)
+                            except OSError:
+                                continue
+                except OSError:
+                    continue
+                entry = [mtime, sorted(subdirs), sorted(files)]
+                self.dirs_listed += 1
+            tree[d] = entry
+            stack.extend(os.path.join(d, s) for s in reversed(entry[1]))
+        if self.use_cache and (self.dirs_listed or len(tree) != len(cached)):
+            self._save(cache_path, tree)
+        self.seconds = time.perf_counter() - start
+        return sorted(os.path.join(d, f) for d, entry in tree.items() for f in entry[2])
+
+
+def find_files(names=(), suffixes=(), roots=None, use_cache=True):
+    return Locator(names, suffixes, use_cache).find(roots)
+
+
+def find_jsonffi_sources(roots=None, use_cache=True):
+    return Locator((JSONFFI_NAME,), (), use_cache).find(roots)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Locate json_ffi_engine.cc (or other files) under site-packages / sys.prefix')
+    parser.add_argument('roots', nargs='*', help='directories to search (default: site-packages and sys.prefix)')
+    parser.add_argument('--name', action='append', default=None, help=f'exact file name (default {JSONFFI_NAME})')
+    parser.add_argument('--suffix', action='append', default=[], help='file suffix, e.g. .so (repeatable)')
+    parser.add_argument('--no-cache', action='store_true')
+    args = parser.parse_args()
+
+    names = args.name if args.name is not None else ([] if args.suffix else [JSONFFI_NAME])
+    locator = Locator(names, args.suffix, use_cache=not args.no_cache)
+    found = locator.find(args.roots or None)
+    for path in found:
+        print(path)
+    print(f"{len(found)} found; {locator.dirs_visited} dirs checked, {locator.dirs_listed} listed, "
+          f"{locator.seconds * 1000:.1f}ms", file=sys.stderr)
+    return 0 if found else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+One-pass, memory-mapped search for jsonffi markers in source and binary files.
+
+Every file is mmap'ed (kernel read-ahead requested with madvise) and all
+markers are matched with one compiled bytes alternation, so a file is scanned
+once no matter how many markers there are and is never decoded into a Python
+string. Each hit carries the marker, its byte offset and, for text files, its
+line number. Many files (patched copies, objects, static libs, logs) are
+searched on a thread pool.
+
+Usage:
+    python marker_search.py FILE [FILE ...] [--marker M ...] [--json] [--require any|all]
+Exit status is 0 when the requirement holds for at least one file.
+"""
+import argparse
+import json
+import mmap
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MARKERS = ('jsonffi_contains_replacement', 'MLCJSONFFIEngineForceLink_v1')
+
+
+def compile_markers(markers):
+    # longest first, so a marker that is a prefix of another never shadows it
+    ordered = sorted(dict.fromkeys(markers), key=len, reverse=True)
+    return re.compile(b'|'.join(re.escape(m.encode('utf-8')) for m in ordered))
+
+
+def search_file(path, markers=DEFAULT_MARKERS, regex=None, stop_when_all_found=False):
+    """{'path', 'hits': [{'marker', 'offset', 'line'}], 'binary', 'error'} for one file.
+
+    `line` is None for binary files (NUL byte in the first 8 KiB).
+    """
+    regex = regex or compile_markers(markers)
+    result = {'path': path, 'hits': [], 'binary': False, 'error': None}
+    try:
+        with open(path, 'rb') as f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                return result  # empty file
+    except OSError as e:
+        result['error'] = str(e)
+        return result
+    with mm:
+        if hasattr(mm, 'madvise'):
+            try:
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+                mm.madvise(mmap.MADV_WILLNEED)
+            except (OSError, AttributeError):
+                pass
+        binary = mm.find(b'\0', 0, 8192) != -1
+        result['binary'] = binary
+        wanted = set(markers)
+        seen = set()
+        line, last = 1, 0
+        for m in regex.finditer(mm):
+            marker = m.group(0).decode('utf-8')
+            offset = m.start()
+            if not binary:
+                line += mm[last:offset].count(b'\n')
+                last = offset
+            result['hits'].append({'marker': marker, 'offset': offset, 'line': None if binary else line})
+            seen.add(marker)
+            if stop_when_all_found and seen >= wanted:
+                break
+    return result
+
+
+def search_files(paths, markers=DEFAULT_MARKERS, workers=None, stop_when_all_found=False):
+    """search_file over many paths in parallel; results in input order."""
+    paths = list(paths)
+    if not paths:
+        return []
+    regex = compile_markers(markers)
+    workers = workers or min(32, (os.cpu_count() or 1) + 4, len(paths))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda p: search_file(p, markers, regex, stop_when_all_found), paths))
+
+
+def markers_found(result):
+    """Markers present in a search_file result, in order of first appearance."""
+    return list(dict.fromkeys(h['marker'] for h in result['hits']))
+
+
+def first_marker(path, markers=DEFAULT_MARKERS):
+    """First marker found in `path`, or None (drop-in for the old `in` checks)."""
+    found = markers_found(search_file(path, markers, stop_when_all_found=True))
+    for marker in markers:
+        if marker in found:
+            return marker
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search files for jsonffi markers (mmap, one pass, parallel)')
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--marker', action='append', default=None,
+                        help=f"marker string (repeatable; default: {', '.join(DEFAULT_MARKERS)})")
+    parser.add_argument('--require', choices=['any', 'all'], default='any',
+                        help='a file passes when it contains any / all markers')
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    markers = tuple(args.marker or DEFAULT_MARKERS)
+    results = search_files(args.files, markers, args.workers)
+    passed = []
+    for r in results:
+        found = set(markers_found(r))
+        if (found >= set(markers)) if args.require == 'all' else bool(found):
+            passed.append(r['path'])
+
+    if args.json:
+        print(json.dumps({'markers': markers, 'results': results, 'passed': passed}, indent=2))
+    else:
+        for r in results:
+            if r['error']:
+                print(f"❌ {r['path']}: {r['error']}")
+            elif not r['hits']:
+                print(f"   {r['path']}: no markers")
+            for h in r['hits'][:20]:
+                where = f"line {h['line']}" if h['line'] is not None else 'binary'
+                print(f"🔍 {r['path']}: {h['marker']} @ offset {h['offset']} ({where})")
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Pick context_window_size / prefill_chunk_size for a memory budget instead of guessing.
+
+The config scripts used to hard-code 32/1024 or 128/4096 from hand-written
+estimates, and they disagreed with each other. This script reads
+model_config from mlc-chat-config.json and estimates each part of the
+runtime footprint:
+
+  weights     sum of ndarray-cache.json records next to the config. When that
+              file is missing, parameter count x bits of the quantization
+              (q4f16_1 = 4 bits + an f16 scale per 32 = 4.5 bits).
+  kv cache    2 (K,V) x layers x kv_heads x head_dim x dtype bytes per token,
+              for context_window_size tokens (rounded up to the 16-token
+              page) x max_batch_size
+  activations peak live tensors of one layer per prefill token (hidden and
+              residual streams, qkv, attention out, gate/up/act): the
+              compiled graph reuses that storage across layers
+  prefill     fp32 attention scores for prefill_chunk_size x
+              context_window_size x query heads, plus fp32 logits for the
+              vocabulary. It is an upper bound: tiled kernels need less.
+  overhead    fixed runtime allowance (--overhead, default 256M)
+
+It then solves for the largest context (a multiple of --context-step) that
+fits the budget with a prefill chunk of at least --min-prefill (default 128,
+below which GPU prefill throughput drops off). It then picks the largest
+power-of-two prefill chunk that fits at that context. Either value can be
+pinned with --context / --prefill. The budget is given directly
+(--budget 3.3G) or as a device preset: RAM x the fraction iOS lets a
+foreground app use (--usable-fraction).
+
+For Qwen3-4B q4f16_1 the old 128/4096 setting comes out at ~3.0 GB, weights
+included, close to the "2.8GB" in the old comments.
+
+Usage:
+    python memory_planner.py plan  [CONFIG] (--device iphone-6gb | --budget 3.3G) [--context N] [--prefill N] [--json]
+    python memory_planner.py apply [CONFIG] (--device iphone-6gb | --budget 3.3G) [--context N] [--prefill N]
+    python memory_planner.py plan  [CONFIG] --context 4096 --prefill 128     (just the estimate)
+"""
+import argparse
+import json
+import math
+import os
+import re
+import sys
+
+from tree_patcher import atomic_write_bytes
+
+DEFAULT_CONFIG_PATH = './model_weights/Qwen3-4B-q4f16_1-MLC/mlc-chat-config.json'
+# RAM of the device class; the budget is RAM x usable fraction
+DEVICES = {
+    'iphone-4gb': 4 << 30,
+    'iphone-6gb': 6 << 30,
+    'iphone-8gb': 8 << 30,
+    'ipad-16gb': 16 << 30,
+}
+DEFAULT_USABLE_FRACTION = 0.55
+DTYPE_BYTES = {'float16': 2, 'bfloat16': 2, 'float32': 4}
+KV_PAGE = 16
+MIN_CONTEXT = 256
+MIN_PREFILL = 16
+DEFAULT_MIN_PREFILL = 128
+MAX_PREFILL = 4096
+
+
+SIZE_RE = re.compile(r'^\s*(\d+(?:\.\d*)?|\.\d+)\s*([KMGT]?)(?:I?B)?\s*$', re.IGNORECASE)
+SIZE_SCALE = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+
+
+def parse_bytes(text):
+    """'512M', '3.3G', '1.5GiB', '2TB' or a plain byte count -> bytes (binary units)."""
+    m = SIZE_RE.match(str(text))
+    if not m:
+        raise ValueError(f"invalid size {text!r} (expected e.g. 4096, 512M, 3.3G or 1.5GiB)")
+    return int(float(m.group(1)) * SIZE_SCALE[m.group(2).upper()])
+
+
+def fmt(n):
+    return f'{n / (1 << 30):.2f} GB' if n >= 1 << 30 else f'{n / (1 << 20):.0f} MB'
+
+
+class ModelShape:
+    """The model_config numbers the estimate needs (MLC llama/qwen-style names)."""
+
+    __slots__ = ('layers', 'hidden', 'intermediate', 'q_heads', 'kv_heads', 'head_dim', 'vocab',
+                 'dtype_bytes', 'tied', 'max_context', 'quantization')
+
+    def __init__(self, cfg):
+        mc = cfg.get('model_config', {})
+        self.layers = mc['num_hidden_layers']
+        self.hidden = mc['hidden_size']
+        self.intermediate = mc['intermediate_size']
+        self.q_heads = mc['num_attention_heads']
+        self.kv_heads = mc.get('num_key_value_heads') or self.q_heads
+        self.head_dim = mc.get('head_dim') or self.hidden // self.q_heads
+        self.vocab = mc['vocab_size']
+        self.dtype_bytes = DTYPE_BYTES.get(mc.get('dtype') or 'float16', 2)
+        self.tied = bool(mc.get('tie_word_embeddings', False))
+        self.max_context = (mc.get('max_position_embeddings') or mc.get('max_sequence_length')
+                            or cfg.get('max_position_embeddings') or 32768)
+        self.quantization = cfg.get('quantization') or 'q0f16'
+
+    def param_count(self):
+        h, d = self.hidden, self.head_dim
+        attn = h * self.q_heads * d + 2 * h * self.kv_heads * d + self.q_heads * d * h
+        mlp = 3 * h * self.intermediate
+        embed = self.vocab * h * (1 if self.tied else 2)
+        return self.layers * (attn + mlp) + embed
+
+    def bits_per_param(self):
+        m = re.match(r'q(\d+)f(\d+)', self.quantization)
+        if not m:
+            return 16.0
+        weight_bits, scale_bits = int(m.group(1)), int(m.group(2))
+        if weight_bits == 0:
+            return float(scale_bits)
+        return weight_bits + scale_bits / 32  # one scale per group of 32
+
+    def kv_bytes_per_token(self):
+        return 2 * self.layers * self.kv_heads * self.head_dim * self.dtype_bytes
+
+    def activation_bytes_per_token(self):
+        h, d = self.hidden, self.head_dim
+        live = 4 * h + (self.q_heads + 2 * self.kv_heads) * d + self.q_heads * d + 3 * self.intermediate
+        return live * self.dtype_bytes
+
+
+def weights_bytes(cfg_path, shape):
+    """Exact size from ndarray-cache.json when present, otherwise params x quantization bits."""
+    cache = os.path.join(os.path.dirname(os.path.abspath(cfg_path)), 'ndarray-cache.json')
+    try:
+        with open(cache, 'r', encoding='utf-8') as f:
+            records = json.load(f).get('records', [])
+        total = sum(r.get('nbytes', 0) for r in records)
+        if total:
+            return total, 'ndarray-cache.json'
+    except (OSError, ValueError):
+        pass
+    return int(shape.param_count() * shape.bits_per_param() / 8), f'estimate ({shape.quantization})'
+
+
+def estimate(shape, weights, context, prefill, batch=1, overhead=256 << 20):
+    """Bytes per component for one (context, prefill, batch) setting."""
+    tokens = math.ceil(context / KV_PAGE) * KV_PAGE * batch
+    parts = {
+        'weights': weights,
+        'kv_cache': tokens * shape.kv_bytes_per_token(),
+        'activations': prefill * shape.activation_bytes_per_token(),
+        'prefill_workspace': prefill * context * shape.q_heads * 4 + max(batch, 1) * shape.vocab * 4,
+        'overhead': overhead,
+    }
+    parts['total'] = sum(parts.values())
+    return parts
+
+
+def _prefill_candidates(limit):
+    p = MIN_PREFILL
+    while p <= min(limit, MAX_PREFILL):
+        yield p
+        p *= 2
+
+
+def solve(shape, weights, budget, batch=1, overhead=256 << 20, context=None, prefill=None, context_step=512,
+          min_prefill=DEFAULT_MIN_PREFILL):
+    """Largest (context, prefill) whose estimate fits `budget`, or None.
+
+    Context is maximized first (in multiples of context_step, unless pinned)
+    with a prefill chunk of min_prefill, then the largest power-of-two prefill
+    chunk (<= context) at that context. A pinned prefill larger than a pinned
+    context raises ValueError; a solved context is never smaller than a
+    pinned prefill.
+    """
+    def fits(c, p):
+        return estimate(shape, weights, c, p, batch, overhead)['total'] <= budget
+
+    if prefill is not None and context is not None and prefill > context:
+        raise ValueError(f'prefill_chunk_size {prefill} is larger than context_window_size {context}')
+    min_prefill = prefill or min_prefill
+    if context is None:
+        lo, hi = 0, shape.max_context // context_step
+        while lo < hi:  # largest multiple of context_step that fits with the smallest prefill
+            mid = (lo + hi + 1) // 2
+            if fits(mid * context_step, min(min_prefill, mid * context_step)):
+                lo = mid
+            else:
+                hi = mid - 1
+        context = lo * context_step
+        if context < max(MIN_CONTEXT, prefill or 0):
+            return None
+    elif not fits(context, min(min_prefill, context)):
+        return None
+    if prefill is None:
+        prefill = max((p for p in _prefill_candidates(context) if fits(context, p)), default=None)
+        if prefill is None:
+            return None
+    return context, prefill
+
+
+def load_config(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_config(path, cfg):
+    atomic_write_bytes(path, json.dumps(cfg, indent=2).encode('utf-8'))
+
+
+def apply_plan(cfg, context, prefill, batch):
+    """Write the plan into both the top level and model_config (the compiler reads either)."""
+    mc = cfg.setdefault('model_config', {})
+    for target in (cfg, mc):
+        target['context_window_size'] = context
+        target['prefill_chunk_size'] = prefill
+    mc['max_batch_size'] = batch
+    return cfg
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Solve context_window_size / prefill_chunk_size for a memory budget')
+    parser.add_argument('command', choices=('plan', 'apply'))
+    parser.add_argument('config', nargs='?', default=DEFAULT_CONFIG_PATH)
+    parser.add_argument('--device', choices=sorted(DEVICES), default=None)
+    parser.add_argument('--budget', default=None, help='total bytes for weights + runtime, e.g. 3.3G')
+    parser.add_argument('--usable-fraction', type=float, default=DEFAULT_USABLE_FRACTION,
+                        help='share of device RAM an app may use (with --device)')
+    parser.add_argument('--context', type=int, default=None, help='pin context_window_size')
+    parser.add_argument('--prefill', type=int, default=None, help='pin prefill_chunk_size')
+    parser.add_argument('--batch', type=int, default=1)
+    parser.add_argument('--overhead', default='256M')
+    parser.add_argument('--min-prefill', type=int, default=DEFAULT_MIN_PREFILL,
+                        help='smallest prefill chunk the context is solved for')
+    parser.add_argument('--context-step', type=int, default=512)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    try:
+        cfg = load_config(args.config)
+        shape = ModelShape(cfg)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"ERROR: cannot read model_config from {args.config}: {e}")
+        return 1
+    if args.context and args.prefill and args.prefill > args.context:
+        print(f"ERROR: --prefill {args.prefill} is larger than --context {args.context}")
+        return 1
+    weights, weights_source = weights_bytes(args.config, shape)
+    try:
+        overhead = parse_bytes(args.overhead)
+        budget = parse_bytes(args.budget) if args.budget else None
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        return 1
+    if budget is None and args.device:
+        budget = int(DEVICES[args.device] * args.usable_fraction)
+
+    if budget is None:
+        if args.command == 'apply' or not (args.context and args.prefill):
+            print("ERROR: give --device or --budget (or --context and --prefill for a plain estimate)")
+            return 1
+        context, prefill = args.context, args.prefill
+    else:
+        solved = solve(shape, weights, budget, args.batch, overhead, args.context, args.prefill, args.context_step,
+                       args.min_prefill)
+        if solved is None:
+            print(f"❌ nothing fits in {fmt(budget)}: weights {fmt(weights)} ({weights_source}) + overhead "
+                  f"{fmt(overhead)} leave {fmt(max(budget - weights - overhead, 0))} for kv cache and workspace")
+            return 1
+        context, prefill = solved
+
+    parts = estimate(shape, weights, context, prefill, args.batch, overhead)
+    result = {'config': args.config, 'budget': budget, 'context_window_size': context,
+              'prefill_chunk_size': prefill, 'max_batch_size': args.batch,
+              'weights_source': weights_source, 'bytes': parts}
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"🧮 {args.config}: context_window_size={context} prefill_chunk_size={prefill} "
+              f"max_batch_size={args.batch}")
+        for name, n in parts.items():
+            note = f"  ({weights_source})" if name == 'weights' else ''
+            print(f"   {name:<18} {fmt(n):>10}{note}")
+        if budget is not None:
+            print(f"   {'budget':<18} {fmt(budget):>10}  (headroom {fmt(budget - parts['total'])})")
+
+    if args.command == 'apply':
+        write_config(args.config, apply_plan(cfg, context, prefill, args.batch))
+        print(f"✅ wrote context_window_size={context}, prefill_chunk_size={prefill} to {args.config}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
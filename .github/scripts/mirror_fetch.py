@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Offline-first fetcher with a local content-addressed mirror.
+
+Used by try_fetch_remote in patch_jsonffi_repl*.py. Previously that function
+tried each raw.githubusercontent.com URL in turn with a 15s timeout, which
+could stall the job for 45s on a flaky network before falling back.
+
+Order of resolution:
+  1. mirror hit: with an expected sha256, an intact object in the mirror is
+     returned without touching the network. With stale_while_revalidate and
+     no pinned hash, the newest mirrored copy of any candidate URL is
+     returned at once and step 2 runs in a background thread, so the next
+     run sees whatever upstream has now (wait_revalidations() gives it a
+     short grace before exit)
+  2. race: all candidate URLs are requested concurrently. Requests are
+     conditional (If-None-Match / If-Modified-Since) when a URL has been
+     fetched before. The first valid answer wins: a 200 whose body passes
+     validation and the sha256 check, or a 304 for an intact mirrored object.
+  3. stale: if nothing valid arrives before the deadline, the newest mirrored
+     copy of any candidate URL is used
+
+Mirror layout (~/.cache/mlc_fetch_mirror, or MLC_FETCH_MIRROR):
+    objects/<sha256>        content
+    urls/<sha256(url)>.json {url, sha256, etag, last_modified, fetched}
+
+MLC_RAW_BASE replaces https://raw.githubusercontent.com in the default
+json_ffi URLs, so a local `python -m http.server` can stand in for GitHub.
+MLC_FETCH_DEADLINE (seconds, default 20) bounds the whole race.
+
+Usage:
+    python mirror_fetch.py URL [URL ...] [--out FILE] [--sha256 HEX] [--deadline 10] [--offline]
+    python mirror_fetch.py --jsonffi --out tmp_json_ffi_engine.cc
+"""
+import argparse
+import hashlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from tree_patcher import atomic_write_bytes
+
+RAW_BASE = 'https://raw.githubusercontent.com'
+DEFAULT_DEADLINE = 20.0
+REVALIDATE_GRACE = 2.0
+
+_revalidations = []
+
+
+def default_mirror():
+    return os.environ.get('MLC_FETCH_MIRROR') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'mlc_fetch_mirror')
+
+
+def default_deadline():
+    try:
+        return float(os.environ.get('MLC_FETCH_DEADLINE', DEFAULT_DEADLINE))
+    except ValueError:
+        return DEFAULT_DEADLINE
+
+
+def jsonffi_urls():
+    """Candidate URLs for json_ffi_engine.cc, upstream first."""
+    base = os.environ.get('MLC_RAW_BASE', RAW_BASE).rstrip('/')
+    urls = [f'{base}/mlc-ai/mlc-llm/main/cpp/json_ffi/json_ffi_engine.cc']
+    gh_repo = os.environ.get('GITHUB_REPOSITORY')
+    if gh_repo:
+        urls.append(f'{base}/{gh_repo}/main/mlc-llm/cpp/json_ffi/json_ffi_engine.cc')
+        urls.append(f'{base}/{gh_repo}/main/cpp/json_ffi/json_ffi_engine.cc')
+    return urls
+
+
+class Mirror:
+    """Content-addressed object store plus per-URL validators."""
+
+    def __init__(self, root=None):
+        self.root = root or default_mirror()
+
+    def _object_path(self, sha):
+        return os.path.join(self.root, 'objects', sha)
+
+    def _url_path(self, url):
+        return os.path.join(self.root, 'urls', hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, sha):
+        """Object bytes if present and intact (re-hashed on read), else None."""
+        try:
+            with open(self._object_path(sha), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        return data if hashlib.sha256(data).hexdigest() == sha else None
+
+    def put(self, data):
+        sha = hashlib.sha256(data).hexdigest()
+        if not os.path.exists(self._object_path(sha)):
+            atomic_write_bytes(self._object_path(sha), data)
+        return sha
+
+    def record(self, url):
+        try:
+            with open(self._url_path(url), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def remember(self, url, sha, etag=None, last_modified=None):
+        entry = {'url': url, 'sha256': sha, 'etag': etag, 'last_modified': last_modified, 'fetched': time.time()}
+        try:
+            atomic_write_bytes(self._url_path(url), json.dumps(entry).encode('utf-8'))
+        except OSError:
+            pass
+        return entry
+
+
+class FetchResult:
+    __slots__ = ('data', 'sha256', 'url', 'source', 'elapsed', 'errors')
+
+    def __init__(self, data, sha256, url, source, elapsed, errors):
+        self.data = data
+        self.sha256 = sha256
+        self.url = url
+        self.source = source  # 'mirror', 'revalidated', 'network' or 'stale'
+        self.elapsed = elapsed
+        self.errors = errors
+
+
+def _request(url, record, timeout):
+    """(status, body, headers) for one conditional GET."""
+    req = urllib.request.Request(url, headers={'User-Agent': 'mlc-compile-ci'})
+    if record:
+        if record.get('etag'):
+            req.add_header('If-None-Match', record['etag'])
+        if record.get('last_modified'):
+            req.add_header('If-Modified-Since', record['last_modified'])
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, resp.read(), resp.headers
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return 304, b'', e.headers
+        raise
+
+
+def _race(urls, records, mirror, expected_sha256, validate, end, errors):
+    """Request all `urls` concurrently until `end`; (url, data, sha, source) of the first valid answer, or None."""
+    answers = queue.Queue()
+
+    def worker(url):
+        record = records[url]
+        try:
+            status, body, headers = _request(url, record, max(0.1, end - time.monotonic()))
+            if status == 304:
+                data = mirror.get(record['sha256']) if record else None
+                if data is None:
+                    raise ValueError('304 Not Modified but the mirrored object is missing')
+                answers.put((url, data, record['sha256'], 'revalidated', None))
+                return
+            if status != 200:
+                raise ValueError(f'HTTP {status}')
+            sha = hashlib.sha256(body).hexdigest()
+            if expected_sha256 and sha != expected_sha256:
+                raise ValueError(f'sha256 mismatch ({sha[:12]} != {expected_sha256[:12]})')
+            if validate is not None and not validate(body):
+                raise ValueError('response failed validation')
+            mirror.put(body)
+            mirror.remember(url, sha, headers.get('ETag'), headers.get('Last-Modified'))
+            answers.put((url, body, sha, 'network', None))
+        except Exception as e:
+            answers.put((url, None, None, None, e))
+
+    # daemon threads: a loser still blocked in a socket read must not hold up exit
+    for url in urls:
+        threading.Thread(target=worker, args=(url,), daemon=True).start()
+    pending = len(urls)
+    while pending:
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            url, data, sha, source, error = answers.get(timeout=remaining)
+        except queue.Empty:
+            break
+        pending -= 1
+        if error is None:
+            return url, data, sha, source
+        errors[url] = str(error)
+    for url in urls:
+        if url not in errors and pending:
+            errors[url] = 'no answer before the deadline'
+    return None
+
+
+def fetch(urls, expected_sha256=None, deadline=None, mirror=None, offline=False, validate=None, errors=None,
+          stale_while_revalidate=False):
+    """Resolve `urls` to one FetchResult, or None.
+
+    validate(data) -> bool rejects bodies that are not what we want (an HTML
+    error page served with 200, a truncated file, ...). Per-URL failures are
+    collected in `errors` ({url: message}) when a dict is passed; for a
+    background revalidation they arrive after fetch() has returned.
+    """
+    start = time.monotonic()
+    mirror = mirror or Mirror()
+    deadline = default_deadline() if deadline is None else deadline
+    urls = list(dict.fromkeys(urls))
+    errors = {} if errors is None else errors
+
+    def done(data, sha, url, source):
+        return FetchResult(data, sha, url, source, time.monotonic() - start, errors)
+
+    if expected_sha256:
+        data = mirror.get(expected_sha256)
+        if data is not None:
+            return done(data, expected_sha256, None, 'mirror')
+
+    records = {url: mirror.record(url) for url in urls}
+
+    def newest():
+        known = sorted((r for r in records.values() if r), key=lambda r: r['fetched'], reverse=True)
+        for r in known:
+            if expected_sha256 and r['sha256'] != expected_sha256:
+                continue
+            data = mirror.get(r['sha256'])
+            if data is not None:
+                return data, r['sha256'], r['url']
+        return None
+
+    if offline or not urls:
+        hit = newest()
+        return done(*hit, 'stale') if hit else None
+
+    if stale_while_revalidate and not expected_sha256:
+        hit = newest()
+        if hit is not None:
+            thread = threading.Thread(target=_race, daemon=True,
+                                      args=(urls, records, mirror, None, validate, time.monotonic() + deadline, errors))
+            thread.start()
+            _revalidations.append(thread)
+            return done(*hit, 'mirror')
+
+    answer = _race(urls, records, mirror, expected_sha256, validate, start + deadline, errors)
+    if answer is not None:
+        url, data, sha, source = answer
+        return done(data, sha, url, source)
+    hit = newest()
+    return done(*hit, 'stale') if hit else None
+
+
+def wait_revalidations(timeout=REVALIDATE_GRACE):
+    """Give background revalidations up to `timeout` seconds in total. True if none is still running.
+
+    One cut short by process exit is simply repeated (conditionally) next run.
+    """
+    end = time.monotonic() + timeout
+    for thread in _revalidations:
+        thread.join(max(0.0, end - time.monotonic()))
+    _revalidations[:] = [t for t in _revalidations if t.is_alive()]
+    return not _revalidations
+
+
+def fetch_to(urls, out, **kwargs):
+    """fetch() and write the content to `out` atomically. Returns the FetchResult or None."""
+    result = fetch(urls, **kwargs)
+    if result is not None:
+        atomic_write_bytes(str(out), result.data)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline-first concurrent fetch with a local mirror')
+    parser.add_argument('urls', nargs='*')
+    parser.add_argument('--jsonffi', action='store_true', help='use the default json_ffi_engine.cc URLs')
+    parser.add_argument('--out', default=None, help='write the content here (default: stdout summary only)')
+    parser.add_argument('--sha256', default=None, help='expected content hash')
+    parser.add_argument('--deadline', type=float, default=None,
+                        help=f'seconds for the whole race (default MLC_FETCH_DEADLINE or {DEFAULT_DEADLINE:g})')
+    parser.add_argument('--mirror', default=None, help='mirror directory (default ~/.cache/mlc_fetch_mirror)')
+    parser.add_argument('--offline', action='store_true', help='mirror only, no network')
+    args = parser.parse_args()
+
+    urls = args.urls + (jsonffi_urls() if args.jsonffi else [])
+    if not urls and not args.sha256:
+        parser.error('give URLs, --jsonffi or --sha256')
+    errors = {}
+    kwargs = dict(expected_sha256=args.sha256, deadline=args.deadline, mirror=Mirror(args.mirror),
+                  offline=args.offline, validate=bool, errors=errors)
+    result = fetch_to(urls, args.out, **kwargs) if args.out else fetch(urls, **kwargs)
+    for url, error in errors.items():
+        print(f'   ⚠️  {url}: {error}', file=sys.stderr)
+    if result is None:
+        print('❌ No valid response and nothing mirrored', file=sys.stderr)
+        return 1
+    print(f"✅ {result.source}: {result.url or '(mirror)'} sha256={result.sha256[:12]} "
+          f"{len(result.data)} bytes in {result.elapsed * 1000:.0f}ms" + (f' -> {args.out}' if args.out else ''))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
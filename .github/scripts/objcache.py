@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+ccache-style object cache, used as the CMake compiler launcher for the iOS
+mlc_llm_static build:
+
+    cmake ... -DCMAKE_CXX_COMPILER_LAUNCHER="python3;.github/scripts/objcache.py"
+
+Ninja then runs `objcache.py clang++ <args> -c foo.cc -o foo.o ...` for every
+translation unit. After a json_ffi patch usually only json_ffi_engine.cc (and
+the ci_force_link_jsonffi.c fallback) changes. Every other object comes from
+the cache, so a rebuild costs one compile plus the link.
+
+Lookups work in the same two levels as run_compile_syntax_check.py:
+  - direct: hash of the compiler, the full argument list and the source file.
+    A hit also needs every header recorded for it to be unchanged
+    (size/mtime, then sha256). It restores the object and the Ninja depfile
+    without running the compiler at all.
+  - preprocessed: hash of the compiler, the normalized flags (outputs and
+    dependency-file flags dropped) and the `-E` output. The `-E` run also
+    writes the depfile, so Ninja's header tracking stays correct.
+Only successful compiles are stored, together with their stdout/stderr, so
+warnings are replayed on a hit. Anything unusual is passed straight to the
+compiler: no -c, several sources, -E/-S, response files, or depfiles without
+-MF. Errors inside the cache never fail the build either; the real compiler
+runs instead.
+
+The cache lives under ~/.cache/mlc_objcache (MLC_OBJCACHE_DIR). Its size is
+bounded by MLC_OBJCACHE_MAX_SIZE (default 2G). A hit refreshes an entry's
+mtime, and `cleanup` evicts the least recently used entries down to 90% of
+the limit. MLC_OBJCACHE_DISABLE=1 turns the launcher into a plain exec.
+
+Usage:
+    python objcache.py COMPILER ARGS...                 (as a compiler launcher)
+    python objcache.py stats [--json FILE]              hit rate since the last `zero`
+    python objcache.py zero                             reset the statistics
+    python objcache.py cleanup [--max-size 2G]          evict LRU entries over the limit
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from memory_planner import parse_bytes
+from run_compile_syntax_check import DROP_FLAGS, DROP_WITH_ARG, headers_unchanged, included_files, sha256_file
+from tree_patcher import atomic_write_bytes
+
+CACHE_FORMAT = 1
+COMMANDS = ('stats', 'zero', 'cleanup')
+SOURCE_SUFFIXES = ('.c', '.cc', '.cpp', '.cxx', '.c++', '.m', '.mm')
+# options whose value is the next argument (so it is never mistaken for the source)
+TAKES_ARG = {'-o', '-I', '-D', '-U', '-include', '-imacros', '-isystem', '-isysroot', '-iquote',
+             '-idirafter', '-iprefix', '-iwithprefix', '-F', '-MF', '-MT', '-MQ', '-x', '-arch',
+             '-target', '-Xclang', '-Xpreprocessor', '-Xassembler', '-mllvm', '--serialize-diagnostics'}
+# outputs we cannot reproduce from a cached object
+UNCACHEABLE = {'-E', '-S', '-M', '-MM', '-save-temps', '--analyze', '-ftime-trace', '--serialize-diagnostics'}
+OUTCOMES = ('direct', 'preprocessed', 'miss', 'uncacheable', 'error')
+
+
+def default_cache_dir():
+    return os.environ.get('MLC_OBJCACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'mlc_objcache')
+
+
+def default_max_size():
+    return parse_bytes(os.environ.get('MLC_OBJCACHE_MAX_SIZE') or '2G')
+
+
+class Invocation:
+    """One compiler command line, split into the parts the cache needs."""
+
+    __slots__ = ('args', 'source', 'output', 'depfile', 'has_target', 'reason')
+
+    def __init__(self, args):
+        self.args = args
+        self.source = self.output = self.depfile = None
+        self.has_target = False
+        self.reason = None
+        sources, compile_only, wants_deps = [], False, False
+        i = 1
+        while i < len(args):
+            a = args[i]
+            if a in UNCACHEABLE or a.startswith(('--serialize-diagnostics=', '-save-temps=', '-ftime-trace=')):
+                self.reason = a
+                return
+            if a.startswith('@'):
+                self.reason = 'response file'
+                return
+            if a == '-c':
+                compile_only = True
+            elif a in ('-MD', '-MMD'):
+                wants_deps = True
+            elif a in TAKES_ARG:
+                if i + 1 >= len(args):
+                    self.reason = f'{a} without a value'
+                    return
+                value = args[i + 1]
+                if a == '-o':
+                    self.output = value
+                elif a == '-MF':
+                    self.depfile = value
+                elif a in ('-MT', '-MQ'):
+                    self.has_target = True
+                i += 2
+                continue
+            elif a.startswith('-o') and len(a) > 2:
+                self.output = a[2:]
+            elif a.startswith('-MF') and len(a) > 3:
+                self.depfile = a[3:]
+            elif a.startswith(('-MT', '-MQ')) and len(a) > 3:
+                self.has_target = True
+            elif a == '-' or (not a.startswith('-') and a.lower().endswith(SOURCE_SUFFIXES)):
+                sources.append(a)
+            i += 1
+        if not compile_only:
+            self.reason = 'not a compile (-c missing)'
+        elif len(sources) != 1 or sources[0] == '-':
+            self.reason = f'{len(sources)} sources'
+        elif not self.output:
+            self.reason = 'no -o'
+        elif wants_deps and not self.depfile:
+            self.reason = '-MD without -MF'
+        else:
+            self.source = sources[0]
+
+    @property
+    def cacheable(self):
+        return self.reason is None
+
+    def normalized_flags(self):
+        """Flags that decide the object's content: outputs and depfile flags dropped."""
+        out, i, args = [], 1, self.args
+        while i < len(args):
+            a = args[i]
+            if a in DROP_WITH_ARG:
+                i += 2
+                continue
+            if (a in DROP_FLAGS or a == self.source or (a.startswith('-o') and len(a) > 2)
+                    or a.startswith(('-MF', '-MT', '-MQ'))):
+                i += 1
+                continue
+            out.append(a)
+            i += 1
+        return out
+
+    def preprocess_args(self):
+        """`-E` to stdout; dependency flags kept so the same run writes Ninja's depfile."""
+        out, i, args = [], 0, self.args
+        while i < len(args):
+            a = args[i]
+            if a == '-o':
+                i += 2
+                continue
+            if a.startswith('-o') and len(a) > 2:
+                i += 1
+                continue
+            out.append('-E' if a == '-c' else a)
+            i += 1
+        if self.depfile and not self.has_target:
+            # without -o the default depfile target would be `foo.o` in the cwd, not the real object
+            out += ['-MT', self.output]
+        return out
+
+
+def compiler_identity(compiler):
+    """Path, size and mtime of the compiler binary (the same cheap check ccache defaults to)."""
+    path = shutil.which(compiler) or compiler
+    try:
+        st = os.stat(path)
+        return [os.path.realpath(path), st.st_size, st.st_mtime_ns]
+    except OSError:
+        return [compiler]
+
+
+def _key(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else json.dumps(part).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+class ObjectCache:
+    """Objects under o/<k[:2]>/<k>.o (+ .json result), direct-mode manifests under m/."""
+
+    def __init__(self, root=None):
+        self.root = root or default_cache_dir()
+
+    def _path(self, kind, key, ext):
+        return os.path.join(self.root, kind, key[:2], key + ext)
+
+    def get_manifest(self, key):
+        try:
+            with open(self._path('m', key, '.json'), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return data if data.get('format') == CACHE_FORMAT else None
+
+    def put_manifest(self, key, data):
+        atomic_write_bytes(self._path('m', key, '.json'), json.dumps(dict(data, format=CACHE_FORMAT)).encode('utf-8'))
+
+    def get_object(self, key):
+        """(object path, result dict) or None; refreshes the entry's LRU time on a hit."""
+        obj, meta = self._path('o', key, '.o'), self._path('o', key, '.json')
+        try:
+            with open(meta, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+            if result.get('format') != CACHE_FORMAT or os.path.getsize(obj) != result['size']:
+                return None
+            os.utime(obj)
+            os.utime(meta)
+        except (OSError, ValueError, KeyError):
+            return None
+        return obj, result
+
+    def put_object(self, key, object_path, stdout, stderr):
+        obj = self._path('o', key, '.o')
+        with open(object_path, 'rb') as f:
+            data = f.read()
+        atomic_write_bytes(obj, data)
+        result = {'format': CACHE_FORMAT, 'size': len(data), 'stdout': stdout, 'stderr': stderr}
+        atomic_write_bytes(self._path('o', key, '.json'), json.dumps(result).encode('utf-8'))
+
+    def record(self, outcome, source, seconds):
+        # one O_APPEND write per compile: safe with many concurrent launchers
+        line = json.dumps([outcome, source, round(seconds, 3)]) + '\n'
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            fd = os.open(os.path.join(self.root, 'stats.log'), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode('utf-8'))
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+
+    def stats(self):
+        counts = dict.fromkeys(OUTCOMES, 0)
+        seconds = dict.fromkeys(OUTCOMES, 0.0)
+        misses = []
+        try:
+            with open(os.path.join(self.root, 'stats.log'), 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        outcome, source, secs = json.loads(line)
+                    except ValueError:
+                        continue
+                    counts[outcome] = counts.get(outcome, 0) + 1
+                    seconds[outcome] = seconds.get(outcome, 0.0) + secs
+                    if outcome == 'miss':
+                        misses.append(source)
+        except OSError:
+            pass
+        cacheable = counts['direct'] + counts['preprocessed'] + counts['miss']
+        hits = counts['direct'] + counts['preprocessed']
+        return {'counts': counts, 'seconds': {k: round(v, 2) for k, v in seconds.items()},
+                'hit_rate': round(hits / cacheable, 4) if cacheable else None,
+                'misses': misses, 'size': self.size()}
+
+    def zero(self):
+        try:
+            os.remove(os.path.join(self.root, 'stats.log'))
+        except OSError:
+            pass
+
+    def _entries(self):
+        """[(mtime, size, [paths])] per cache entry; an object and its .json are one entry."""
+        groups = {}
+        for kind in ('o', 'm'):
+            for dirpath, _, filenames in os.walk(os.path.join(self.root, kind)):
+                for fn in filenames:
+                    path = os.path.join(dirpath, fn)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    group = groups.setdefault((kind, fn.split('.', 1)[0]), [0, 0, []])
+                    group[0] = max(group[0], st.st_mtime)
+                    group[1] += st.st_size
+                    group[2].append(path)
+        return list(groups.values())
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def cleanup(self, max_size):
+        """Evict least recently used entries until the cache is at most 90% of max_size."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        if total <= max_size:
+            return total, removed
+        target = max_size * 9 // 10
+        for _, size, paths in entries:
+            if total <= target:
+                break
+            for p in paths:
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        return total, removed
+
+
+def _replay(result):
+    if result.get('stdout'):
+        sys.stdout.write(result['stdout'])
+        sys.stdout.flush()
+    if result.get('stderr'):
+        sys.stderr.write(result['stderr'])
+        sys.stderr.flush()
+
+
+def _restore(inv, cached_obj, result, depfile_text=None):
+    with open(cached_obj, 'rb') as f:
+        data = f.read()
+    # a fresh file, never a hardlink into the cache: later steps may strip/ar the object
+    atomic_write_bytes(inv.output, data)
+    if depfile_text is not None and inv.depfile:
+        atomic_write_bytes(inv.depfile, depfile_text.encode('utf-8'))
+    _replay(result)
+
+
+def compile_cached(args, cache):
+    """Run (or replay) one compile; returns (exit code, outcome)."""
+    inv = Invocation(args)
+    if not inv.cacheable:
+        return subprocess.call(args), 'uncacheable'
+
+    compiler = compiler_identity(args[0])
+    cwd = os.getcwd()
+    source = os.path.join(cwd, inv.source)
+    direct_key = _key(compiler, args, cwd, sha256_file(source))
+    manifest = cache.get_manifest(direct_key)
+    if manifest and headers_unchanged(manifest['headers']):
+        hit = cache.get_object(manifest['object'])
+        if hit:
+            _restore(inv, hit[0], hit[1], manifest.get('depfile'))
+            return 0, 'direct'
+
+    pre = subprocess.run(inv.preprocess_args(), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if pre.returncode != 0:
+        # let the real compiler report the problem the usual way
+        return subprocess.call(args), 'miss'
+    object_key = _key(compiler, inv.normalized_flags(), pre.stdout)
+    headers = included_files(pre.stdout, cwd, os.path.normpath(source))
+
+    hit = cache.get_object(object_key)
+    if hit:
+        _restore(inv, hit[0], hit[1])
+        outcome, rc = 'preprocessed', 0
+    else:
+        proc = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout = proc.stdout.decode('utf-8', 'replace')
+        stderr = proc.stderr.decode('utf-8', 'replace')
+        _replay({'stdout': stdout, 'stderr': stderr})
+        if proc.returncode != 0:
+            return proc.returncode, 'miss'
+        cache.put_object(object_key, inv.output, stdout, stderr)
+        outcome, rc = 'miss', 0
+    depfile_text = None
+    if inv.depfile:
+        with open(inv.depfile, 'r', encoding='utf-8', errors='surrogateescape') as f:
+            depfile_text = f.read()
+    cache.put_manifest(direct_key, {'object': object_key, 'headers': headers, 'depfile': depfile_text})
+    return rc, outcome
+
+
+def launch(args):
+    if os.environ.get('MLC_OBJCACHE_DISABLE') == '1':
+        os.execvp(args[0], args)
+    cache = ObjectCache()
+    start = time.perf_counter()
+    try:
+        rc, outcome = compile_cached(args, cache)
+    except Exception as e:
+        print(f"objcache: {e}; running the compiler directly", file=sys.stderr)
+        rc, outcome = subprocess.call(args), 'error'
+    source = Invocation(args).source or ''
+    cache.record(outcome, source, time.perf_counter() - start)
+    return rc
+
+
+def print_stats(stats):
+    counts = stats['counts']
+    rate = f"{stats['hit_rate'] * 100:.1f}%" if stats['hit_rate'] is not None else 'n/a'
+    print(f"📦 objcache: hit rate {rate} "
+          f"(direct {counts['direct']}, preprocessed {counts['preprocessed']}, miss {counts['miss']}, "
+          f"uncacheable {counts['uncacheable']}, error {counts['error']}); "
+          f"cache size {stats['size'] / (1 << 20):.1f} MB")
+    for source in stats['misses'][:50]:
+        print(f"   compiled: {source}")
+    if len(stats['misses']) > 50:
+        print(f"   ... and {len(stats['misses']) - 50} more")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] not in COMMANDS and sys.argv[1] not in ('-h', '--help'):
+        return launch(sys.argv[1:])
+
+    parser = argparse.ArgumentParser(description='ccache-style object cache / CMake compiler launcher')
+    parser.add_argument('command', choices=COMMANDS)
+    parser.add_argument('--cache', default=None, help='cache directory (default ~/.cache/mlc_objcache)')
+    parser.add_argument('--max-size', default=None, help='size bound for cleanup, e.g. 2G (default MLC_OBJCACHE_MAX_SIZE)')
+    parser.add_argument('--json', default=None, help='stats: also write them to this file')
+    args = parser.parse_args()
+
+    cache = ObjectCache(args.cache)
+    if args.command == 'zero':
+        cache.zero()
+        print("📦 objcache statistics reset")
+    elif args.command == 'cleanup':
+        limit = parse_bytes(args.max_size) if args.max_size else default_max_size()
+        total, removed = cache.cleanup(limit)
+        print(f"📦 objcache cleanup: evicted {removed} entries; {total / (1 << 20):.1f} MB "
+              f"(limit {limit / (1 << 20):.0f} MB)")
+    else:
+        stats = cache.stats()
+        print_stats(stats)
+        if args.json:
+            os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+            with open(args.json, 'w') as f:
+                json.dump(stats, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
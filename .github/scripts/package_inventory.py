@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+One-pass inventory of mlc_llm / tvm package roots: sources, compiled
+extensions and object files with sizes and content hashes.
+
+The roots are walked once (jsonffi_locator's cached walk) for every kind at
+the same time. Only __pycache__ and *.dist-info are pruned: the locator's
+default pruning of include/ and test dirs would drop every header. Hashes are reused from the previous inventory when a
+file's size and mtime are unchanged, and the rest are hashed on a thread pool.
+
+Two outputs:
+  - JSON (human readable, uploaded with the CI diagnostics)
+  - a compact binary index: fixed-size records sorted by path, plus a string
+    table. Later steps can mmap it and look up one path by binary search
+    instead of walking the tree or parsing the JSON again.
+
+Binary layout (little endian):
+    header   '<8sIII'            magic, entry count, root count, string table size
+    roots    '<II' * roots       string offset, length
+    entries  '<IIHBQq32s' * n    path offset, path length, root index, kind,
+                                 size, mtime_ns, sha256 digest
+    strings  utf-8 bytes
+
+Usage:
+    python package_inventory.py build [ROOT ...] [--json inv.json] [--index inv.idx]
+    python package_inventory.py query inv.idx [PATH ...] [--kind extension]
+    python package_inventory.py diff old.json new.idx
+"""
+import argparse
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from jsonffi_locator import Locator, normalize_roots
+from tree_patcher import atomic_write_bytes
+
+KINDS = {
+    'source': ('.cc', '.cpp', '.cxx', '.c', '.h', '.hpp', '.m', '.mm'),
+    'extension': ('.so', '.dylib', '.pyd'),
+    'object': ('.o', '.a', '.obj'),
+}
+KIND_CODES = {name: i for i, name in enumerate(KINDS)}
+KIND_NAMES = list(KINDS)
+PRUNE = ('__pycache__',)
+FORMAT = 1
+MAGIC = b'MLCINV\x00\x01'
+HEADER = struct.Struct('<8sIII')
+ROOT = struct.Struct('<II')
+ENTRY = struct.Struct('<IIHBQq32s')
+
+
+def kind_of(path):
+    for kind, suffixes in KINDS.items():
+        if path.endswith(suffixes):
+            return kind
+    return None
+
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def build(roots, previous=None, workers=None, use_cache=True):
+    """Inventory dict: {'format', 'created', 'roots', 'files': {path: entry}, 'stats'}.
+
+    `previous` is an earlier inventory (any loadable form) whose hashes are
+    reused for files with the same size and mtime.
+    """
+    start = time.perf_counter()
+    roots = normalize_roots(roots)
+    suffixes = tuple(s for group in KINDS.values() for s in group)
+    locator = Locator((), suffixes, use_cache, prune=PRUNE)
+    paths = locator.find(roots)
+    old = (previous or {}).get('files', {})
+
+    files, to_hash = {}, []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        root = max((i for i, r in enumerate(roots) if path.startswith(r.rstrip(os.sep) + os.sep)),
+                   key=lambda i: len(roots[i]), default=0)
+        entry = {'root': root, 'kind': kind_of(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': None}
+        prior = old.get(path)
+        if prior and prior['size'] == st.st_size and prior['mtime_ns'] == st.st_mtime_ns and prior.get('sha256'):
+            entry['sha256'] = prior['sha256']
+        else:
+            to_hash.append(path)
+        files[path] = entry
+
+    def digest(path):
+        try:
+            return path, sha256_file(path)
+        except OSError:
+            return path, None
+
+    if to_hash:
+        workers = workers or min(16, (os.cpu_count() or 1) + 4)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for path, sha in pool.map(digest, to_hash):
+                files[path]['sha256'] = sha
+    return {
+        'format': FORMAT,
+        'created': time.time(),
+        'roots': roots,
+        'files': files,
+        'stats': {'files': len(files), 'hashed': len(to_hash), 'dirs_listed': locator.dirs_listed,
+                  'seconds': round(time.perf_counter() - start, 3)},
+    }
+
+
+def write_json(inventory, path):
+    atomic_write_bytes(path, json.dumps(inventory, indent=1, sort_keys=True).encode('utf-8'))
+
+
+def write_index(inventory, path):
+    strings = bytearray()
+    offsets = {}
+
+    def intern(s):
+        if s not in offsets:
+            data = s.encode('utf-8')
+            offsets[s] = (len(strings), len(data))
+            strings.extend(data)
+        return offsets[s]
+
+    roots = [intern(r) for r in inventory['roots']]
+    records = []
+    for name in sorted(inventory['files'], key=lambda p: p.encode('utf-8')):
+        e = inventory['files'][name]
+        off, length = intern(name)
+        sha = bytes.fromhex(e['sha256']) if e['sha256'] else b'\0' * 32
+        records.append(ENTRY.pack(off, length, e['root'], KIND_CODES[e['kind']], e['size'], e['mtime_ns'], sha))
+    out = bytearray(HEADER.pack(MAGIC, len(records), len(roots), len(strings)))
+    for off, length in roots:
+        out += ROOT.pack(off, length)
+    for rec in records:
+        out += rec
+    out += strings
+    atomic_write_bytes(path, bytes(out))
+
+
+class IndexReader:
+    """Read-only view of a binary index; lookups are a binary search on the mmap."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, n_roots, _ = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f'{path}: not an inventory index')
+        self._entries_at = HEADER.size + n_roots * ROOT.size
+        self._strings_at = self._entries_at + self.count * ENTRY.size
+        self.roots = [self._string(*ROOT.unpack_from(self._mm, HEADER.size + i * ROOT.size)) for i in range(n_roots)]
+
+    def close(self):
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def _string(self, off, length):
+        start = self._strings_at + off
+        return self._mm[start:start + length].decode('utf-8')
+
+    def _path_bytes(self, i):
+        off, length = struct.unpack_from('<II', self._mm, self._entries_at + i * ENTRY.size)
+        start = self._strings_at + off
+        return self._mm[start:start + length]
+
+    def _entry(self, i):
+        off, length, root, kind, size, mtime_ns, sha = ENTRY.unpack_from(self._mm, self._entries_at + i * ENTRY.size)
+        return self._string(off, length), {
+            'root': root, 'kind': KIND_NAMES[kind], 'size': size, 'mtime_ns': mtime_ns,
+            'sha256': sha.hex() if sha != b'\0' * 32 else None,
+        }
+
+    def lookup(self, path):
+        """Entry dict for `path`, or None."""
+        key = path.encode('utf-8')
+        keys = _LazyKeys(self)
+        i = bisect.bisect_left(keys, key)
+        if i < self.count and keys[i] == key:
+            return self._entry(i)[1]
+        return None
+
+    def items(self, kind=None):
+        for i in range(self.count):
+            path, entry = self._entry(i)
+            if kind is None or entry['kind'] == kind:
+                yield path, entry
+
+    def to_inventory(self):
+        return {'format': FORMAT, 'roots': self.roots, 'files': dict(self.items())}
+
+
+class _LazyKeys:
+    """Sequence of index paths for bisect, read on demand."""
+
+    __slots__ = ('reader',)
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    def __len__(self):
+        return self.reader.count
+
+    def __getitem__(self, i):
+        return self.reader._path_bytes(i)
+
+
+def load(path):
+    """Inventory dict from a JSON file or a binary index."""
+    with open(path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+    if magic == MAGIC:
+        with IndexReader(path) as reader:
+            return reader.to_inventory()
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('format') != FORMAT:
+        raise ValueError(f'{path}: unsupported inventory format {data.get("format")}')
+    return data
+
+
+def diff(old, new):
+    """{'added', 'removed', 'changed', 'touched', 'unchanged'} between two inventories.
+
+    changed: content hash differs; touched: same content, new mtime.
+    """
+    a, b = old['files'], new['files']
+    out = {'added': sorted(set(b) - set(a)), 'removed': sorted(set(a) - set(b)),
+           'changed': [], 'touched': [], 'unchanged': 0}
+    for path in sorted(set(a) & set(b)):
+        x, y = a[path], b[path]
+        if x['sha256'] != y['sha256'] or x['size'] != y['size']:
+            out['changed'].append({'path': path, 'kind': y['kind'], 'size': [x['size'], y['size']],
+                                   'sha256': [x['sha256'], y['sha256']]})
+        elif x['mtime_ns'] != y['mtime_ns']:
+            out['touched'].append(path)
+        else:
+            out['unchanged'] += 1
+    return out
+
+
+def print_summary(inventory):
+    by_kind = {}
+    for e in inventory['files'].values():
+        count, size = by_kind.get(e['kind'], (0, 0))
+        by_kind[e['kind']] = (count + 1, size + e['size'])
+    for kind in KINDS:
+        count, size = by_kind.get(kind, (0, 0))
+        print(f"   {kind:<10} {count:>6} files  {size / (1 << 20):>9.1f} MiB")
+
+
+def print_diff(d):
+    for path in d['added']:
+        print(f"   + {path}")
+    for path in d['removed']:
+        print(f"   - {path}")
+    for c in d['changed']:
+        print(f"   ~ {c['path']} ({c['size'][0]} -> {c['size'][1]} bytes)")
+    print(f"   {len(d['added'])} added, {len(d['removed'])} removed, {len(d['changed'])} changed, "
+          f"{len(d['touched'])} touched only, {d['unchanged']} unchanged")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='One-pass inventory of mlc_llm / tvm package artifacts')
+    parser.add_argument('command', choices=['build', 'query', 'diff'])
+    parser.add_argument('paths', nargs='*',
+                        help='build: roots; query: INDEX [PATH ...]; diff: OLD NEW (JSON or index)')
+    parser.add_argument('--json', dest='json_out', default=None, help='build: write the JSON inventory here')
+    parser.add_argument('--index', default=None, help='build: write the binary index here')
+    parser.add_argument('--previous', default=None,
+                        help='build: earlier inventory to reuse hashes from and diff against')
+    parser.add_argument('--kind', choices=list(KINDS), default=None, help='query: only this kind')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--no-cache', action='store_true', help='build: do not use the directory-walk cache')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        if not args.paths:
+            parser.error('build needs at least one root')
+        previous = None
+        if args.previous and os.path.exists(args.previous):
+            previous = load(args.previous)
+        inventory = build(args.paths, previous, args.workers, not args.no_cache)
+        if args.json_out:
+            write_json(inventory, args.json_out)
+        if args.index:
+            write_index(inventory, args.index)
+        s = inventory['stats']
+        print(f"📦 Inventory: {s['files']} files under {len(inventory['roots'])} roots "
+              f"({s['hashed']} hashed, {s['seconds']:.2f}s)")
+        print_summary(inventory)
+        if previous is not None:
+            print(f"🔁 Changes since {args.previous}:")
+            print_diff(diff(previous, inventory))
+        return 0
+
+    if args.command == 'query':
+        if not args.paths:
+            parser.error('query needs an index path')
+        with IndexReader(args.paths[0]) as reader:
+            if len(args.paths) > 1:
+                missing = 0
+                for path in args.paths[1:]:
+                    entry = reader.lookup(os.path.realpath(path))
+                    if entry is None:
+                        missing += 1
+                        print(f"   {path}: not in inventory")
+                    else:
+                        print(f"   {path}: {entry['kind']} {entry['size']} bytes sha256={entry['sha256']}")
+                return 1 if missing else 0
+            for path, entry in reader.items(args.kind):
+                print(f"{entry['kind']:<10} {entry['size']:>12}  {path}")
+        return 0
+
+    if len(args.paths) != 2:
+        parser.error('diff needs OLD and NEW')
+    d = diff(load(args.paths[0]), load(args.paths[1]))
+    print_diff(d)
+    return 1 if d['added'] or d['removed'] or d['changed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
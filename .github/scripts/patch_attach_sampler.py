@@ -2,6 +2,8 @@
 import site
 import os
 
+from tree_patcher import atomic_write_bytes
+
 def main():
     sampler_path = f'{site.getsitepackages()[0]}/mlc_llm/compiler_pass/attach_sampler.py'
     
@@ -23,9 +25,8 @@ def main():
             print(f"Changed to: {lines[i]}")
             break
     
-    # 변경 사항 저장
-    with open(sampler_path, 'w') as f:
-        f.write('\n'.join(lines))
+    # 변경 사항 저장 (새 파일로 교체: 복원된 환경의 하드링크된 스냅샷 객체를 덮어쓰지 않도록)
+    atomic_write_bytes(sampler_path, '\n'.join(lines).encode('utf-8'))
     
     print("Patched: Removed arguments from batch_spec_verify() call")
 
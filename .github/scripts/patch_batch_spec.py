@@ -1,12 +1,9 @@
 #!/usr/bin/env python3
-import site
-import os
+import site_envs
+from patch_manifest import PatchManifest, file_version
 
-def main():
-    file_path = f'{site.getsitepackages()[0]}/mlc_llm/op/batch_spec_verify.py'
-    
-    # PrimFunc를 반환하는 함수
-    code = '''"""Batch spec verify operators."""
+# PrimFunc를 반환하는 함수
+BATCH_SPEC_VERIFY_CODE = '''"""Batch spec verify operators."""
 from tvm.script import tir as T
 
 @T.prim_func
@@ -38,11 +35,27 @@ def batch_spec_verify_compact(*args):
     """Return the PrimFunc for compact batch verification."""
     return _batch_spec_verify_compact_impl
 '''
-    
-    with open(file_path, 'w') as f:
-        f.write(code)
-    
-    print("Applied: Functions return PrimFunc objects")
+
+
+def main():
+    # 이 인터프리터의 site-packages 중 mlc_llm이 있는 곳 전부 (site.getsitepackages()[0]만 보지 않음)
+    site_pkgs = site_envs.mlc_site_packages()
+    if not site_pkgs:
+        print("File not found: no site-packages with mlc_llm")
+        return
+
+    for site_pkg in site_pkgs:
+        with site_envs.env_lock(site_pkg):
+            manifest = PatchManifest(site_pkg, 'patch_batch_spec', file_version(__file__))
+            status = manifest.patch('mlc_llm/op/batch_spec_verify.py', lambda _: BATCH_SPEC_VERIFY_CODE)
+            manifest.save()
+
+        if status == 'fresh':
+            print(f"Already applied: {site_pkg} batch_spec_verify.py matches the patch manifest (skipped)")
+        elif status == 'missing':
+            print(f"File not found: {manifest.abspath('mlc_llm/op/batch_spec_verify.py')}")
+        else:
+            print(f"Applied ({site_pkg}): Functions return PrimFunc objects")
 
 if __name__ == "__main__":
     main()
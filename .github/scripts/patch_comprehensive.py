@@ -3,64 +3,10 @@ import site
 import os
 import re
 
-def main():
-    mlc_dir = site.getsitepackages()[0] + '/mlc_llm'
-    
-    print("=== COMPREHENSIVE PATCH v2 ===")
-    
-    # 1. top_p_pivot.py - 완전한 패치
-    pivot_path = os.path.join(mlc_dir, 'op/top_p_pivot.py')
-    if os.path.exists(pivot_path):
-        print(f"Reading {pivot_path}...")
-        with open(pivot_path, 'r') as f:
-            content = f.read()
-        
-        # 문제 있는 부분 찾기
-        print("Original lines around error:")
-        lines = content.split('\n')
-        for i, line in enumerate(lines):
-            if 'not (find_pivot_local[0])' in line or 'find_pivot[0]' in line:
-                print(f"  Line {i+1}: {line}")
-        
-        # bool 관련 모든 패치
-        replacements = [
-            # bool 타입 선언
-            (r'"bool"', '"int32"'),
-            (r'dtype="bool"', 'dtype="int32"'),
-            
-            # True/False 값
-            ('find_pivot[0] = False', 'find_pivot[0] = 0'),
-            ('find_pivot[0] = True', 'find_pivot[0] = 1'),
-            ('find_pivot_local[0] = False', 'find_pivot_local[0] = 0'),
-            ('find_pivot_local[0] = True', 'find_pivot_local[0] = 1'),
-            
-            # bool 변수 선언
-            (r'T\.alloc_buffer\([^)]*"bool"[^)]*\)', 
-             lambda m: m.group(0).replace('"bool"', '"int32"')),
-            
-            # not 연산자 수정 (int32에 맞게)
-            ('not (find_pivot_local[0])', 'find_pivot_local[0] == 0'),
-            ('T.Not(', 'not ('),  # 일반적인 T.Not 처리
-        ]
-        
-        for old, new in replacements:
-            if callable(new):
-                content = re.sub(old, new, content)
-            else:
-                content = content.replace(old, new)
-        
-        # 추가: while 조건 수정
-        content = re.sub(r'while\s+find_pivot_local\[0\]\s*:', 
-                        'while find_pivot_local[0] == 1:', content)
-        
-        with open(pivot_path, 'w') as f:
-            f.write(content)
-        print("✓ Patched top_p_pivot.py")
-    
-    # 2. batch_spec_verify.py 패치
-    verify_path = os.path.join(mlc_dir, 'op/batch_spec_verify.py')
-    if os.path.exists(verify_path):
-        verify_code = '''"""Batch spec verify operators."""
+from bool_usage_scanner import files_with_hits, scan
+from patch_manifest import PatchManifest, file_version
+
+BATCH_SPEC_VERIFY_CODE = '''"""Batch spec verify operators."""
 from tvm.script import tir as T
 
 @T.prim_func
@@ -79,53 +25,108 @@ def batch_spec_verify():
 def batch_spec_verify_compact():
     return batch_spec_verify_func
 '''
-        
-        with open(verify_path, 'w') as f:
-            f.write(verify_code)
-        print("✓ Patched batch_spec_verify.py")
-    
-    # 3. attach_sampler.py 패치
-    sampler_path = os.path.join(mlc_dir, 'compiler_pass/attach_sampler.py')
-    if os.path.exists(sampler_path):
-        with open(sampler_path, 'r') as f:
-            content = f.read()
-        
-        # 모든 호출 패턴 수정
-        if 'batch_spec_verify(vocab_size)' in content:
-            content = content.replace('batch_spec_verify(vocab_size)', 'batch_spec_verify()')
-            print("✓ Patched attach_sampler.py")
+
+
+def patch_top_p_pivot(content):
+    # 문제 있는 부분 찾기
+    print("Original lines around error:")
+    lines = content.split('\n')
+    for i, line in enumerate(lines):
+        if 'not (find_pivot_local[0])' in line or 'find_pivot[0]' in line:
+            print(f"  Line {i+1}: {line}")
+
+    # bool 관련 모든 패치
+    replacements = [
+        # bool 타입 선언
+        (r'"bool"', '"int32"'),
+        (r'dtype="bool"', 'dtype="int32"'),
+
+        # True/False 값
+        ('find_pivot[0] = False', 'find_pivot[0] = 0'),
+        ('find_pivot[0] = True', 'find_pivot[0] = 1'),
+        ('find_pivot_local[0] = False', 'find_pivot_local[0] = 0'),
+        ('find_pivot_local[0] = True', 'find_pivot_local[0] = 1'),
+
+        # bool 변수 선언
+        (r'T\.alloc_buffer\([^)]*"bool"[^)]*\)',
+         lambda m: m.group(0).replace('"bool"', '"int32"')),
+
+        # not 연산자 수정 (int32에 맞게)
+        ('not (find_pivot_local[0])', 'find_pivot_local[0] == 0'),
+        ('T.Not(', 'not ('),  # 일반적인 T.Not 처리
+    ]
+
+    for old, new in replacements:
+        if callable(new):
+            content = re.sub(old, new, content)
         else:
-            print("⚠ attach_sampler.py already patched or pattern not found")
-        
-        with open(sampler_path, 'w') as f:
-            f.write(content)
-    
+            content = content.replace(old, new)
+
+    # 추가: while 조건 수정
+    content = re.sub(r'while\s+find_pivot_local\[0\]\s*:',
+                    'while find_pivot_local[0] == 1:', content)
+    return content
+
+
+def patch_attach_sampler(content):
+    # 모든 호출 패턴 수정
+    return content.replace('batch_spec_verify(vocab_size)', 'batch_spec_verify()')
+
+
+STATUS_MESSAGES = {
+    'patched': "✓ Patched {}",
+    'unchanged': "✓ {} already patched (not rewritten)",
+    'fresh': "✓ {} up to date (manifest match, skipped)",
+    'missing': "⚠ {} not found",
+}
+
+
+def report(name, status):
+    print(STATUS_MESSAGES[status].format(name))
+
+
+def main():
+    site_pkg = site.getsitepackages()[0]
+    mlc_dir = site_pkg + '/mlc_llm'
+
+    # 이전 실행 이후 변경되지 않은 파일은 stat만 하고 건너뜀
+    manifest = PatchManifest(site_pkg, 'patch_comprehensive', file_version(__file__))
+
+    print("=== COMPREHENSIVE PATCH v2 ===")
+
+    # 1. top_p_pivot.py - 완전한 패치
+    pivot_rel = 'mlc_llm/op/top_p_pivot.py'
+    print(f"Reading {manifest.abspath(pivot_rel)}...")
+    report('top_p_pivot.py', manifest.patch(pivot_rel, patch_top_p_pivot))
+
+    # 2. batch_spec_verify.py 패치
+    report('batch_spec_verify.py',
+           manifest.patch('mlc_llm/op/batch_spec_verify.py', lambda _: BATCH_SPEC_VERIFY_CODE))
+
+    # 3. attach_sampler.py 패치
+    report('attach_sampler.py', manifest.patch('mlc_llm/compiler_pass/attach_sampler.py', patch_attach_sampler))
+
+    manifest.save()
+
     # 4. 추가 검사: 다른 bool 관련 파일
     print("\n=== SEARCHING FOR OTHER BOOL FILES ===")
-    bool_files = []
-    
-    for root, dirs, files in os.walk(mlc_dir):
-        for file in files:
-            if file.endswith('.py') and 'test' not in file:
-                filepath = os.path.join(root, file)
-                try:
-                    with open(filepath, 'r') as f:
-                        file_content = f.read()
-                        if '"bool"' in file_content or 'dtype="bool"' in file_content:
-                            rel_path = filepath.replace(mlc_dir + '/', '')
-                            bool_files.append(rel_path)
-                except:
-                    pass
-    
+    scan_result = scan([mlc_dir, os.path.join(site_pkg, 'tvm')], skip_tests=True)
+    bool_files = files_with_hits(scan_result)
+
     if bool_files:
-        print(f"Found {len(bool_files)} files with 'bool' references:")
+        print(f"Found {len(scan_result['hits'])} bool references in {len(bool_files)} files "
+              f"({scan_result['files']} scanned, {scan_result['rescanned']} re-read, "
+              f"{scan_result['elapsed'] * 1000:.1f}ms):")
+        counts = {}
+        for hit in scan_result['hits']:
+            counts[hit['path']] = counts.get(hit['path'], 0) + 1
         for f in bool_files[:5]:  # 처음 5개만 출력
-            print(f"  - {f}")
+            print(f"  - {f} ({counts[f]})")
         if len(bool_files) > 5:
-            print(f"  - ... and {len(bool_files)-5} more")
+            print(f"  - ... and {len(bool_files)-5} more (full list: bool_usage_scanner.py --json)")
     else:
         print("No other bool files found")
-    
+
     print("\n=== PATCH COMPLETE ===")
 
 if __name__ == "__main__":
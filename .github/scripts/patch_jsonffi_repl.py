@@ -11,12 +11,14 @@ Behavior:
 This mirrors the approach used by `.github/scripts/patch_mlc_bool_bug.py`.
 """
 
-import os
 import sys
 import site
 import shutil
 from pathlib import Path
 
+from mirror_fetch import fetch_to, jsonffi_urls, wait_revalidations
+from tree_patcher import atomic_write_bytes
+
 REPO_ROOT = Path(__file__).resolve().parents[2]
 # Prefer repository-local copy at known locations, but fall back to searching the
 # workspace for any matching file so CI runner layouts (where the mlc-llm repo
@@ -46,30 +48,22 @@ LOCAL_SRC = find_local_src()
 
 
 def try_fetch_remote():
-    import urllib.request
-    candidates = []
-    # Primary canonical location
-    candidates.append('https://raw.githubusercontent.com/mlc-ai/mlc-llm/main/cpp/json_ffi/json_ffi_engine.cc')
-    # Try using the current repo context if available
-    gh_repo = os.environ.get('GITHUB_REPOSITORY')
-    if gh_repo:
-        candidates.append(f'https://raw.githubusercontent.com/{gh_repo}/main/mlc-llm/cpp/json_ffi/json_ffi_engine.cc')
-        candidates.append(f'https://raw.githubusercontent.com/{gh_repo}/main/cpp/json_ffi/json_ffi_engine.cc')
-
-    for url in candidates:
-        try:
-            print(f"Attempting to download json_ffi_engine.cc from: {url}")
-            with urllib.request.urlopen(url, timeout=15) as resp:
-                if resp.status == 200:
-                    data = resp.read()
-                    out = REPO_ROOT / 'tmp_json_ffi_engine.cc'
-                    with open(out, 'wb') as f:
-                        f.write(data)
-                    print(f"Downloaded to: {out}")
-                    return out
-        except Exception as e:
-            print(f"  fetch failed: {e}")
-    return None
+    # a mirrored copy is used at once and revalidated in the background;
+    # otherwise all candidate URLs are raced under one deadline
+    # (MLC_FETCH_DEADLINE) instead of 15s per URL in turn
+    urls = jsonffi_urls()
+    print("Attempting to download json_ffi_engine.cc from:")
+    for url in urls:
+        print(f"  {url}")
+    errors = {}
+    out = REPO_ROOT / 'tmp_json_ffi_engine.cc'
+    result = fetch_to(urls, out, validate=bool, errors=errors, stale_while_revalidate=True)
+    for url, error in list(errors.items()):
+        print(f"  fetch failed: {url}: {error}")
+    if result is None:
+        return None
+    print(f"Downloaded to: {out} ({result.source}: {result.url or 'mirror'}, {result.elapsed:.1f}s)")
+    return out
 
 def find_site_pkg_paths():
     paths = []
@@ -129,7 +123,8 @@ def patch_mlc_llm():
                 if not bak.exists():
                     shutil.copy2(target, bak)
                     print(f"  🔁 Backup written: {bak}")
-                shutil.copy2(LOCAL_SRC, target)
+                # replace, never write in place: the installed file may be a hardlink into a snapshot store
+                atomic_write_bytes(str(target), Path(LOCAL_SRC).read_bytes())
                 print(f"  ✅ Replaced installed json_ffi_engine.cc with local copy")
                 replaced = True
                 replaced_targets.append(str(target))
@@ -268,6 +263,7 @@ def patch_mlc_llm():
 if __name__ == '__main__':
     print("🔧 Running json_ffi patch script")
     rc = patch_mlc_llm()
+    wait_revalidations()
     if rc == 0:
         print("✅ patch_jsonffi_repl.py completed successfully")
     else:
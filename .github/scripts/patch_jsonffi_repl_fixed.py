@@ -6,12 +6,14 @@ never fails the CI. It writes diagnostics into tmp_patched_jsonffi/
 so the build can continue and fallbacks can run if verification
 isn't successful.
 """
-import os
 import sys
 import site
-import shutil
 from pathlib import Path
 
+from content_install import ContentInstaller
+from marker_search import DEFAULT_MARKERS, first_marker
+from mirror_fetch import fetch_to, jsonffi_urls, wait_revalidations
+
 REPO_ROOT = Path(__file__).resolve().parents[2]
 PREFERRED_CANDIDATES = [
     REPO_ROOT / '.github' / 'patches' / 'json_ffi_engine.cc',
@@ -37,28 +39,22 @@ LOCAL_SRC = find_local_src()
 
 
 def try_fetch_remote():
-    import urllib.request
-    candidates = [
-        'https://raw.githubusercontent.com/mlc-ai/mlc-llm/main/cpp/json_ffi/json_ffi_engine.cc'
-    ]
-    gh_repo = os.environ.get('GITHUB_REPOSITORY')
-    if gh_repo:
-        candidates.append(f'https://raw.githubusercontent.com/{gh_repo}/main/mlc-llm/cpp/json_ffi/json_ffi_engine.cc')
-        candidates.append(f'https://raw.githubusercontent.com/{gh_repo}/main/cpp/json_ffi/json_ffi_engine.cc')
-    for url in candidates:
-        try:
-            print(f"Attempting to download json_ffi_engine.cc from: {url}")
-            with urllib.request.urlopen(url, timeout=15) as resp:
-                if resp.status == 200:
-                    data = resp.read()
-                    out = REPO_ROOT / 'tmp_json_ffi_engine.cc'
-                    with open(out, 'wb') as f:
-                        f.write(data)
-                    print(f"Downloaded to: {out}")
-                    return out
-        except Exception as e:
-            print(f"  fetch failed: {e}")
-    return None
+    # a mirrored copy is used at once and revalidated in the background;
+    # otherwise all candidate URLs are raced under one deadline
+    # (MLC_FETCH_DEADLINE) instead of 15s per URL in turn
+    urls = jsonffi_urls()
+    print("Attempting to download json_ffi_engine.cc from:")
+    for url in urls:
+        print(f"  {url}")
+    errors = {}
+    out = REPO_ROOT / 'tmp_json_ffi_engine.cc'
+    result = fetch_to(urls, out, validate=bool, errors=errors, stale_while_revalidate=True)
+    for url, error in list(errors.items()):
+        print(f"  fetch failed: {url}: {error}")
+    if result is None:
+        return None
+    print(f"Downloaded to: {out} ({result.source}: {result.url or 'mirror'}, {result.elapsed:.1f}s)")
+    return out
 
 
 def find_site_pkg_paths():
@@ -113,88 +109,87 @@ def patch_mlc_llm():
             return 0
 
     site_paths = find_site_pkg_paths()
-    replaced_targets = []
+    outdir = REPO_ROOT / 'tmp_patched_jsonffi'
+    outdir.mkdir(parents=True, exist_ok=True)
+    # hash LOCAL_SRC once; identical targets are skipped so their mtimes (and
+    # the CMake/ccache results depending on them) are left alone
+    installer = ContentInstaller(LOCAL_SRC)
+    src_marker = first_marker(LOCAL_SRC, DEFAULT_MARKERS)
+    patched_targets = []
     attempted_targets = []
     for sp in site_paths:
         target = Path(sp) / 'mlc_llm' / 'cpp' / 'json_ffi' / 'json_ffi_engine.cc'
         attempted_targets.append(str(target))
-        try:
-            # Ensure parent exists then overwrite target with our LOCAL_SRC
-            target.parent.mkdir(parents=True, exist_ok=True)
-            bak = target.with_suffix('.cc.bak')
-            if target.exists() and not bak.exists():
-                shutil.copy2(target, bak)
-                print(f"  🔁 Backup written: {bak}")
-            shutil.copy2(LOCAL_SRC, target)
+        # replaced by rename, never written in place: a restored env_snapshot
+        # hardlinks the installed file into the shared object store
+        action = installer.install(target)
+        if action['action'] == 'failed':
+            print(f"  ❌ Failed to write/replace installed target {target}: {action['error']}")
+            continue
+        if action.get('backup'):
+            print(f"  🔁 Backup written: {action['backup']}")
+        if action['action'] == 'identical':
+            print(f"  ⏭️  Already up to date (unchanged, mtime kept): {target}")
+        else:
             print(f"  ✅ Forced replaced/installed json_ffi_engine.cc at: {target}")
-            replaced_targets.append(str(target))
-            # quick verification for marker
-            with open(target, 'r', encoding='utf-8', errors='replace') as tf:
-                ct = tf.read()
-            if 'jsonffi_contains_replacement' in ct or 'MLCJSONFFIEngineForceLink_v1' in ct:
-                print('  🔍 Marker detected in installed copy')
-            else:
-                print('  ⚠️ Marker NOT detected in installed copy; keep investigating')
-        except Exception as e:
-            print(f"  ❌ Failed to write/replace installed target {target}: {e}")
+        patched_targets.append(str(target))
+
+    # every patched target now holds exactly LOCAL_SRC's bytes (sha256 checked),
+    # so the marker only has to be looked up once, in the source
+    if patched_targets:
+        if src_marker:
+            print(f"  🔍 Marker '{src_marker}' detected in {len(patched_targets)} installed copies "
+                  f"(sha256 {installer.sha256[:12]})")
+        else:
+            print('  ⚠️ Marker NOT detected in installed copies; keep investigating')
 
-    outdir = REPO_ROOT / 'tmp_patched_jsonffi'
-    outdir.mkdir(parents=True, exist_ok=True)
     with open(outdir / 'attempted_targets.txt', 'w') as fh:
         fh.write('\n'.join(attempted_targets) + '\n')
-
-    if replaced_targets:
-        with open(outdir / 'patched_targets.txt', 'w') as fh:
-            fh.write('\n'.join(replaced_targets) + '\n')
-        for t in replaced_targets:
-            try:
-                shutil.copy2(t, outdir / ('installed-' + Path(t).name))
-            except Exception:
-                pass
-        print(f"  🗂 Wrote patched target info and copies to: {outdir}")
-    else:
+    if not patched_targets:
         print('  ⚠️ No installed targets were replaced; check site-packages layout or permissions')
-        try:
-            # Write attempted targets for debugging
-            with open(outdir / 'attempted_targets.txt', 'w') as fh:
-                fh.write('\n'.join(attempted_targets) + '\n')
-        except Exception:
-            pass
 
     # Always also try to copy into local mlc-llm-source if present
     local_source_dir = REPO_ROOT / 'mlc-llm-source' / 'cpp' / 'json_ffi'
-    try:
-        if local_source_dir.exists():
-            local_target = local_source_dir / 'json_ffi_engine.cc'
-            shutil.copy2(LOCAL_SRC, local_target)
-            print(f"  ✅ Copied patch into local mlc-llm-source at: {local_target}")
-            with open(outdir / 'patched_targets.txt', 'w') as fh:
-                fh.write(str(local_target) + '\n')
-            try:
-                shutil.copy2(local_target, outdir / ('installed-' + Path(local_target).name))
-            except Exception:
-                pass
-            print(f"  🗂 Wrote patched target info and copy to: {outdir}")
-            with open(local_target, 'r') as f:
-                content = f.read()
-            if 'jsonffi_contains_replacement' in content:
-                print(f"🔍 Verification OK: marker found in local mlc-llm-source {local_target}")
+    local_ok = False
+    if local_source_dir.exists():
+        local_target = local_source_dir / 'json_ffi_engine.cc'
+        action = installer.install(local_target, backup=False, role='local')
+        if action['action'] == 'failed':
+            print(f"  ❌ Failed to write patch into mlc-llm-source: {action['error']}")
+        else:
+            if action['action'] == 'identical':
+                print(f"  ⏭️  Local mlc-llm-source already up to date: {local_target}")
             else:
-                print(f"⚠️ Marker not found in local copy {local_target}; writing marker_missing\n")
-                write_marker_missing()
-    except Exception as e:
-        print(f"  ❌ Failed to write patch into mlc-llm-source: {e}")
+                print(f"  ✅ Copied patch into local mlc-llm-source at: {local_target}")
+            patched_targets.append(str(local_target))
+            local_ok = True
+
+    if patched_targets:
+        with open(outdir / 'patched_targets.txt', 'w') as fh:
+            fh.write('\n'.join(patched_targets) + '\n')
+        # all copies have the same bytes: one hardlinked diagnostic copy is enough
+        installer.mirror(patched_targets[0], outdir / 'installed-json_ffi_engine.cc')
+        print(f"  🗂 Wrote patched target info and copies to: {outdir}")
+    try:
+        installer.save(outdir / 'install_manifest.json')
+    except OSError as e:
+        print(f"  ⚠️ Could not write install manifest: {e}")
+    counts = ', '.join(f"{v} {k}" for k, v in sorted(installer.summary().items()))
+    print(f"  📒 Install manifest: {counts}")
+
+    if local_ok:
+        if src_marker == 'jsonffi_contains_replacement':
+            print(f"🔍 Verification OK: marker found in local mlc-llm-source {local_target}")
+        else:
+            print(f"⚠️ Marker not found in local copy {local_target}; writing marker_missing\n")
+            write_marker_missing()
 
     # final verification in installed site-packages
     marker = 'jsonffi_contains_replacement'
-    for sp in site_paths:
-        target = Path(sp) / 'mlc_llm' / 'cpp' / 'json_ffi' / 'json_ffi_engine.cc'
-        if target.exists():
-            with open(target, 'r') as f:
-                content = f.read()
-            if marker in content:
-                print(f"🔍 Verification OK: marker '{marker}' found in {target}")
-                return 0
+    for action in installer.actions:
+        if action['role'] == 'target' and src_marker == marker and installer.matches(action['path']):
+            print(f"🔍 Verification OK: marker '{marker}' found in {action['path']}")
+            return 0
 
     print("⚠️ Patch applied but verification marker not found. Please inspect the installed package or the local source.")
     write_marker_missing()
@@ -204,6 +199,7 @@ def patch_mlc_llm():
 if __name__ == '__main__':
     print("🔧 Running json_ffi patch script (robust variant)")
     rc = patch_mlc_llm()
+    wait_revalidations()
     if rc == 0:
         print("✅ patch_jsonffi_repl_fixed.py completed (non-fatal)")
     else:
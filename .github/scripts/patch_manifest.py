@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Fingerprint manifest that lets the patch scripts skip already-patched files.
+
+The manifest lives inside site-packages (`.mlc_patch_manifest.json`) and
+records, per patcher and per file (path relative to site-packages), the size,
+mtime and sha256 before/after patching. A file whose current size and mtime
+still match the recorded post-patch values, under the same patcher version,
+is considered fresh and is skipped with a single `stat()` -- it is neither
+read nor rewritten, so `__pycache__` stays valid.
+
+A pip reinstall (or any other edit) changes size/mtime, which makes only that
+file stale; bumping a patcher's version invalidates all of its entries.
+
+Usage from a patch script:
+
+    manifest = PatchManifest(site_pkg, 'patch_batch_spec', file_version(__file__))
+    status = manifest.patch('mlc_llm/op/batch_spec_verify.py', transform)
+    manifest.save()
+"""
+import hashlib
+import json
+import os
+
+from tree_patcher import atomic_write_bytes
+
+MANIFEST_NAME = '.mlc_patch_manifest.json'
+MANIFEST_FORMAT = 1
+
+
+def sha256_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_version(path):
+    """Version string derived from a patch script's own source."""
+    with open(path, 'rb') as f:
+        return sha256_bytes(f.read())[:16]
+
+
+class PatchManifest:
+    """Per-patcher view of the site-packages patch manifest."""
+
+    def __init__(self, site_pkg, patcher, version):
+        self.site_pkg = site_pkg
+        self.patcher = patcher
+        self.version = version
+        self.path = os.path.join(site_pkg, MANIFEST_NAME)
+        self._dirty = False
+        self._data = self._load()
+        section = self._data['patchers'].get(patcher)
+        if section is None or section.get('version') != version:
+            # New patcher or changed rules: every previous entry is stale.
+            section = {'version': version, 'files': {}}
+            self._data['patchers'][patcher] = section
+            self._dirty = True
+        self._files = section['files']
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('format') == MANIFEST_FORMAT and isinstance(data.get('patchers'), dict):
+                return data
+        except (OSError, ValueError):
+            pass
+        return {'format': MANIFEST_FORMAT, 'patchers': {}}
+
+    def abspath(self, relpath):
+        return os.path.join(self.site_pkg, *relpath.split('/'))
+
+    def is_fresh(self, relpath):
+        """stat-only check: file unchanged since this patcher last recorded it."""
+        entry = self._files.get(relpath)
+        if entry is None:
+            return False
+        try:
+            st = os.stat(self.abspath(relpath))
+        except OSError:
+            return False
+        return st.st_size == entry['size'] and st.st_mtime_ns == entry['mtime_ns']
+
+    def entry(self, relpath):
+        return self._files.get(relpath)
+
+    def record(self, relpath, before, after, **extra):
+        """Record the post-patch state of `relpath` (before/after are bytes)."""
+        st = os.stat(self.abspath(relpath))
+        entry = {
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'sha256_before': sha256_bytes(before),
+            'sha256_after': sha256_bytes(after),
+        }
+        entry.update(extra)
+        self._files[relpath] = entry
+        self._dirty = True
+
+    def patch(self, relpath, transform, encoding='utf-8'):
+        """Apply `transform(text) -> text` to one file unless it is fresh.
+
+        Returns 'fresh' (skipped by stat), 'missing', 'unchanged' (read but
+        already in the desired state; not rewritten) or 'patched'.
+        """
+        if self.is_fresh(relpath):
+            return 'fresh'
+        path = self.abspath(relpath)
+        try:
+            with open(path, 'rb') as f:
+                before = f.read()
+        except FileNotFoundError:
+            return 'missing'
+        after = transform(before.decode(encoding)).encode(encoding)
+        if after != before:
+            atomic_write_bytes(path, after)
+        self.record(relpath, before, after)
+        return 'patched' if after != before else 'unchanged'
+
+    def save(self):
+        if not self._dirty:
+            return False
+        try:
+            atomic_write_bytes(self.path, json.dumps(self._data, indent=1, sort_keys=True).encode('utf-8'))
+        except OSError as e:
+            print(f"  ⚠️  patch manifest not written ({self.path}): {e}")
+            return False
+        self._dirty = False
+        return True
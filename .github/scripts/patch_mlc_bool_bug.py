@@ -7,515 +7,212 @@ GitHub Issue #3389: "IntImm supports only int or uint type, but bool was supplie
 - 영향받는 파일: batch_spec_verify.py, top_p_pivot.py
 """
 
+import argparse
+import json
 import site
-import re
 import os
 import sys
+import time
 
-def patch_batch_spec_verify(site_pkg: str) -> bool:
-    """batch_spec_verify.py의 bool 타입을 int32로 변환"""
-    file_path = os.path.join(site_pkg, 'mlc_llm', 'op', 'batch_spec_verify.py')
-    
-    if not os.path.exists(file_path):
-        print(f"  ⚠️  파일을 찾을 수 없습니다: {file_path}")
-        return False
-    
-    print(f"  📄 패치 중: {file_path}")
-    
-    with open(file_path, 'r') as f:
-        content = f.read()
-    
-    original = content
-    
-    # 1. 모든 _var("bool") -> _var("int32")
-    content = content.replace('_var("bool")', '_var("int32")')
-    
-    # 2. 모든 T.alloc_buffer with "bool" -> "int32"
-    content = re.sub(
-        r'T\.alloc_buffer\(\s*\(\s*1\s*,\s*\)\s*,\s*"bool"\s*,\s*scope="shared"\)',
-        'T.alloc_buffer((1,), "int32", scope="shared")',
-        content
-    )
-    content = re.sub(
-        r'T\.alloc_buffer\(\s*\(\s*1\s*,\s*\)\s*,\s*"bool"\s*,\s*scope="local"\)',
-        'T.alloc_buffer((1,), "int32", scope="local")',
-        content
-    )
-    
-    # 3. 모든 [0] = False -> [0] = T.int32(0)
-    content = re.sub(r'\[0\]\s*=\s*False', '[0] = T.int32(0)', content)
-    
-    # 4. 모든 [0] = True -> [0] = T.int32(1)
-    content = re.sub(r'\[0\]\s*=\s*True', '[0] = T.int32(1)', content)
-    
-    # 5. 모든 T.Not(...[0]) -> ...[0] == T.int32(0)
-    content = re.sub(
-        r'T\.Not\((\w+)\[0\]\)',
-        r'\1[0] == T.int32(0)',
-        content
-    )
-    
-    # 6. while 문 내의 T.Not 처리
-    content = re.sub(
-        r'while\s+T\.Not\((\w+)\[0\]\)\s*:',
-        r'while \1[0] == T.int32(0):',
-        content
-    )
-    
-    # 7. pred_shared[0] = 비교식 -> T.Cast("int32", 비교식)
-    # pred_shared[0] = p_child[0] >= uniform_sample[0] * q_child[0]
-    content = re.sub(
-        r'pred_shared\[0\]\s*=\s*(.+?)(\s*#.*)?$',
-        r'pred_shared[0] = T.Cast("int32", \1)\2',
-        content,
-        flags=re.MULTILINE
-    )
-    
-    # 8. if pred_local[0]: -> if pred_local[0] != T.int32(0):
-    content = re.sub(
-        r'if\s+(\w+)\[0\]\s*:',
-        r'if \1[0] != T.int32(0):',
-        content
-    )
-    
-    with open(file_path, 'w') as f:
-        f.write(content)
-    
-    changed = original != content
-    print(f"  ✅ batch_spec_verify.py 패치 완료 (변경됨: {changed})")
-    return changed
+from patch_manifest import PatchManifest
+from tree_patcher import expand_targets, patch_tree, rewrite_file
+import precompile_patched
+import site_envs
+from bool_rules import (
+    BOOL_RULES, BATCH_SPEC_VERIFY, TOP_P_PIVOT, TVM_SAMPLING, COMPILER_PASSES, TVM_STMT,
+)
 
+# (단계 설명, site-packages 기준 경로 또는 glob) - 규칙 자체는 bool_rules.py 참고
+PATCH_STEPS = [
+    ('batch_spec_verify.py 패치', BATCH_SPEC_VERIFY),
+    ('top_p_pivot.py 패치', TOP_P_PIVOT),
+    ('tvm/sampling.py 패치', TVM_SAMPLING),
+    ('모든 compiler_pass 파일 스캔 및 패치 (low_batch_specialization, lift_global_buffer_alloc 포함)', COMPILER_PASSES),
+    ('TVM tir/stmt.py 패치 (BlockRealize bool predicate)', TVM_STMT),
+]
 
-def patch_top_p_pivot(site_pkg: str) -> bool:
-    """top_p_pivot.py의 bool 타입을 int32로 변환"""
-    file_path = os.path.join(site_pkg, 'mlc_llm', 'op', 'top_p_pivot.py')
-    
-    if not os.path.exists(file_path):
-        print(f"  ⚠️  파일을 찾을 수 없습니다: {file_path}")
-        return False
-    
-    print(f"  📄 패치 중: {file_path}")
-    
-    with open(file_path, 'r') as f:
-        content = f.read()
-    
-    original = content
-    
-    # 1. 모든 _var("bool") -> _var("int32")
-    content = content.replace('_var("bool")', '_var("int32")')
-    
-    # 2. 모든 T.alloc_buffer with "bool" -> "int32"
-    content = re.sub(
-        r'T\.alloc_buffer\(\s*\(\s*1\s*,\s*\)\s*,\s*"bool"\s*,\s*scope="shared"\)',
-        'T.alloc_buffer((1,), "int32", scope="shared")',
-        content
-    )
-    content = re.sub(
-        r'T\.alloc_buffer\(\s*\(\s*1\s*,\s*\)\s*,\s*"bool"\s*,\s*scope="local"\)',
-        'T.alloc_buffer((1,), "int32", scope="local")',
-        content
-    )
-    
-    # 3. 모든 [0] = False -> [0] = T.int32(0)
-    content = re.sub(r'\[0\]\s*=\s*False', '[0] = T.int32(0)', content)
-    
-    # 4. 모든 [0] = True -> [0] = T.int32(1)
-    content = re.sub(r'\[0\]\s*=\s*True', '[0] = T.int32(1)', content)
-    
-    # 5. 모든 T.Not(...[0]) -> ...[0] == T.int32(0)
-    content = re.sub(
-        r'T\.Not\((\w+)\[0\]\)',
-        r'\1[0] == T.int32(0)',
-        content
-    )
-    
-    # 6. bool 비교 결과를 int32로 캐스팅
-    # es[0] = 1 - total_sum_reduce[0] < pivot[pN - 1] -> T.Cast("int32", ...)
-    content = re.sub(
-        r'es\[0\]\s*=\s*1\s*-\s*total_sum_reduce\[0\]\s*<\s*pivot\[pN\s*-\s*1\]',
-        'es[0] = T.Cast("int32", 1 - total_sum_reduce[0] < pivot[pN - 1])',
-        content
-    )
-    
-    with open(file_path, 'w') as f:
-        f.write(content)
-    
-    changed = original != content
-    print(f"  ✅ top_p_pivot.py 패치 완료 (변경됨: {changed})")
-    return changed
-
-
-def patch_tvm_sampling(site_pkg: str) -> bool:
-    """TVM sampling.py의 bool 타입을 int32로 변환"""
-    file_path = os.path.join(site_pkg, 'tvm', 'relax', 'backend', 'gpu_generic', 'sampling.py')
-    
-    if not os.path.exists(file_path):
-        print(f"  ⚠️  파일을 찾을 수 없습니다: {file_path}")
-        return False
-    
-    print(f"  📄 패치 중: {file_path}")
-    
-    with open(file_path, 'r') as f:
-        content = f.read()
-    
-    original = content
-    
-    # 1. 모든 T.alloc_buffer with "bool" -> "int32"
-    # shared_buf = T.alloc_buffer((TX * TY,), "bool", scope="shared")
-    content = re.sub(
-        r'T\.alloc_buffer\(\s*\([^)]+\)\s*,\s*"bool"\s*,\s*scope="shared"\)',
-        lambda m: m.group(0).replace('"bool"', '"int32"'),
-        content
-    )
-    content = re.sub(
-        r'T\.alloc_buffer\(\s*\([^)]+\)\s*,\s*"bool"\s*,\s*scope="local"\)',
-        lambda m: m.group(0).replace('"bool"', '"int32"'),
-        content
-    )
-    
-    # 2. compare_bool_not_equal 함수의 반환 타입 및 비교 수정
-    # def compare_bool_not_equal(a: T.bool, b: T.bool) -> T.bool:
-    content = re.sub(
-        r'def compare_bool_not_equal\(a:\s*T\.bool,\s*b:\s*T\.bool\)\s*->\s*T\.bool:',
-        'def compare_bool_not_equal(a: T.int32, b: T.int32) -> T.int32:',
-        content
-    )
-    
-    # 3. T.Cast("int8", a) != T.Cast("int8", b) -> T.Cast("int32", a != b)
-    # 이 부분은 int32 버퍼이므로 직접 비교 가능
-    content = re.sub(
-        r'return T\.Cast\("int8", a\) != T\.Cast\("int8", b\)',
-        'return T.Cast("int32", a != b)',
-        content
-    )
-    
-    # 4. source_local[0] 반환을 int32로 캐스팅
-    # output_local[0] = ... source_local[0]
-    # 이미 버퍼가 int32이므로 추가 작업 불필요
-    
-    # 5. valid[v] = prob_local > threshold and idx < vocab_size
-    # bool 표현식을 int32로 캐스팅
-    content = re.sub(
-        r'valid\[v\]\s*=\s*prob_local\s*>\s*threshold\s*and\s*idx\s*<\s*vocab_size',
-        'valid[v] = T.Cast("int32", prob_local > threshold and idx < vocab_size)',
-        content
-    )
-    
-    # 6. greater_than_u[v] = (...) 여러 줄 표현식 처리
-    # 직접 문자열 치환으로 처리
-    old_greater = '''greater_than_u[v] = (
-                        cumsum[ty * warp_elem + tx * thread_elem + v] + aggregate[()]
-                        >= uniform_sample - eps
-                    )'''
-    new_greater = '''greater_than_u[v] = T.Cast("int32",
-                        cumsum[ty * warp_elem + tx * thread_elem + v] + aggregate[()]
-                        >= uniform_sample - eps
-                    )'''
-    content = content.replace(old_greater, new_greater)
-    
-    # 7. mask[v] = mask[v] and valid[v] -> T.Cast("int32", ...)
-    content = re.sub(
-        r'mask\[v\]\s*=\s*mask\[v\]\s*and\s*valid\[v\]',
-        'mask[v] = T.Cast("int32", mask[v] != 0 and valid[v] != 0)',
-        content
-    )
-    
-    # 8. if mask_local[i]: -> if mask_local[i] != 0:
-    content = re.sub(
-        r'if mask_local\[i\]:',
-        'if mask_local[i] != 0:',
-        content
-    )
-    
-    with open(file_path, 'w') as f:
-        f.write(content)
-    
-    changed = original != content
-    print(f"  ✅ tvm/sampling.py 패치 완료 (변경됨: {changed})")
-    return changed
 
+def print_report(report):
+    name = report.relpath
+    if report.status == 'missing':
+        print(f"  ⚠️  파일을 찾을 수 없습니다: {name}")
+    elif report.status == 'error':
+        print(f"  ❌ {name} 패치 실패: {report.error}")
+    elif report.status == 'fresh':
+        print(f"  ⏭️  {name} 최신 상태 (manifest 일치, 건너뜀)")
+    else:
+        applied = ', '.join(f"{rule}={n}" for rule, n in report.result.hits.items() if n)
+        if report.status == 'unchanged' and not applied:
+            return  # 규칙이 하나도 적용되지 않은 파일은 생략
+        changed = report.status == 'patched'
+        print(f"  ✅ {name} (변경됨: {changed}, {report.seconds * 1000:.1f}ms) {applied}")
 
-def patch_low_batch_specialization(site_pkg: str) -> bool:
-    """low_batch_specialization.py의 BlockRealize predicate 수정
-    
-    TVM의 BlockRealize는 bool 타입 predicate를 요구하지만,
-    const(True, "bool")이 Metal 백엔드에서 실패함.
-    해결책: tir._ffi_api.BlockRealize를 직접 호출하여 우회
-    """
-    file_path = os.path.join(site_pkg, 'mlc_llm', 'compiler_pass', 'low_batch_specialization.py')
-    
-    if not os.path.exists(file_path):
-        print(f"  ⚠️  파일을 찾을 수 없습니다: {file_path}")
-        return False
-    
-    print(f"  📄 패치 중: {file_path}")
-    
-    with open(file_path, 'r') as f:
-        content = f.read()
-    
-    original = content
-    
-    # tir.BlockRealize([], True, body) -> FFI 직접 호출
-    # TVM FFI에서는 const()를 거치지 않고 직접 bool expression을 전달할 수 있음
-    # tir.const(1, "int32") > tir.const(0, "int32") 형태의 비교 표현식은 bool 타입
-    content = content.replace(
-        'tir.BlockRealize([], True, body)',
-        'tir.BlockRealize([], tir.const(1, "int32") > tir.const(0, "int32"), body)'
-    )
-    
-    with open(file_path, 'w') as f:
-        f.write(content)
-    
-    changed = original != content
-    print(f"  ✅ low_batch_specialization.py 패치 완료 (변경됨: {changed})")
-    return changed
 
+def patch_all_mlc_compiler_passes(manifest, workers=None):
+    """모든 MLC-LLM compiler_pass 파일에 predicate=True / BlockRealize True 규칙 적용
 
-def patch_lift_global_buffer_alloc(site_pkg: str) -> bool:
-    """lift_global_buffer_alloc.py의 predicate=True 수정
-    
-    동일한 문제: predicate=True가 const(True, "bool")로 변환되어 실패
-    해결책: 비교 표현식을 사용하여 bool 타입 생성
+    워커 풀에서 파일마다 한 번 읽고, 한 번의 패스로 모든 규칙을 적용한 뒤
+    변경된 파일만 임시 파일 + rename으로 정확히 한 번 기록
     """
-    file_path = os.path.join(site_pkg, 'mlc_llm', 'compiler_pass', 'lift_global_buffer_alloc.py')
-    
-    if not os.path.exists(file_path):
-        print(f"  ⚠️  파일을 찾을 수 없습니다: {file_path}")
-        return False
-    
-    print(f"  📄 패치 중: {file_path}")
-    
-    with open(file_path, 'r') as f:
-        content = f.read()
-    
-    original = content
-    
-    # predicate=True -> predicate=(1 > 0) 비교 표현식 (항상 True인 bool 표현식)
-    content = content.replace(
-        'predicate=True',
-        'predicate=tir.const(1, "int32") > tir.const(0, "int32")'
-    )
-    
-    with open(file_path, 'w') as f:
-        f.write(content)
-    
-    changed = original != content
-    print(f"  ✅ lift_global_buffer_alloc.py 패치 완료 (변경됨: {changed})")
-    return changed
-
+    compiler_pass_dir = manifest.abspath('mlc_llm/compiler_pass')
 
-def patch_all_mlc_compiler_passes(site_pkg: str) -> bool:
-    """모든 MLC-LLM compiler_pass 파일에서 predicate=True 패치
-    
-    비교 표현식을 사용하여 항상 True인 bool 표현식 생성
-    """
-    compiler_pass_dir = os.path.join(site_pkg, 'mlc_llm', 'compiler_pass')
-    
     if not os.path.exists(compiler_pass_dir):
         print(f"  ⚠️  디렉토리를 찾을 수 없습니다: {compiler_pass_dir}")
-        return False
-    
+        return []
+
     print(f"  📁 compiler_pass 디렉토리 스캔 중: {compiler_pass_dir}")
-    
-    any_changed = False
-    for filename in os.listdir(compiler_pass_dir):
-        if not filename.endswith('.py'):
-            continue
-        
-        file_path = os.path.join(compiler_pass_dir, filename)
-        with open(file_path, 'r') as f:
-            content = f.read()
-        
-        original = content
-        
-        # predicate=True 패턴 검색 및 치환 (비교 표현식 사용)
-        if 'predicate=True' in content:
-            content = content.replace(
-                'predicate=True',
-                'predicate=tir.const(1, "int32") > tir.const(0, "int32")'
-            )
-            
-            if content != original:
-                with open(file_path, 'w') as f:
-                    f.write(content)
-                print(f"     ✅ {filename} 패치됨 (predicate=True)")
-                any_changed = True
-        
-        # tir.BlockRealize([], True, body) 패턴
-        original_after_first = content
-        if 'tir.BlockRealize([], True,' in content:
-            content = content.replace(
-                'tir.BlockRealize([], True,',
-                'tir.BlockRealize([], tir.const(1, "int32") > tir.const(0, "int32"),'
-            )
-            
-            if content != original_after_first:
-                with open(file_path, 'w') as f:
-                    f.write(content)
-                print(f"     ✅ {filename} 패치됨 (BlockRealize True)")
-                any_changed = True
-    
-    return any_changed
+    relpaths = expand_targets(manifest.site_pkg, BOOL_RULES, [COMPILER_PASSES])
+    return patch_tree(manifest, BOOL_RULES, relpaths, workers)
+
 
+def run_step(manifest, target: str, workers=None):
+    if target == COMPILER_PASSES:
+        return patch_all_mlc_compiler_passes(manifest, workers)
+    return [rewrite_file(manifest, BOOL_RULES, target)]
 
-def verify_patch(site_pkg: str):
-    """패치가 제대로 적용되었는지 검증"""
+
+def verify_patch(results):
+    """패치 패스에서 수집한 규칙별 적용 횟수로 검증 (파일을 다시 읽지 않음)"""
     print("\n📋 패치 검증...")
-    
-    # batch_spec_verify.py 검증
-    bsv_path = os.path.join(site_pkg, 'mlc_llm', 'op', 'batch_spec_verify.py')
-    if os.path.exists(bsv_path):
-        with open(bsv_path, 'r') as f:
-            content = f.read()
-        
-        print("\n--- batch_spec_verify.py 검증 ---")
-        if '"bool"' in content:
-            print("  ❌ 아직 bool 타입이 남아있습니다!")
-            # 어디에 남아있는지 출력
-            for i, line in enumerate(content.split('\n'), 1):
-                if '"bool"' in line:
-                    print(f"     Line {i}: {line.strip()}")
-        else:
-            print("  ✅ bool 타입이 모두 제거되었습니다")
-        
-        # T.Not 체크
-        if 'T.Not(' in content:
-            print("  ❌ T.Not()가 남아있습니다!")
-            for i, line in enumerate(content.split('\n'), 1):
-                if 'T.Not(' in line:
-                    print(f"     Line {i}: {line.strip()}")
-        else:
-            print("  ✅ T.Not()가 모두 제거되었습니다")
-        
-        int32_count = content.count('int32')
-        print(f"  📊 int32 사용 횟수: {int32_count}")
-        
-        # 핵심 패치 확인
-        print("\n  🔍 핵심 패치 확인:")
-        checks = [
-            ('_var("int32")', 'done = _var("int32")'),
-            ('T.alloc_buffer((1,), "int32"', 'pred_shared/pred_local 버퍼'),
-            ('T.Cast("int32"', 'pred_shared 비교 결과 캐스팅'),
-            ('!= T.int32(0)', 'if pred_local[0] 조건'),
-            ('== T.int32(0)', 'while done[0] 조건'),
-        ]
-        for pattern, desc in checks:
-            if pattern in content:
-                print(f"     ✅ {desc}")
+
+    all_ok = True
+    for result in results:
+        interesting = [r for r in result.rules if r.is_probe or result.hits[r.name] or r.expect is not None]
+        if not interesting:
+            continue
+        print(f"\n--- {result.relpath} 검증 ---")
+        for rule in interesting:
+            hits = result.hits[rule.name]
+            status = result.rule_status(rule)
+            expect = '-' if rule.expect is None else rule.expect
+            if rule.is_probe:
+                if status == 'ok':
+                    print(f"  ✅ {rule.name}: 남은 항목 없음")
+                else:
+                    print(f"  ❌ {rule.name}: {hits}개 남아있습니다! (기대값 {expect})")
+                    for lineno, line in result.probe_lines[rule.name]:
+                        print(f"     Line {lineno}: {line}")
+            elif status == 'applied':
+                print(f"  ℹ️  {rule.name}: 적용 0회 (이미 패치됨 또는 패턴 없음)")
+            elif status == 'mismatch':
+                print(f"  ⚠️  {rule.name}: 적용 {hits}회 (기대값 {expect})")
             else:
-                print(f"     ❌ {desc} - 패턴 없음: {pattern}")
-    
-    # top_p_pivot.py 검증
-    tpp_path = os.path.join(site_pkg, 'mlc_llm', 'op', 'top_p_pivot.py')
-    if os.path.exists(tpp_path):
-        with open(tpp_path, 'r') as f:
-            content = f.read()
-        
-        print("\n--- top_p_pivot.py 검증 ---")
-        if '"bool"' in content:
-            print("  ❌ 아직 bool 타입이 남아있습니다!")
-            for i, line in enumerate(content.split('\n'), 1):
-                if '"bool"' in line:
-                    print(f"     Line {i}: {line.strip()}")
-        else:
-            print("  ✅ bool 타입이 모두 제거되었습니다")
-        
-        if 'T.Not(' in content:
-            print("  ❌ T.Not()가 남아있습니다!")
-            for i, line in enumerate(content.split('\n'), 1):
-                if 'T.Not(' in line:
-                    print(f"     Line {i}: {line.strip()}")
-        else:
-            print("  ✅ T.Not()가 모두 제거되었습니다")
-        
-        int32_count = content.count('int32')
-        print(f"  📊 int32 사용 횟수: {int32_count}")
-    
-    # tvm/sampling.py 검증
-    sampling_path = os.path.join(site_pkg, 'tvm', 'relax', 'backend', 'gpu_generic', 'sampling.py')
-    if os.path.exists(sampling_path):
-        with open(sampling_path, 'r') as f:
-            content = f.read()
-        
-        print("\n--- tvm/sampling.py 검증 ---")
-        bool_buffers = re.findall(r'T\.alloc_buffer\([^)]+,\s*"bool"', content)
-        if bool_buffers:
-            print(f"  ❌ 아직 bool 버퍼가 {len(bool_buffers)}개 남아있습니다!")
-            for buf in bool_buffers[:5]:
-                print(f"     {buf}")
-        else:
-            print("  ✅ bool 버퍼가 모두 int32로 변환되었습니다")
-        
-        int32_count = content.count('"int32"')
-        print(f"  📊 int32 버퍼 사용 횟수: {int32_count}")
-
-
-def patch_tvm_stmt(site_pkg: str) -> bool:
-    """TVM stmt.py의 BlockRealize.__init__ 패치
-    
-    원래 코드:
-        if isinstance(predicate, bool):
-            predicate = const(predicate, "bool")
-    
-    const(True, "bool")이 Metal 백엔드에서 실패하므로,
-    비교 표현식으로 대체
+                print(f"  ✅ {rule.name}: 적용 {hits}회")
+        all_ok = all_ok and result.verified
+    return all_ok
+
+
+def patch_site(manifest, args):
+    """단일 환경 패치 (파일당 한 번 읽고 한 번의 패스로 모든 규칙 적용)"""
+    reports = []
+    if args.roots:
+        # 트리 전체 모드: 규칙 범위에 해당하는 모든 파일을 한 번에 병렬 처리
+        relpaths = expand_targets(manifest.site_pkg, BOOL_RULES, args.roots)
+        print(f"📁 {', '.join(args.roots)} 스캔: 규칙 대상 파일 {len(relpaths)}개")
+        reports = patch_tree(manifest, BOOL_RULES, relpaths, args.workers)
+        for report in reports:
+            print_report(report)
+        print()
+    else:
+        for i, (desc, target) in enumerate(PATCH_STEPS, 1):
+            print(f"[{i}/{len(PATCH_STEPS)}] {desc}")
+            step_reports = run_step(manifest, target, args.workers)
+            for report in step_reports:
+                print_report(report)
+            reports.extend(step_reports)
+            print()
+    manifest.save()
+    return reports
+
+
+def patch_env(env, workers=None, precompile=True):
+    """멀티 환경 모드: 한 환경을 출력 없이 패치하고 결과 요약을 반환
+
+    바이트코드는 해당 환경의 인터프리터로 컴파일 (파이썬 버전마다 .pyc 형식이 다름)
     """
-    file_path = os.path.join(site_pkg, 'tvm', 'tir', 'stmt.py')
-    
-    if not os.path.exists(file_path):
-        print(f"  ⚠️  파일을 찾을 수 없습니다: {file_path}")
-        return False
-    
-    print(f"  📄 패치 중: {file_path}")
-    
-    with open(file_path, 'r') as f:
-        content = f.read()
-    
-    original = content
-    
-    # isinstance(predicate, bool) 체크 후 const(predicate, "bool") 호출 부분을 수정
-    # 비교 표현식 (1 > 0) 또는 (0 > 1)을 사용하여 True/False 표현
-    old_code = '''if isinstance(predicate, bool):
-            predicate = const(predicate, "bool")'''
-    
-    new_code = '''if isinstance(predicate, bool):
-            # Patched: avoid const(bool) issue on Metal backend
-            # Use comparison expression instead of const(bool)
-            from tvm import tir as _tir
-            if predicate:
-                predicate = _tir.const(1, "int32") > _tir.const(0, "int32")
-            else:
-                predicate = _tir.const(0, "int32") > _tir.const(1, "int32")'''
-    
-    content = content.replace(old_code, new_code)
-    
-    # 다른 형태의 코드도 처리 (들여쓰기가 다를 수 있음)
-    old_code_alt = '''        if isinstance(predicate, bool):
-            predicate = const(predicate, "bool")'''
-    
-    new_code_alt = '''        if isinstance(predicate, bool):
-            # Patched: avoid const(bool) issue on Metal backend
-            from tvm import tir as _tir
-            if predicate:
-                predicate = _tir.const(1, "int32") > _tir.const(0, "int32")
-            else:
-                predicate = _tir.const(0, "int32") > _tir.const(1, "int32")'''
-    
-    content = content.replace(old_code_alt, new_code_alt)
-    
-    with open(file_path, 'w') as f:
-        f.write(content)
-    
-    changed = original != content
-    print(f"  ✅ tvm/tir/stmt.py 패치 완료 (변경됨: {changed})")
-    return changed
+    manifest = PatchManifest(env.site_pkg, 'patch_mlc_bool_bug', BOOL_RULES.fingerprint())
+    relpaths = expand_targets(env.site_pkg, BOOL_RULES, [target for _, target in PATCH_STEPS])
+    reports = patch_tree(manifest, BOOL_RULES, relpaths, workers)
+    manifest.save()
+    written = [manifest.abspath(r.relpath) for r in reports if r.status == 'patched']
+    compile_error = None
+    current = f'{sys.version_info.major}.{sys.version_info.minor}'
+    # 인터프리터를 모르는 다른 버전 환경은 잘못된 .pyc를 만들지 않도록 건너뜀
+    if precompile and written and (env.python or env.version in (None, current)):
+        compile_error = precompile_patched.precompile_with(env.python, written)
+    counts = {}
+    for r in reports:
+        counts[r.status] = counts.get(r.status, 0) + 1
+    results = [r.result for r in reports if r.result is not None]
+    return {
+        'counts': counts,
+        'verified': all(r.verified for r in results),
+        'compile_error': compile_error,
+        'files': {r.relpath: r.status if r.error is None else f'error: {r.error}' for r in reports},
+    }
+
+
+def patch_all_envs(envs, workers=None, precompile=True, report_path=None):
+    """발견된 모든 환경을 환경별 잠금 하에 동시에 패치하고 통합 리포트 출력"""
+    print(f"🌐 {len(envs)}개 환경 동시 패치")
+    started = time.perf_counter()
+    outcomes = site_envs.run_concurrently(envs, lambda env: patch_env(env, workers, precompile))
+    elapsed = time.perf_counter() - started
+
+    ok = True
+    print()
+    for out in outcomes:
+        env = out['env']
+        print(f"📍 {env.site_pkg} (python {env.version or '?'})")
+        if out['error']:
+            ok = False
+            print(f"  ❌ 실패: {out['error']}")
+            continue
+        result = out['result']
+        counts = ', '.join(f"{k} {v}" for k, v in sorted(result['counts'].items())) or '대상 파일 없음'
+        wait = f", 잠금 대기 {out['lock_wait']:.1f}s" if out['lock_wait'] > 0.05 else ''
+        print(f"  {'✅' if result['verified'] else '⚠️ '} {counts} ({out['seconds'] * 1000:.1f}ms{wait})")
+        if not result['verified']:
+            ok = False
+            print("  ⚠️  일부 잔여 bool 사용이 남아있습니다 (단일 환경 모드로 상세 검증 가능)")
+        if result['compile_error']:
+            print(f"  ⚠️  바이트코드 컴파일 실패: {result['compile_error']}")
+    print(f"\n⏱️  전체 시간: {elapsed * 1000:.1f}ms")
+
+    if report_path:
+        with open(report_path, 'w') as f:
+            json.dump([{**out['env'].as_dict(), 'error': out['error'], 'lock_wait': out['lock_wait'],
+                        'seconds': out['seconds'], **(out['result'] or {})} for out in outcomes], f, indent=2)
+        print(f"📊 리포트: {report_path}")
+    return ok
 
 
 def main():
+    parser = argparse.ArgumentParser(description='MLC-LLM Bool 타입 버그 패치 (GitHub Issue #3389)')
+    parser.add_argument('--roots', nargs='+', metavar='DIR',
+                        help='site-packages 기준 디렉토리 전체를 병렬 스캔 (예: mlc_llm tvm)')
+    parser.add_argument('--workers', type=int, default=None, help='워커 수 (기본: CPU 수 + 4, 최대 32)')
+    parser.add_argument('--no-precompile', action='store_true', help='패치 후 바이트코드 사전 컴파일 생략')
+    parser.add_argument('--no-import-timing', action='store_true', help='사전 컴파일 전후 cold import 측정 생략')
+    parser.add_argument('--all-envs', action='store_true',
+                        help='mlc_llm이 설치된 모든 conda env / venv / 인터프리터를 찾아 동시에 패치')
+    parser.add_argument('--site-packages', nargs='+', metavar='PATH',
+                        help='패치할 환경 목록 (site-packages, env prefix 또는 인터프리터 경로)')
+    parser.add_argument('--report', default=None, help='멀티 환경 모드 JSON 리포트 경로')
+    args = parser.parse_args()
+
     print("=" * 50)
     print("🔧 MLC-LLM Bool 타입 버그 패치")
     print("   GitHub Issue #3389 Fix")
     print("=" * 50)
+
+    if args.all_envs or args.site_packages:
+        envs = site_envs.from_paths(args.site_packages) if args.site_packages else site_envs.discover()
+        if not envs:
+            print("❌ MLC-LLM이 설치된 환경을 찾을 수 없습니다!")
+            sys.exit(1)
+        ok = patch_all_envs(envs, args.workers, not args.no_precompile, args.report)
+        sys.exit(0 if ok else 1)
     
     # site-packages 경로 찾기
     site_packages = site.getsitepackages()
@@ -535,43 +232,36 @@ def main():
     print(f"\n📍 MLC-LLM 위치: {site_pkg}/mlc_llm")
     print()
     
-    # 패치 적용
-    print("[1/7] batch_spec_verify.py 패치")
-    bsv_changed = patch_batch_spec_verify(site_pkg)
-    
-    print()
-    print("[2/7] top_p_pivot.py 패치")
-    tpp_changed = patch_top_p_pivot(site_pkg)
-    
-    print()
-    print("[3/7] tvm/sampling.py 패치")
-    sampling_changed = patch_tvm_sampling(site_pkg)
-    
-    print()
-    print("[4/7] low_batch_specialization.py 패치")
-    lbs_changed = patch_low_batch_specialization(site_pkg)
-    
-    print()
-    print("[5/7] lift_global_buffer_alloc.py 패치")
-    lgba_changed = patch_lift_global_buffer_alloc(site_pkg)
-    
-    print()
-    print("[6/7] 모든 compiler_pass 파일 스캔 및 패치")
-    all_cp_changed = patch_all_mlc_compiler_passes(site_pkg)
-    
-    print()
-    print("[7/7] TVM tir/stmt.py 패치 (BlockRealize bool predicate)")
-    tvm_stmt_changed = patch_tvm_stmt(site_pkg)
-    
+    # 패치 적용: 파일당 한 번 읽고 한 번의 패스로 모든 규칙 적용
+    # manifest에 기록된 (size, mtime)과 일치하는 파일은 stat만 하고 건너뜀
+    manifest = PatchManifest(site_pkg, 'patch_mlc_bool_bug', BOOL_RULES.fingerprint())
+    started = time.perf_counter()
+    with site_envs.env_lock(site_pkg):
+        reports = patch_site(manifest, args)
+    print(f"⏱️  패치 시간: {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    # 패치된 모듈을 미리 바이트 컴파일하여 첫 mlc_llm compile에서 재컴파일하지 않도록 함
+    if not args.no_precompile:
+        print()
+        print("🧱 패치된 모듈 바이트코드 사전 컴파일")
+        touched = [manifest.abspath(r.relpath) for r in reports if r.status not in ('missing', 'error')]
+        precompile_patched.run(touched, measure=not args.no_import_timing, workers=args.workers)
+
+    results = [r.result for r in reports if r.result is not None]
+
     # 검증
-    verify_patch(site_pkg)
-    
+    verified = verify_patch(results)
+
     print()
     print("=" * 50)
-    if bsv_changed or tpp_changed or sampling_changed or lbs_changed or lgba_changed or all_cp_changed or tvm_stmt_changed:
+    if not results:
+        print("ℹ️  모든 대상 파일이 manifest 기준 최신 상태입니다 (읽기/쓰기 없음)")
+    elif any(r.changed for r in results):
         print("🎉 MLC-LLM Bool 타입 버그 패치 완료!")
     else:
         print("ℹ️  이미 패치가 적용되어 있거나 변경사항이 없습니다")
+    if not verified:
+        print("⚠️  일부 잔여 bool 사용이 남아있습니다 (위 검증 결과 참고)")
     print("=" * 50)
 
 
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+One executor for every site-packages patch, with dependency ordering and timings.
+
+The patch logic of patch_mlc_bool_bug.py (bool_rules.py steps),
+patch_batch_spec.py, patch_comprehensive.py, patch_attach_sampler.py and
+workflows/patch_mlc_bug.py is registered here as patch units: a name, the
+files it targets (site-packages relative, globs allowed), a text transform,
+and the units it must run after. Units that touch the same file are ordered
+implicitly (registration order); everything else runs concurrently.
+
+Per target file a unit is
+  fresh      skipped by stat: the plan's manifest entry still matches
+  satisfied  read, but its postcondition already holds (transform is a no-op)
+  applied    transformed and written (temp file + rename)
+  failed     postcondition still false after writing, or transform not idempotent
+  missing    file not installed
+
+Overlapping / conflicting units are resolved up front and reported as
+`superseded` instead of being run: batch_spec_verify.py is either rewritten
+by the bool rules (--batch-spec rewrite, default: keeps the real kernel) or
+replaced by the verify stub (--batch-spec stub). The legacy regex variants in
+patch_comprehensive.py and workflows/patch_mlc_bug.py are covered by the bool
+rules, and the attach_sampler call rewrite is unnecessary because the stub
+accepts the vocab_size argument.
+
+Usage:
+    python patch_plan.py [--batch-spec rewrite|stub] [--report plan.json] [--trace plan.trace.json]
+    python patch_plan.py --list
+The trace opens in chrome://tracing or https://ui.perfetto.dev.
+"""
+import argparse
+import glob
+import hashlib
+import importlib.util
+import json
+import os
+import site
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import patch_batch_spec
+import patch_comprehensive
+import precompile_patched
+import site_envs
+from bool_rules import BOOL_RULES, BATCH_SPEC_VERIFY, TOP_P_PIVOT, TVM_SAMPLING, COMPILER_PASSES, TVM_STMT
+from patch_manifest import PatchManifest, file_version
+from tree_patcher import atomic_write_bytes
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKFLOW_PATCHER = os.path.join(SCRIPTS_DIR, os.pardir, 'workflows', 'patch_mlc_bug.py')
+ATTACH_SAMPLER = 'mlc_llm/compiler_pass/attach_sampler.py'
+
+
+class PatchUnit:
+    """A registered patch: transform(text, relpath) -> text over `targets`."""
+
+    __slots__ = ('name', 'source', 'targets', 'transform', 'check', 'after', 'version', 'superseded_by')
+
+    def __init__(self, name, source, targets, transform, version, after=(), check=None, superseded_by=None):
+        self.name = name
+        self.source = source
+        self.targets = (targets,) if isinstance(targets, str) else tuple(targets)
+        self.transform = transform
+        self.check = check  # optional extra postcondition(text) -> bool
+        self.after = tuple(after)
+        self.version = version
+        self.superseded_by = superseded_by
+
+
+def _bool_rewrite(text, relpath):
+    return BOOL_RULES.rewrite(text, relpath).text
+
+
+def _load_workflow_patcher():
+    spec = importlib.util.spec_from_file_location('workflows_patch_mlc_bug', WORKFLOW_PATCHER)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def build_units(batch_spec='rewrite'):
+    """Register every known patch; resolve overlaps for the chosen batch_spec mode."""
+    rules_version = BOOL_RULES.fingerprint()
+    stub_mode = batch_spec == 'stub'
+    stub = lambda text, relpath: patch_batch_spec.BATCH_SPEC_VERIFY_CODE
+    units = [
+        PatchUnit('bool:batch_spec_verify', 'patch_mlc_bool_bug.py', BATCH_SPEC_VERIFY, _bool_rewrite,
+                  rules_version, superseded_by='stub:batch_spec_verify' if stub_mode else None),
+        PatchUnit('bool:top_p_pivot', 'patch_mlc_bool_bug.py', TOP_P_PIVOT, _bool_rewrite, rules_version),
+        PatchUnit('bool:sampling', 'patch_mlc_bool_bug.py', TVM_SAMPLING, _bool_rewrite, rules_version),
+        PatchUnit('bool:compiler_pass', 'patch_mlc_bool_bug.py', COMPILER_PASSES, _bool_rewrite, rules_version),
+        PatchUnit('bool:stmt', 'patch_mlc_bool_bug.py', TVM_STMT, _bool_rewrite, rules_version),
+        PatchUnit('stub:batch_spec_verify', 'patch_batch_spec.py', BATCH_SPEC_VERIFY, stub,
+                  file_version(patch_batch_spec.__file__),
+                  superseded_by=None if stub_mode else 'bool:batch_spec_verify'),
+        PatchUnit('comprehensive:batch_spec_verify', 'patch_comprehensive.py', BATCH_SPEC_VERIFY,
+                  lambda text, relpath: patch_comprehensive.BATCH_SPEC_VERIFY_CODE,
+                  file_version(patch_comprehensive.__file__),
+                  superseded_by='stub:batch_spec_verify' if stub_mode else 'bool:batch_spec_verify'),
+        PatchUnit('comprehensive:top_p_pivot', 'patch_comprehensive.py', TOP_P_PIVOT,
+                  lambda text, relpath: patch_comprehensive.patch_top_p_pivot(text),
+                  file_version(patch_comprehensive.__file__), superseded_by='bool:top_p_pivot'),
+        PatchUnit('attach_sampler:call', 'patch_attach_sampler.py', ATTACH_SAMPLER,
+                  lambda text, relpath: text.replace('batch_spec_verify(vocab_size)', 'batch_spec_verify()'),
+                  file_version(os.path.join(SCRIPTS_DIR, 'patch_attach_sampler.py')),
+                  after=('stub:batch_spec_verify',),
+                  check=lambda text: 'batch_spec_verify(vocab_size)' not in text,
+                  superseded_by=('stub:batch_spec_verify (accepts vocab_size)' if stub_mode
+                                 else 'bool:batch_spec_verify (real kernel takes vocab_size)')),
+        PatchUnit('workflows:batch_spec_verify', 'workflows/patch_mlc_bug.py', BATCH_SPEC_VERIFY,
+                  lambda text, relpath: _load_workflow_patcher().patch_content(text),
+                  file_version(WORKFLOW_PATCHER),
+                  superseded_by='stub:batch_spec_verify' if stub_mode else 'bool:batch_spec_verify'),
+    ]
+    return units
+
+
+def expand(site_pkg, unit):
+    relpaths = []
+    for pattern in unit.targets:
+        if any(c in pattern for c in '*?['):
+            for path in sorted(glob.glob(os.path.join(site_pkg, *pattern.split('/')))):
+                if os.path.isfile(path):
+                    relpaths.append(os.path.relpath(path, site_pkg).replace(os.sep, '/'))
+        else:
+            relpaths.append(pattern)
+    return relpaths
+
+
+def plan_dependencies(units, targets):
+    """unit name -> set of unit names it waits for (declared + shared-target order)."""
+    active = [u for u in units if u.superseded_by is None]
+    names = {u.name for u in active}
+    deps = {u.name: {d for d in u.after if d in names} for u in active}
+    last_writer = {}
+    for u in active:
+        for relpath in targets[u.name]:
+            if relpath in last_writer:
+                deps[u.name].add(last_writer[relpath])
+            last_writer[relpath] = u.name
+    return deps
+
+
+class PlanRun:
+    def __init__(self, site_pkg, units, batch_spec, workers=None):
+        self.site_pkg = site_pkg
+        self.units = units
+        self.workers = workers or min(8, (os.cpu_count() or 1) + 4)
+        self.targets = {u.name: expand(site_pkg, u) for u in units}
+        self.deps = plan_dependencies(units, self.targets)
+        version = hashlib.sha256(repr(sorted((u.name, u.version) for u in units if u.superseded_by is None))
+                                 .encode('utf-8')).hexdigest()[:16]
+        self.manifest = PatchManifest(site_pkg, 'patch_plan', f'{batch_spec}-{version}')
+        self.fresh = {r for rels in self.targets.values() for r in rels if self.manifest.is_fresh(r)}
+        self.origin = {}  # relpath -> bytes before the first unit touched it
+        self.lock = threading.Lock()
+        self.t0 = time.perf_counter()
+        self.thread_ids = {}
+
+    def _tid(self):
+        with self.lock:
+            return self.thread_ids.setdefault(threading.get_ident(), len(self.thread_ids) + 1)
+
+    def _now(self):
+        return time.perf_counter() - self.t0
+
+    def run_unit(self, unit):
+        start, tid = self._now(), self._tid()
+        files = []
+        for relpath in self.targets[unit.name]:
+            f_start = self._now()
+            status, detail = self._apply(unit, relpath)
+            files.append({'relpath': relpath, 'status': status, 'detail': detail,
+                          'start': f_start, 'seconds': self._now() - f_start})
+        return {'name': unit.name, 'source': unit.source, 'status': _unit_status(files),
+                'start': start, 'seconds': self._now() - start, 'tid': tid, 'files': files}
+
+    def _apply(self, unit, relpath):
+        if relpath in self.fresh:
+            return 'fresh', None
+        path = self.manifest.abspath(relpath)
+        try:
+            with open(path, 'rb') as f:
+                before = f.read()
+        except FileNotFoundError:
+            return 'missing', None
+        with self.lock:
+            self.origin.setdefault(relpath, before)
+        text = before.decode('utf-8')
+        after = unit.transform(text, relpath)
+        if after == text and (unit.check is None or unit.check(text)):
+            return 'satisfied', None
+        if after != text:
+            atomic_write_bytes(path, after.encode('utf-8'))
+        if unit.transform(after, relpath) != after:
+            return 'failed', 'transform is not idempotent'
+        if unit.check is not None and not unit.check(after):
+            return 'failed', 'postcondition does not hold after applying'
+        return 'applied', None
+
+    def execute(self):
+        by_name = {u.name: u for u in self.units}
+        remaining = {name: set(d) for name, d in self.deps.items()}
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            running = {}
+            while remaining or running:
+                for name in [n for n, d in remaining.items() if not d]:
+                    del remaining[name]
+                    running[pool.submit(self.run_unit, by_name[name])] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:  # one broken unit must not hide the others
+                        results[name] = {'name': name, 'source': by_name[name].source, 'status': 'error',
+                                         'detail': f'{type(e).__name__}: {e}', 'start': self._now(),
+                                         'seconds': 0.0, 'tid': 0, 'files': []}
+                    for deps in remaining.values():
+                        deps.discard(name)
+        self._record(results)
+        return results
+
+    def _record(self, results):
+        """Manifest entries for files whose every unit ended satisfied/applied."""
+        ok = {}
+        for result in results.values():
+            for f in result['files']:
+                good = f['status'] in ('satisfied', 'applied') and result['status'] != 'error'
+                ok[f['relpath']] = ok.get(f['relpath'], True) and good
+        for relpath, good in ok.items():
+            if good and relpath in self.origin:
+                with open(self.manifest.abspath(relpath), 'rb') as f:
+                    self.manifest.record(relpath, self.origin[relpath], f.read())
+        self.manifest.save()
+
+
+def _unit_status(files):
+    statuses = {f['status'] for f in files}
+    for status in ('failed', 'applied', 'satisfied', 'fresh'):
+        if status in statuses:
+            return status
+    return 'missing'
+
+
+def build_report(run, results, batch_spec, total):
+    units = []
+    for unit in run.units:
+        if unit.superseded_by is not None:
+            units.append({'name': unit.name, 'source': unit.source, 'status': 'superseded',
+                          'superseded_by': unit.superseded_by, 'targets': run.targets[unit.name]})
+        else:
+            entry = dict(results[unit.name])
+            entry['after'] = sorted(run.deps[unit.name])
+            units.append(entry)
+    return {'site_packages': run.site_pkg, 'batch_spec': batch_spec, 'seconds': total,
+            'workers': run.workers, 'units': units}
+
+
+def chrome_trace(report):
+    events = [{'name': 'process_name', 'ph': 'M', 'pid': 1, 'args': {'name': 'patch_plan'}}]
+    for unit in report['units']:
+        if unit['status'] == 'superseded':
+            continue
+        events.append({'name': unit['name'], 'cat': 'unit', 'ph': 'X', 'pid': 1, 'tid': unit['tid'],
+                       'ts': unit['start'] * 1e6, 'dur': unit['seconds'] * 1e6,
+                       'args': {'status': unit['status'], 'source': unit['source'], 'after': unit['after']}})
+        for f in unit['files']:
+            events.append({'name': f['relpath'], 'cat': 'file', 'ph': 'X', 'pid': 1, 'tid': unit['tid'],
+                           'ts': f['start'] * 1e6, 'dur': f['seconds'] * 1e6, 'args': {'status': f['status']}})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def find_site_pkg():
+    for sp in site.getsitepackages():
+        if os.path.isdir(os.path.join(sp, 'mlc_llm')):
+            return sp
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run all site-packages patches as one dependency-ordered plan')
+    parser.add_argument('--site-packages', default=None)
+    parser.add_argument('--batch-spec', choices=['rewrite', 'stub'], default='rewrite',
+                        help='rewrite batch_spec_verify.py with the bool rules, or replace it with the stub')
+    parser.add_argument('--report', default=None, help='write the JSON report here')
+    parser.add_argument('--trace', default=None, help='write a Chrome trace here')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--no-precompile', action='store_true')
+    parser.add_argument('--list', action='store_true', help='show the units and their ordering, then exit')
+    args = parser.parse_args()
+
+    site_pkg = args.site_packages or find_site_pkg()
+    if site_pkg is None:
+        print("❌ mlc_llm not found in any site-packages")
+        return 1
+    units = build_units(args.batch_spec)
+    start = time.perf_counter()
+    run = PlanRun(site_pkg, units, args.batch_spec, args.workers)
+
+    if args.list:
+        for unit in units:
+            if unit.superseded_by:
+                print(f"  ⏭️  {unit.name:<32} superseded by {unit.superseded_by}")
+            else:
+                after = ', '.join(sorted(run.deps[unit.name])) or '-'
+                print(f"  ▶️  {unit.name:<32} {len(run.targets[unit.name])} files, after: {after}")
+        return 0
+
+    with site_envs.env_lock(site_pkg):
+        # reload under the lock: another process may have patched in the meantime
+        run = PlanRun(site_pkg, units, args.batch_spec, args.workers)
+        results = run.execute()
+    report = build_report(run, results, args.batch_spec, time.perf_counter() - start)
+
+    print(f"=== PATCH PLAN ({args.batch_spec}) : {site_pkg} ===")
+    icons = {'applied': '✅', 'satisfied': '✔️ ', 'fresh': '⏭️ ', 'missing': '⚠️ ', 'failed': '❌', 'error': '❌',
+             'superseded': '➖'}
+    for unit in report['units']:
+        if unit['status'] == 'superseded':
+            print(f"  {icons['superseded']} {unit['name']:<32} superseded by {unit['superseded_by']}")
+            continue
+        counts = {}
+        for f in unit['files']:
+            counts[f['status']] = counts.get(f['status'], 0) + 1
+        detail = ', '.join(f"{k} {v}" for k, v in sorted(counts.items())) or unit.get('detail', '')
+        print(f"  {icons[unit['status']]} {unit['name']:<32} {unit['seconds'] * 1000:8.1f}ms  {detail}")
+        for f in unit['files']:
+            if f['status'] == 'failed':
+                print(f"       ❌ {f['relpath']}: {f['detail']}")
+    print(f"⏱️  total {report['seconds'] * 1000:.1f}ms with {run.workers} workers")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📊 report: {args.report}")
+    if args.trace:
+        with open(args.trace, 'w') as f:
+            json.dump(chrome_trace(report), f)
+        print(f"📊 trace: {args.trace}")
+
+    written = sorted({run.manifest.abspath(f['relpath']) for u in report['units'] if u['status'] != 'superseded'
+                      for f in u['files'] if f['status'] == 'applied'})
+    if written and not args.no_precompile:
+        precompile_patched.run(written, measure=False, workers=args.workers)
+    return 1 if any(u['status'] in ('failed', 'error') for u in report['units']) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Post-patch stage: byte-compile the modules a patch touched.
+
+After patch_mlc_bool_bug.py rewrites e.g. batch_spec_verify.py or
+tvm/tir/stmt.py, their `__pycache__` entries are stale, and the first
+`mlc_llm compile` pays for re-compiling them (a read-only or shared
+environment pays on every run because the fresh .pyc can never be written).
+This stage compiles them up front, checks that every .pyc is fresh for its
+source, and reports cold-import time of `mlc_llm.compiler_pass` and `tvm.tir`
+before and after.
+
+Usage:
+    python precompile_patched.py [--site-packages DIR] [FILE ...]
+Without FILE arguments, every file recorded in the patch manifest is compiled.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import py_compile
+import site
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from patch_manifest import MANIFEST_NAME
+
+IMPORT_PROBES = ('mlc_llm.compiler_pass', 'tvm.tir')
+
+
+def pyc_is_fresh(source):
+    """True when the .pyc next to `source` matches its current mtime and size."""
+    cached = importlib.util.cache_from_source(source)
+    try:
+        st = os.stat(source)
+        with open(cached, 'rb') as f:
+            header = f.read(16)
+    except OSError:
+        return False
+    if len(header) < 16 or header[:4] != importlib.util.MAGIC_NUMBER:
+        return False
+    flags = int.from_bytes(header[4:8], 'little')
+    if flags & 0b1:
+        # hash-based pyc: validity depends on the source hash, not the mtime
+        with open(source, 'rb') as f:
+            return header[8:16] == importlib.util.source_hash(f.read())
+    mtime = int.from_bytes(header[8:12], 'little')
+    size = int.from_bytes(header[12:16], 'little')
+    return mtime == (int(st.st_mtime) & 0xFFFFFFFF) and size == (st.st_size & 0xFFFFFFFF)
+
+
+def _compile_one(source):
+    start = time.perf_counter()
+    try:
+        py_compile.compile(source, doraise=True)
+        error = None
+    except (py_compile.PyCompileError, OSError) as e:
+        error = str(e)
+    return source, error, time.perf_counter() - start
+
+
+def precompile(sources, workers=None):
+    """Compile `sources` on a thread pool. Returns {source: error-or-None}.
+
+    Compilation holds the GIL, so the threads only overlap the source reads
+    and .pyc writes; the compile work itself is effectively sequential. A
+    patch touches a handful of modules, which compile in milliseconds, so
+    worker processes would not pay back their start-up cost.
+    """
+    sources = [s for s in sources if s.endswith('.py')]
+    if not sources:
+        return {}
+    workers = workers or min(32, (os.cpu_count() or 1) + 4, len(sources))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return {src: err for src, err, _ in pool.map(_compile_one, sources)}
+
+
+def precompile_with(python, sources):
+    """Compile `sources` with another interpreter (its own .pyc magic/tag).
+
+    Falls back to in-process compilation when `python` is unknown or is the
+    running interpreter. Returns an error string or None.
+    """
+    if not python or os.path.realpath(python) == os.path.realpath(sys.executable):
+        errors = precompile(sources)
+        failed = [f"{src}: {err}" for src, err in errors.items() if err]
+        return '; '.join(failed) or None
+    try:
+        proc = subprocess.run([python, '-m', 'py_compile', *sources], capture_output=True, text=True, timeout=600)
+    except (OSError, subprocess.SubprocessError) as e:
+        return str(e)
+    if proc.returncode:
+        return proc.stderr.strip() or f'exit status {proc.returncode}'
+    return None
+
+
+def manifest_sources(site_pkg):
+    """Every file recorded by any patcher in the site-packages manifest."""
+    try:
+        with open(os.path.join(site_pkg, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return []
+    relpaths = set()
+    for section in data.get('patchers', {}).values():
+        relpaths.update(section.get('files', {}))
+    return [os.path.join(site_pkg, *r.split('/')) for r in sorted(relpaths)]
+
+
+def cold_import_time(modules=IMPORT_PROBES):
+    """Import `modules` in a fresh interpreter that may read but not write .pyc.
+
+    Writing is disabled so a stale .pyc is paid for on every measurement,
+    like it is in a read-only environment. Returns {module: seconds or None}.
+    """
+    code = (
+        'import importlib, json, time\n'
+        'out = {}\n'
+        f'for m in {list(modules)!r}:\n'
+        '    t = time.perf_counter()\n'
+        '    try:\n'
+        '        importlib.import_module(m)\n'
+        '        out[m] = time.perf_counter() - t\n'
+        '    except Exception:\n'
+        '        out[m] = None\n'
+        'print(json.dumps(out))\n'
+    )
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    try:
+        proc = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env, timeout=600)
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+    except (subprocess.SubprocessError, ValueError, IndexError):
+        return {m: None for m in modules}
+
+
+def _fmt(seconds):
+    return 'import failed' if seconds is None else f'{seconds * 1000:.1f}ms'
+
+
+def run(sources, measure=True, workers=None):
+    """Compile `sources`, verify freshness and print a before/after report.
+
+    Returns True when every .pyc is fresh afterwards.
+    """
+    sources = [s for s in sources if s.endswith('.py') and os.path.exists(s)]
+    stale = [s for s in sources if not pyc_is_fresh(s)]
+    print(f"  🧱 바이트코드 사전 컴파일: 대상 {len(sources)}개, 오래된 .pyc {len(stale)}개")
+    if not stale:
+        print("  ✅ 모든 .pyc가 최신 상태입니다")
+        return True
+
+    before = cold_import_time() if measure else None
+    start = time.perf_counter()
+    errors = precompile(stale, workers)
+    elapsed = time.perf_counter() - start
+    still_stale = [s for s in stale if not errors.get(s) and not pyc_is_fresh(s)]
+    after = cold_import_time() if measure else None
+
+    print(f"  ⏱️  {len(stale)}개 모듈 컴파일: {elapsed * 1000:.1f}ms")
+    for src, err in errors.items():
+        if err:
+            print(f"  ❌ 컴파일 실패 {src}: {err}")
+    for src in still_stale:
+        print(f"  ⚠️  .pyc가 최신이 아님 (쓰기 권한 확인): {src}")
+    if measure:
+        for m in IMPORT_PROBES:
+            print(f"  📊 cold import {m}: {_fmt(before.get(m))} → {_fmt(after.get(m))}")
+    return not still_stale and not any(errors.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Byte-compile patched mlc_llm/tvm modules')
+    parser.add_argument('files', nargs='*', help='sources to compile (default: files in the patch manifest)')
+    parser.add_argument('--site-packages', default=None)
+    parser.add_argument('--no-measure', action='store_true', help='skip the cold-import timing')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    sources = [os.path.abspath(f) for f in args.files]
+    if not sources:
+        site_pkg = args.site_packages
+        if site_pkg is None:
+            site_pkg = next((sp for sp in site.getsitepackages()
+                             if os.path.isdir(os.path.join(sp, 'mlc_llm'))), site.getsitepackages()[0])
+        sources = manifest_sources(site_pkg)
+    ok = run(sources, measure=not args.no_measure, workers=args.workers)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
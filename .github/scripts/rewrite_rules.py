@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Declarative single-pass rewrite engine shared by the patch scripts.
+
+A patch is a table of `Rule` entries (pattern, replacement, scope, expected
+hit count). For each file, every rule whose scope matches the file's path
+(relative to site-packages) is compiled into one alternation, so the file is
+rewritten in a single `re.sub` pass while per-rule hit counts are collected.
+
+Rules without a replacement are *probes*: they only count what they match and
+leave the text untouched. Because alternatives are tried left to right at each
+position, a probe listed after the rewrite rules only sees text the rewrites
+did not consume, i.e. what will remain in the output (leftover "bool"
+literals, `T.Not(` calls, ...). Verification therefore comes straight from
+the counts of the same pass instead of re-reading the file.
+
+Pattern restrictions: numbered backreferences inside a pattern are not
+supported (groups are renumbered in the combined matcher); use them freely in
+the replacement template, which is expanded against the rule's own regex.
+"""
+import fnmatch
+import hashlib
+import re
+
+# Flags that can be scoped to a single alternative with `(?flags:...)`.
+_SCOPED_FLAGS = ((re.IGNORECASE, 'i'), (re.MULTILINE, 'm'), (re.DOTALL, 's'), (re.VERBOSE, 'x'))
+
+
+class Rule:
+    """One rewrite (or probe) entry of a rule table.
+
+    name    - short identifier used in reports
+    pattern - regular expression source
+    repl    - replacement template (str, `\\1` style), callable(match) -> str,
+              or None for a probe
+    scope   - glob (or tuple of globs) matched against the file path relative
+              to site-packages, using '/' separators
+    expect  - expected hit count on an unpatched file (probes: expected
+              residual count, normally 0); None means "any"
+    """
+
+    __slots__ = ('name', 'pattern', 'repl', 'scope', 'expect', 'flags', 'regex')
+
+    def __init__(self, name, pattern, repl=None, scope='*', expect=None, flags=0):
+        self.name = name
+        self.pattern = pattern
+        self.repl = repl
+        self.scope = (scope,) if isinstance(scope, str) else tuple(scope)
+        self.expect = expect
+        self.flags = flags
+        self.regex = re.compile(pattern, flags)
+
+    @property
+    def is_probe(self):
+        return self.repl is None
+
+    def applies_to(self, relpath):
+        return any(fnmatch.fnmatchcase(relpath, s) for s in self.scope)
+
+    def alternative(self, index):
+        letters = ''.join(ch for flag, ch in _SCOPED_FLAGS if self.flags & flag)
+        body = f'(?{letters}:{self.pattern})' if letters else self.pattern
+        return f'(?P<_r{index}>{body})'
+
+
+class RewriteResult:
+    """Outcome of one rewrite pass over a file."""
+
+    def __init__(self, relpath, rules, text, original, hits, probe_lines):
+        self.relpath = relpath
+        self.rules = rules
+        self.text = text
+        self.original = original
+        self.hits = hits
+        self.probe_lines = probe_lines
+
+    @property
+    def changed(self):
+        return self.text != self.original
+
+    def rule_status(self, rule):
+        """'ok', 'applied' (rewrite found nothing: already patched) or 'mismatch'."""
+        hits = self.hits[rule.name]
+        if rule.expect is None or hits == rule.expect:
+            return 'ok'
+        if not rule.is_probe and hits == 0:
+            return 'applied'
+        return 'mismatch'
+
+    @property
+    def verified(self):
+        """True when every probe matched its expected residual count."""
+        return all(self.rule_status(r) == 'ok' for r in self.rules if r.is_probe)
+
+
+class RuleSet:
+    """A rule table plus a cache of combined matchers keyed by scope selection."""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        names = [r.name for r in self.rules]
+        if len(set(names)) != len(names):
+            raise ValueError('rule names must be unique')
+        self._compiled = {}
+
+    def fingerprint(self):
+        """Stable hash of the table; changes whenever a rule is added or edited."""
+        h = hashlib.sha256()
+        for r in self.rules:
+            if callable(r.repl):
+                code = r.repl.__code__
+                repl = f'{r.repl.__qualname__}:{code.co_code.hex()}:{code.co_consts!r}'
+            else:
+                repl = repr(r.repl)
+            h.update(repr((r.name, r.pattern, repl, r.scope, r.expect, r.flags)).encode('utf-8'))
+        return h.hexdigest()[:16]
+
+    def rules_for(self, relpath):
+        return [r for r in self.rules if r.applies_to(relpath)]
+
+    def scopes(self):
+        """All distinct scope globs, in table order."""
+        seen = []
+        for r in self.rules:
+            for s in r.scope:
+                if s not in seen:
+                    seen.append(s)
+        return seen
+
+    def _matcher(self, rules):
+        key = tuple(r.name for r in rules)
+        matcher = self._compiled.get(key)
+        if matcher is None:
+            matcher = re.compile('|'.join(r.alternative(i) for i, r in enumerate(rules)))
+            self._compiled[key] = matcher
+        return matcher
+
+    def rewrite(self, text, relpath):
+        """Rewrite `text` (the content of `relpath`) in a single pass."""
+        rules = self.rules_for(relpath)
+        hits = {r.name: 0 for r in rules}
+        probe_lines = {r.name: [] for r in rules if r.is_probe}
+        if not rules:
+            return RewriteResult(relpath, rules, text, text, hits, probe_lines)
+
+        # Line numbers for probe hits are tracked incrementally so the pass
+        # stays linear in the file size.
+        cursor = {'pos': 0, 'line': 1}
+
+        def line_of(pos):
+            cursor['line'] += text.count('\n', cursor['pos'], pos)
+            cursor['pos'] = pos
+            return cursor['line']
+
+        def dispatch(m):
+            rule = rules[int(m.lastgroup[2:])]
+            hits[rule.name] += 1
+            if rule.is_probe:
+                lineno = line_of(m.start())
+                start = text.rfind('\n', 0, m.start()) + 1
+                end = text.find('\n', m.start())
+                probe_lines[rule.name].append((lineno, text[start:end if end != -1 else len(text)].strip()))
+                return m.group(0)
+            # Re-match with the rule's own regex so its groups keep their numbers.
+            own = rule.regex.match(text, m.start())
+            if callable(rule.repl):
+                return rule.repl(own)
+            return own.expand(rule.repl)
+
+        new_text = self._matcher(rules).sub(dispatch, text)
+        return RewriteResult(relpath, rules, new_text, text, hits, probe_lines)
@@ -1,93 +1,327 @@
 #!/usr/bin/env python3
 """
-Run a robust syntax-only check for json_ffi_engine.cc using build/compile_commands.json
+Run robust syntax-only checks for translation units in build/compile_commands.json.
+
+By default only json_ffi_engine.cc is checked (as before). Other units can be
+selected by name (FILE ...), by glob (--glob 'cpp/serve/*.cc'), from a list of
+changed files (--changed-list tmp_patched_jsonffi/patched_targets.txt), or with
+--all. Entries are fetched through the compile-database index
+(compdb_index.py) rather than by parsing the whole JSON. Units are checked
+with each entry's exact command, with -c replaced by -fsyntax-only and
+output/dependency-file flags dropped. The checks run on a worker pool bounded
+by the CPU count.
+
+Results are cached (~/.cache/mlc_syntax_check, or MLC_SYNTAX_CACHE), in the
+same two levels ccache uses:
+  - direct: hash of the argument list and the source file. A hit also needs
+    every header recorded for it to be unchanged (size/mtime, then sha256).
+    No compiler runs at all.
+  - preprocessed: hash of the argument list and the `-E` output. It catches
+    units whose files were touched or rewritten without a real change.
+Failures are cached as well as passes, since both are deterministic.
+
 Writes diagnostics to ${GITHUB_WORKSPACE:-$PWD}/tmp_ci_diagnostics/outputs/json_ffi_syntax_check.txt
-Exits 0 always (non-fatal); writes rc and output to the diagnostics file.
+(plus json_ffi_syntax_rc.txt for json_ffi_engine.cc and syntax_check.json).
+Exits 0 (non-fatal) unless --gate is given, in which case it exits 3 when a
+selected unit has compiler diagnostics (rc > 0 from the syntax-only run). The
+workflow skips the full mlc_llm_static build on exactly that code; a unit
+that could not be checked (rc -1) or a crash of this script is not a reason
+to skip it.
+
+Usage:
+    python run_compile_syntax_check.py [FILE ...] [--glob PATTERN] [--changed-list FILE] [--all]
+                                       [--compdb build/compile_commands.json] [--gate] [--no-cache]
 """
+import argparse
+import fnmatch
+import hashlib
 import json
+import os
+import re
 import shlex
 import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-REPO_ROOT = Path(__file__).resolve().parents[2]
-OUT = REPO_ROOT / 'tmp_ci_diagnostics' / 'outputs' / 'json_ffi_syntax_check.txt'
-OUT.parent.mkdir(parents=True, exist_ok=True)
+from compdb_index import CompDB
+from tree_patcher import atomic_write_bytes
+
+OUT_DIR = Path(os.environ.get('GITHUB_WORKSPACE') or os.getcwd()) / 'tmp_ci_diagnostics' / 'outputs'
+OUT = OUT_DIR / 'json_ffi_syntax_check.txt'
+JSONFFI_SUFFIX = 'cpp/json_ffi/json_ffi_engine.cc'
+CACHE_FORMAT = 1
+GATE_RC = 3
+# flags whose effect is only an output file; dropped (with their argument) from checks
+DROP_WITH_ARG = {'-o', '-MF', '-MT', '-MQ'}
+DROP_FLAGS = {'-MD', '-MMD', '-M', '-MM', '-MP'}
+LINE_MARKER = re.compile(rb'^# \d+ "((?:[^"\\]|\\.)*)"', re.M)
+
 
 def write(msg: str):
     with open(OUT, 'a') as f:
         f.write(msg + "\n")
     print(msg)
 
-cc = Path('build') / 'compile_commands.json'
-if not cc.exists():
-    write(f"compile_commands.json not found at {cc}; skipping exact syntax check")
-    raise SystemExit(0)
 
-with open(cc, 'r') as f:
+def default_cache():
+    return os.environ.get('MLC_SYNTAX_CACHE') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'mlc_syntax_check')
+
+
+def as_unit(entry, db_dir):
+    """compile_commands entry -> {'file' (absolute), 'directory', 'args'}."""
+    directory = entry.get('directory') or db_dir
+    cmd = entry.get('command')
+    args = shlex.split(cmd) if cmd else list(entry.get('arguments', []))
+    fn = entry.get('file', '')
+    return {'file': os.path.normpath(os.path.join(directory, fn)), 'directory': directory, 'args': args}
+
+
+def syntax_args(args):
+    """Compile command -> syntax-only command (no outputs, no dependency files)."""
+    out_args = []
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a == '-c':
+            out_args.append('-fsyntax-only')
+            i += 1
+            continue
+        if a.startswith('-c') and len(a) > 2:
+            # like -csource.c
+            out_args.extend(['-fsyntax-only', a[2:]])
+            i += 1
+            continue
+        if a in DROP_WITH_ARG and i + 1 < len(args):
+            i += 2
+            continue
+        if a in DROP_FLAGS or (a.startswith('-o') and len(a) > 2) or a.startswith(('-MF', '-MT', '-MQ')):
+            i += 1
+            continue
+        out_args.append(a)
+        i += 1
+    # ensure we specify syntax-only if not already
+    if '-fsyntax-only' not in out_args:
+        out_args.insert(1, '-fsyntax-only')
+    return out_args
+
+
+def select(db, names=(), globs=(), changed=(), all_units=False):
+    """Units to check, fetched through the compdb index; default is json_ffi_engine.cc only."""
+    if all_units:
+        entries = db.entries_for(db.files())
+    elif not names and not globs and not changed:
+        entries = db.find_suffix(JSONFFI_SUFFIX)
+    else:
+        entries = []
+        for n in names:
+            entries.extend(db.lookup(n) if os.path.isabs(n) else db.find_suffix(n))
+        if globs:
+            entries.extend(db.entries_for(
+                f for f in db.files() if any(fnmatch.fnmatch(f, g) or fnmatch.fnmatch(f, '*/' + g) for g in globs)))
+        for c in changed:
+            entries.extend(db.lookup(c) or db.lookup(os.path.realpath(c)))
+    db_dir = os.path.dirname(db.db_path)
+    units, seen = [], set()
+    for e in entries:
+        unit = as_unit(e, db_dir)
+        key = (unit['file'], tuple(unit['args']))
+        if key not in seen:
+            seen.add(key)
+            units.append(unit)
+    return units
+
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _key(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else json.dumps(part).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+class SyntaxCache:
+    """Two-level (direct / preprocessed) result cache on disk."""
+
+    def __init__(self, root=None, enabled=True):
+        self.root = root or default_cache()
+        self.enabled = enabled
+
+    def _path(self, kind, key):
+        return os.path.join(self.root, kind, key[:2], key + '.json')
+
+    def get(self, kind, key):
+        if not self.enabled:
+            return None
+        try:
+            with open(self._path(kind, key), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if data.get('format') == CACHE_FORMAT else None
+        except (OSError, ValueError):
+            return None
+
+    def put(self, kind, key, data):
+        if not self.enabled:
+            return
+        try:
+            atomic_write_bytes(self._path(kind, key), json.dumps(dict(data, format=CACHE_FORMAT)).encode('utf-8'))
+        except OSError:
+            pass  # read-only cache: still correct, just slower
+
+
+def headers_unchanged(headers):
+    """True if every {path: [size, mtime_ns, sha256]} still matches."""
+    for path, (size, mtime_ns, sha) in headers.items():
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        if st.st_size != size:
+            return False
+        if st.st_mtime_ns != mtime_ns and sha256_file(path) != sha:
+            return False
+    return True
+
+
+def included_files(preprocessed, directory, source):
+    """Headers named in the line markers of `-E` output, with their current stat/hash."""
+    headers = {}
+    for m in LINE_MARKER.finditer(preprocessed):
+        name = m.group(1).decode('utf-8', 'replace').replace('\\\\', '\\')
+        if name.startswith('<') or not name:
+            continue  # <built-in>, <command line>
+        path = os.path.normpath(os.path.join(directory, name))
+        if path in headers or path == source:
+            continue
+        try:
+            st = os.stat(path)
+            headers[path] = [st.st_size, st.st_mtime_ns, sha256_file(path)]
+        except OSError:
+            continue
+    return headers
+
+
+def check_unit(entry, cache):
+    """{'file', 'rc', 'output', 'cached', 'seconds', 'command'} for one translation unit."""
+    start = time.perf_counter()
+    args = syntax_args(entry['args'])
+    result = {'file': entry['file'], 'command': ' '.join(shlex.quote(a) for a in args)}
+    try:
+        src_sha = sha256_file(entry['file'])
+    except OSError as e:
+        return dict(result, rc=-1, output=f'cannot read source: {e}', cached=None,
+                    seconds=time.perf_counter() - start)
+
+    direct_key = _key(args, entry['directory'], src_sha)
+    hit = cache.get('direct', direct_key)
+    if hit and headers_unchanged(hit['headers']):
+        return dict(result, rc=hit['rc'], output=hit['output'], cached='direct',
+                    seconds=time.perf_counter() - start)
+
+    pre_args = ['-E' if a == '-fsyntax-only' else a for a in args]
     try:
-        cmds = json.load(f)
+        pre = subprocess.run(pre_args, cwd=entry['directory'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        return dict(result, rc=-1, output=f'syntax check execution failed: {e}', cached=None,
+                    seconds=time.perf_counter() - start)
+    if pre.returncode != 0:
+        # a missing header etc.: the preprocessor diagnostics are the result
+        output = pre.stderr.decode('utf-8', 'replace')
+        return dict(result, rc=pre.returncode, output=output, cached=None, seconds=time.perf_counter() - start)
+
+    pre_key = _key(args, pre.stdout)
+    headers = included_files(pre.stdout, entry['directory'], entry['file'])
+    hit = cache.get('preprocessed', pre_key)
+    if hit:
+        cached = 'preprocessed'
+        rc, output = hit['rc'], hit['output']
+    else:
+        cached = None
+        proc = subprocess.run(args, cwd=entry['directory'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        rc, output = proc.returncode, proc.stdout.decode('utf-8', 'replace')
+        cache.put('preprocessed', pre_key, {'rc': rc, 'output': output})
+    cache.put('direct', direct_key, {'rc': rc, 'output': output, 'headers': headers})
+    return dict(result, rc=rc, output=output, cached=cached, seconds=time.perf_counter() - start)
+
+
+def run_checks(entries, cache, workers=None):
+    workers = max(1, min(workers or os.cpu_count() or 1, len(entries) or 1))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda e: check_unit(e, cache), entries))
+
+
+def read_changed_list(path):
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as fh:
+            return [l.strip() for l in fh if l.strip()]
+    except OSError:
+        return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel, cached -fsyntax-only checks over compile_commands.json')
+    parser.add_argument('files', nargs='*', help='translation units to check (path suffixes)')
+    parser.add_argument('--compdb', default=str(Path('build') / 'compile_commands.json'))
+    parser.add_argument('--glob', action='append', default=[], help='fnmatch pattern on the unit path (repeatable)')
+    parser.add_argument('--changed-list', default=None, help='file listing changed sources, one per line')
+    parser.add_argument('--all', action='store_true', help='check every unit in the database')
+    parser.add_argument('--workers', type=int, default=None, help='default: CPU count')
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--cache', default=None, help='cache directory (default ~/.cache/mlc_syntax_check)')
+    parser.add_argument('--gate', action='store_true',
+                        help=f'exit {GATE_RC} if any selected unit has compiler diagnostics')
+    args = parser.parse_args()
+
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    cc = Path(args.compdb)
+    if not cc.exists():
+        write(f"compile_commands.json not found at {cc}; skipping exact syntax check")
+        return 0
+    changed = read_changed_list(args.changed_list) if args.changed_list else []
+    try:
+        with CompDB(cc) as db:
+            units = select(db, args.files, args.glob, changed, args.all)
     except Exception as e:
         write(f"Failed to load compile_commands.json: {e}")
-        raise SystemExit(0)
-
-found = False
-for entry in cmds:
-    fn = entry.get('file','')
-    if fn.endswith('cpp/json_ffi/json_ffi_engine.cc') or fn.endswith('cpp\\json_ffi\\json_ffi_engine.cc'):
-        found = True
-        # Prefer arguments if available
-        cmd = entry.get('command')
-        if cmd:
-            args = shlex.split(cmd)
-        else:
-            args = entry.get('arguments', [])
-        # Transform args: replace -c SOURCE or -c and source with -fsyntax-only -x c++ SOURCE
-        out_args = []
-        i = 0
-        while i < len(args):
-            a = args[i]
-            if a == '-c' and i+1 < len(args):
-                # skip '-c' and keep source but change flags
-                src = args[i+1]
-                out_args.extend(['-fsyntax-only','-x','c++', src])
-                i += 2
-                continue
-            if a.startswith('-c') and len(a) > 2:
-                # like -csource.c
-                src = a[2:]
-                out_args.extend(['-fsyntax-only','-x','c++', src])
-                i += 1
-                continue
-            if a == '-o' and i+1 < len(args):
-                # drop output file
-                i += 2
-                continue
-            # drop any -ooutput form
-            if a.startswith('-o') and len(a) > 2:
-                i += 1
-                continue
-            out_args.append(a)
-            i += 1
-        # ensure we specify language and syntax-only if not already
-        if '-fsyntax-only' not in out_args:
-            out_args.insert(0, '-fsyntax-only')
-            out_args.insert(1, '-x')
-            out_args.insert(2, 'c++')
-        write(f"Running syntax check command: {' '.join(shlex.quote(x) for x in out_args)}")
-        try:
-            proc = subprocess.run(out_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-            write("--- syntax-check output start ---")
-            for line in proc.stdout.splitlines():
-                write(line)
-            write(f"syntax-check rc: {proc.returncode}")
-            with open(REPO_ROOT / 'tmp_ci_diagnostics' / 'outputs' / 'json_ffi_syntax_rc.txt', 'w') as fh:
-                fh.write(str(proc.returncode))
+        return 0
+    if not units:
+        write("No matching compile_commands entries found; skipping exact syntax check")
+        return 0
+
+    start = time.perf_counter()
+    results = run_checks(units, SyntaxCache(args.cache, not args.no_cache), args.workers)
+    failed = [r for r in results if r['rc'] != 0]
+    # rc -1: the unit could not be checked at all, which says nothing about the source
+    diagnosed = [r for r in failed if r['rc'] > 0]
+    for r in results:
+        origin = f" (cached: {r['cached']})" if r['cached'] else ''
+        write(f"Running syntax check command: {r['command']}")
+        write("--- syntax-check output start ---")
+        for line in r['output'].splitlines():
+            write(line)
+        write(f"syntax-check rc: {r['rc']}{origin} [{r['seconds']:.2f}s] {r['file']}")
+        if r['file'].replace('\\', '/').endswith(JSONFFI_SUFFIX):
             # Don't fail the job; caller will inspect json_ffi_syntax_rc.txt or logs
-        except Exception as e:
-            write(f"syntax check execution failed: {e}")
-        break
+            with open(OUT_DIR / 'json_ffi_syntax_rc.txt', 'w') as fh:
+                fh.write(str(r['rc']))
+    hits = sum(1 for r in results if r['cached'])
+    write(f"syntax-check summary: {len(results)} units, {len(failed)} failed, {hits} cached, "
+          f"{time.perf_counter() - start:.2f}s")
+    with open(OUT_DIR / 'syntax_check.json', 'w') as fh:
+        json.dump({'units': len(results), 'failed': [r['file'] for r in failed],
+                   'results': [{k: r[k] for k in ('file', 'rc', 'cached', 'seconds')} for r in results]}, fh, indent=2)
+    return GATE_RC if args.gate and diagnosed else 0
 
-if not found:
-    write("No compile_commands entry for json_ffi_engine.cc found; skipping exact syntax check")
 
-raise SystemExit(0)
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 import importlib, pkgutil, site, os
+
+from jsonffi_locator import find_files
 try:
     m = importlib.import_module('mlc_llm')
     print('installed mlc_llm file:', getattr(m, '__file__', 'unknown'))
@@ -11,10 +13,9 @@ try:
                 break
             print('  ', entry)
         # show json_ffi sources if present
-        for r, d, files in os.walk(root):
-            for f in files:
-                if 'json_ffi' in r and f.endswith('.cc'):
-                    print('Found json_ffi file:', os.path.join(r, f))
+        for f in find_files(suffixes=('.cc',), roots=[root]):
+            if 'json_ffi' in os.path.dirname(f):
+                print('Found json_ffi file:', f)
 except Exception as e:
     print('mlc_llm import failed after pip install:', e)
 
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Discover every interpreter / site-packages pair with mlc_llm installed, and
+serialize patching of each one with a per-environment lock.
+
+Matrix jobs on one host share conda envs and venvs, so two patch runs can hit
+the same site-packages at once. `env_lock` takes an exclusive flock on
+`<site-packages>/.mlc_patch.lock` for the duration of a patch run; runs on
+different environments proceed in parallel (`run_concurrently`).
+
+Discovery looks at the running interpreter (like find_site_pkg_paths in
+patch_jsonffi_repl_fixed.py), $CONDA_PREFIX, every conda env listed in
+~/.conda/environments.txt or under <conda root>/envs, $VIRTUAL_ENV, and every
+python3 on $PATH. Environments are found by their lib/python3.*/site-packages
+layout, so no interpreter is started.
+
+Usage:
+    python site_envs.py [--json]      # list discovered environments
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import site
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, run unlocked
+    fcntl = None
+
+LOCK_NAME = '.mlc_patch.lock'
+
+
+class SiteEnv:
+    """One site-packages directory and the interpreter that owns it (if known)."""
+
+    __slots__ = ('site_pkg', 'python', 'version')
+
+    def __init__(self, site_pkg, python=None, version=None):
+        self.site_pkg = os.path.abspath(site_pkg)
+        self.python = python
+        self.version = version
+
+    def has_mlc_llm(self):
+        return os.path.isdir(os.path.join(self.site_pkg, 'mlc_llm'))
+
+    def as_dict(self):
+        return {'site_packages': self.site_pkg, 'python': self.python, 'version': self.version}
+
+
+def _prefix_envs(prefix):
+    """SiteEnvs for a prefix with the usual lib/pythonX.Y/site-packages layout."""
+    envs = []
+    for sp in sorted(glob.glob(os.path.join(prefix, 'lib', 'python3.*', 'site-packages'))):
+        version = os.path.basename(os.path.dirname(sp))[len('python'):]
+        python = None
+        for name in (f'python{version}', 'python3', 'python'):
+            candidate = os.path.join(prefix, 'bin', name)
+            if os.access(candidate, os.X_OK):
+                python = candidate
+                break
+        envs.append(SiteEnv(sp, python, version))
+    return envs
+
+
+def _conda_prefixes():
+    prefixes = []
+    for var in ('CONDA_PREFIX', 'VIRTUAL_ENV'):
+        if os.environ.get(var):
+            prefixes.append(os.environ[var])
+    try:
+        with open(os.path.expanduser('~/.conda/environments.txt'), 'r') as f:
+            prefixes.extend(line.strip() for line in f if line.strip())
+    except OSError:
+        pass
+    roots = [os.environ.get('CONDA_ROOT'), os.environ.get('MAMBA_ROOT_PREFIX')]
+    if os.environ.get('CONDA_EXE'):
+        roots.append(os.path.dirname(os.path.dirname(os.environ['CONDA_EXE'])))
+    for root in filter(None, roots):
+        prefixes.append(root)
+        prefixes.extend(sorted(glob.glob(os.path.join(root, 'envs', '*'))))
+    return prefixes
+
+
+def _path_prefixes():
+    prefixes = []
+    for d in os.environ.get('PATH', '').split(os.pathsep):
+        if d and os.access(os.path.join(d, 'python3'), os.X_OK):
+            # no realpath: a venv's bin/python3 is a symlink to the base interpreter
+            prefixes.append(os.path.dirname(os.path.abspath(d)))
+    return prefixes
+
+
+def current_envs():
+    """site-packages of the running interpreter (site, user site, sys.prefix)."""
+    version = f'{sys.version_info.major}.{sys.version_info.minor}'
+    paths = []
+    try:
+        paths.extend(site.getsitepackages())
+    except Exception:
+        pass
+    try:
+        paths.append(site.getusersitepackages())
+    except Exception:
+        pass
+    paths.append(os.path.join(sys.prefix, 'lib', f'python{version}', 'site-packages'))
+    return [SiteEnv(p, sys.executable, version) for p in paths if p]
+
+
+def discover(include_path=True):
+    """Every distinct site-packages with mlc_llm installed, current interpreter first."""
+    candidates = current_envs()
+    prefixes = _conda_prefixes() + (_path_prefixes() if include_path else [])
+    for prefix in prefixes:
+        candidates.extend(_prefix_envs(prefix))
+    return dedupe(candidates)
+
+
+def dedupe(envs):
+    seen = set()
+    found = []
+    for env in envs:
+        try:
+            key = os.path.realpath(env.site_pkg)
+        except OSError:
+            continue
+        if key not in seen and env.has_mlc_llm():
+            seen.add(key)
+            found.append(env)
+    return found
+
+
+def from_paths(paths):
+    """SiteEnvs for user-given site-packages dirs, env prefixes or interpreters."""
+    envs = []
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isfile(path):
+            # an interpreter: <prefix>/bin/python
+            envs.extend(_prefix_envs(os.path.dirname(os.path.dirname(path))))
+        elif os.path.isdir(os.path.join(path, 'mlc_llm')):
+            prefix_envs = [e for e in _prefix_envs(os.path.dirname(os.path.dirname(os.path.dirname(path))))
+                           if os.path.realpath(e.site_pkg) == os.path.realpath(path)]
+            envs.extend(prefix_envs or [SiteEnv(path)])
+        else:
+            envs.extend(_prefix_envs(path))
+    return dedupe(envs)
+
+
+def mlc_site_packages():
+    """site-packages dirs of the running interpreter that contain mlc_llm."""
+    return [env.site_pkg for env in dedupe(current_envs())]
+
+
+@contextlib.contextmanager
+def env_lock(site_pkg, timeout=600.0, poll=0.2):
+    """Exclusive per-environment lock. Yields the seconds spent waiting."""
+    if fcntl is None:
+        yield 0.0
+        return
+    path = os.path.join(site_pkg, LOCK_NAME)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    start = time.perf_counter()
+    try:
+        announced = False
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if not announced:
+                    print(f"  🔒 {site_pkg} is being patched by another process; waiting...")
+                    announced = True
+                if time.perf_counter() - start > timeout:
+                    raise TimeoutError(f'lock {path} not acquired within {timeout:.0f}s')
+                time.sleep(poll)
+        os.ftruncate(fd, 0)
+        os.write(fd, f'{os.getpid()}\n'.encode('ascii'))
+        yield time.perf_counter() - start
+    finally:
+        os.close(fd)  # closing the descriptor releases the flock
+
+
+def run_concurrently(envs, fn, workers=None, lock_timeout=600.0):
+    """Run fn(env) for every env in parallel, each under its env_lock.
+
+    Returns [{'env', 'result', 'error', 'lock_wait', 'seconds'}] in input order.
+    """
+    def one(env):
+        start = time.perf_counter()
+        out = {'env': env, 'result': None, 'error': None, 'lock_wait': 0.0}
+        try:
+            with env_lock(env.site_pkg, lock_timeout) as waited:
+                out['lock_wait'] = waited
+                out['result'] = fn(env)
+        except Exception as e:
+            out['error'] = f'{type(e).__name__}: {e}'
+        out['seconds'] = time.perf_counter() - start
+        return out
+
+    if not envs:
+        return []
+    with ThreadPoolExecutor(max_workers=workers or len(envs)) as pool:
+        return list(pool.map(one, envs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='List interpreter / site-packages pairs with mlc_llm installed')
+    parser.add_argument('paths', nargs='*', help='site-packages dirs, env prefixes or interpreters (default: discover)')
+    parser.add_argument('--no-path', action='store_true', help='do not look at python3 executables on $PATH')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    envs = from_paths(args.paths) if args.paths else discover(include_path=not args.no_path)
+    if args.json:
+        print(json.dumps([e.as_dict() for e in envs], indent=2))
+    else:
+        for env in envs:
+            print(f"{env.site_pkg}  (python {env.version or '?'}: {env.python or 'unknown'})")
+        if not envs:
+            print("No site-packages with mlc_llm found")
+    return 0 if envs else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
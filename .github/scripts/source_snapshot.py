@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Snapshot cache for the prepared mlc-llm-source tree (mlc-llm + submodules, patched).
+
+Without it, every run clones mlc-llm --depth 1 and runs a recursive submodule
+update. When TVM or tokenizers-cpp come up without their CMakeLists.txt, it
+also runs a full `submodule update`, and then copies the json_ffi patch in.
+`prepare` does all of that once per (upstream commit, patch inputs) and stores
+the finished tree as an archive:
+
+    key = <mlc-llm commit>-<sha256 of the json_ffi patch source + ensure_force_link_marker.sh>
+
+The upstream commit comes from `git ls-remote`, so a cache hit costs one
+round-trip and one tar extract. The submodule commits are fixed by the
+superproject commit, so they need no key of their own. They are recorded in
+the snapshot metadata (and in mlc-llm-source/.source_snapshot.json) for
+diagnostics.
+
+Archives are deterministic. Members are sorted, owners and modes are
+normalized, and every mtime is the superproject's commit time, so the same
+inputs always produce byte-identical archives. .git directories are left
+out. The archives are plain tar: the CI cache compresses on its own.
+`restore` extracts into a temporary directory next to the destination. That
+same single pass hashes the archive stream and records every member name.
+The tree is moved into place only if the hash matches the snapshot and all
+REQUIRED files were present. Otherwise nothing changes and the exit status
+is 1.
+
+The upstream can be any git URL or a local (bare) repository path, so the
+whole thing can be exercised offline.
+
+Store layout (default ~/.cache/mlc_source_snapshot, or MLC_SOURCE_SNAPSHOT_STORE):
+    archives/<key>.tar      prepared source tree
+    snapshots/<key>.json    commits, patch hash, archive sha256, member count
+
+Usage:
+    python source_snapshot.py key     [--upstream URL] [--ref REF]
+    python source_snapshot.py prepare [--upstream URL] [--ref REF] [--dest mlc-llm-source]
+    python source_snapshot.py restore (--key KEY | --latest) [--dest mlc-llm-source]
+    python source_snapshot.py list
+    python source_snapshot.py prune [--keep 2]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+from tree_patcher import atomic_write_bytes, atomic_writer
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(os.path.dirname(SCRIPTS_DIR))
+DEFAULT_UPSTREAM = 'https://github.com/mlc-ai/mlc-llm.git'
+JSONFFI_REL = 'cpp/json_ffi/json_ffi_engine.cc'
+# patch sources in the order the workflow prefers them
+PATCH_SOURCES = (os.path.join(REPO_ROOT, 'mlc-llm', JSONFFI_REL),
+                 os.path.join(REPO_ROOT, '.github', 'patches', 'json_ffi_engine.cc'))
+MARKER_SCRIPT = os.path.join(SCRIPTS_DIR, 'ensure_force_link_marker.sh')
+REQUIRED = (
+    'CMakeLists.txt',
+    '3rdparty/tvm/CMakeLists.txt',
+    '3rdparty/tokenizers-cpp/CMakeLists.txt',
+    JSONFFI_REL,
+)
+METADATA_NAME = '.source_snapshot.json'
+SNAPSHOT_FORMAT = 1
+
+
+def default_store():
+    return os.environ.get('MLC_SOURCE_SNAPSHOT_STORE') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'mlc_source_snapshot')
+
+
+def default_upstream():
+    return os.environ.get('MLC_LLM_UPSTREAM') or DEFAULT_UPSTREAM
+
+
+def is_local(upstream):
+    return upstream.startswith('file://') or ('://' not in upstream and ':' not in upstream.split('/')[0])
+
+
+def git(args, cwd=None, local=False, check=True):
+    cmd = ['git']
+    if local:
+        # submodules of a local upstream are usually local paths too (git >= 2.38.1 refuses them by default)
+        cmd += ['-c', 'protocol.file.allow=always']
+    proc = subprocess.run(cmd + args, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if check and proc.returncode != 0:
+        raise RuntimeError(f"git {' '.join(args)} failed: {proc.stderr.strip()}")
+    return proc
+
+
+def resolve_commit(upstream, ref=None):
+    """Commit id `ref` (default HEAD) points to upstream, without cloning."""
+    ref = ref or 'HEAD'
+    if len(ref) == 40 and all(c in '0123456789abcdef' for c in ref):
+        return ref
+    out = git(['ls-remote', upstream, ref]).stdout.split()
+    if not out:
+        raise RuntimeError(f"{ref} not found in {upstream}")
+    return out[0]
+
+
+def patch_source():
+    for path in PATCH_SOURCES:
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def patch_hash():
+    """Hash of every input that decides how the cloned tree gets patched."""
+    h = hashlib.sha256(f'format={SNAPSHOT_FORMAT}\0'.encode())
+    for path in (patch_source(), MARKER_SCRIPT):
+        if path and os.path.isfile(path):
+            h.update(os.path.relpath(path, REPO_ROOT).encode('utf-8') + b'\0')
+            with open(path, 'rb') as f:
+                h.update(f.read())
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def snapshot_key(commit, patches):
+    return f'{commit[:16]}-{patches[:16]}'
+
+
+# ---------------------------------------------------------------------------
+# store
+
+class SourceStore:
+    def __init__(self, root=None):
+        self.root = root or default_store()
+
+    def archive_path(self, key):
+        return os.path.join(self.root, 'archives', key + '.tar')
+
+    def meta_path(self, key):
+        return os.path.join(self.root, 'snapshots', key + '.json')
+
+    def load(self, key):
+        try:
+            with open(self.meta_path(key), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('format') != SNAPSHOT_FORMAT or not os.path.isfile(self.archive_path(key)):
+            return None
+        return meta
+
+    def snapshots(self):
+        d = os.path.join(self.root, 'snapshots')
+        out = []
+        if os.path.isdir(d):
+            for name in os.listdir(d):
+                if name.endswith('.json'):
+                    meta = self.load(name[:-len('.json')])
+                    if meta:
+                        out.append(meta)
+        return sorted(out, key=lambda m: m['created'])
+
+    def put(self, key, tree, meta):
+        with atomic_writer(self.archive_path(key)) as f:
+            writer = _HashingWriter(f)
+            members = write_archive(writer, tree, meta['commit_time'])
+        meta = dict(meta, key=key, sha256=writer.hexdigest(), size=writer.size, members=members,
+                    created=time.time(), format=SNAPSHOT_FORMAT)
+        atomic_write_bytes(self.meta_path(key), json.dumps(meta, indent=1, sort_keys=True).encode('utf-8'))
+        return meta
+
+    def remove(self, key):
+        for path in (self.meta_path(key), self.archive_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class _HashingWriter:
+    __slots__ = ('f', 'h', 'size')
+
+    def __init__(self, f):
+        self.f, self.h, self.size = f, hashlib.sha256(), 0
+
+    def write(self, data):
+        self.h.update(data)
+        self.size += len(data)
+        return self.f.write(data)
+
+    def hexdigest(self):
+        return self.h.hexdigest()
+
+
+class _HashingReader:
+    __slots__ = ('f', 'h')
+
+    def __init__(self, f):
+        self.f, self.h = f, hashlib.sha256()
+
+    def read(self, n=-1):
+        data = self.f.read(n)
+        self.h.update(data)
+        return data
+
+    def drain(self):
+        while self.read(1 << 20):
+            pass
+        return self.h.hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# archive
+
+def iter_tree(tree):
+    """Relative paths under `tree` in a stable order, skipping .git entries."""
+    for dirpath, dirnames, filenames in os.walk(tree):
+        links = [d for d in dirnames if os.path.islink(os.path.join(dirpath, d))]
+        dirnames[:] = sorted(d for d in dirnames if d != '.git' and d not in links)
+        rel = os.path.relpath(dirpath, tree)
+        if rel != '.':
+            yield rel.replace(os.sep, '/')
+        for name in sorted(filenames + links):
+            if name != '.git':
+                yield (name if rel == '.' else f'{rel}/{name}').replace(os.sep, '/')
+
+
+def write_archive(fileobj, tree, mtime):
+    """Deterministic tar of `tree` into `fileobj`. Returns the member count."""
+    count = 0
+    with tarfile.open(fileobj=fileobj, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+        for rel in iter_tree(tree):
+            path = os.path.join(tree, rel)
+            st = os.lstat(path)
+            info = tarfile.TarInfo(rel)
+            info.mtime = mtime
+            info.uid = info.gid = 0
+            info.uname = info.gname = ''
+            if os.path.islink(path):
+                info.type, info.linkname, info.mode = tarfile.SYMTYPE, os.readlink(path), 0o777
+                tar.addfile(info)
+            elif os.path.isdir(path):
+                info.type, info.mode = tarfile.DIRTYPE, 0o755
+                tar.addfile(info)
+            else:
+                info.size, info.mode = st.st_size, 0o755 if st.st_mode & 0o111 else 0o644
+                with open(path, 'rb') as f:
+                    tar.addfile(info, f)
+            count += 1
+    return count
+
+
+def restore(store, meta, dest, required=REQUIRED):
+    """Extract a snapshot to `dest`, verified in the same pass. Returns (ok, message)."""
+    dest = os.path.abspath(dest)
+    parent = os.path.dirname(dest)
+    os.makedirs(parent, exist_ok=True)
+    work = tempfile.mkdtemp(prefix='.tmp-source-', dir=parent)
+    os.chmod(work, 0o755)
+    names = set()
+    try:
+        with open(store.archive_path(meta['key']), 'rb') as f:
+            reader = _HashingReader(f)
+            with tarfile.open(fileobj=reader, mode='r|') as tar:
+                for member in tar:
+                    names.add(member.name)
+                    if hasattr(tarfile, 'data_filter'):
+                        tar.extract(member, work, filter='data')
+                    else:
+                        if member.name.startswith('/') or '..' in member.name.split('/'):
+                            raise RuntimeError(f'unsafe member {member.name}')
+                        tar.extract(member, work)
+            digest = reader.drain()
+        if digest != meta['sha256']:
+            return False, f"archive hash mismatch ({digest[:12]} != {meta['sha256'][:12]})"
+        missing = [r for r in required if r not in names]
+        if missing:
+            return False, f"required files missing: {', '.join(missing)}"
+        with open(os.path.join(work, METADATA_NAME), 'w', encoding='utf-8') as f:
+            json.dump({k: meta[k] for k in ('key', 'upstream', 'commit', 'submodules', 'patch_hash', 'patch_source',
+                                            'sha256')}, f, indent=1, sort_keys=True)
+        if os.path.lexists(dest):
+            shutil.rmtree(dest) if os.path.isdir(dest) and not os.path.islink(dest) else os.unlink(dest)
+        os.replace(work, dest)
+        work = None
+        return True, f"{len(names)} entries"
+    except (OSError, tarfile.TarError, RuntimeError) as e:
+        return False, str(e)
+    finally:
+        if work:
+            shutil.rmtree(work, ignore_errors=True)
+
+
+# ---------------------------------------------------------------------------
+# prepare (clone + submodules + patch)
+
+def missing_required(tree, required=REQUIRED):
+    return [r for r in required if not os.path.isfile(os.path.join(tree, r))]
+
+
+def clone_tree(upstream, commit, tree, ref=None, log=print):
+    local = is_local(upstream)
+    clone = ['clone', '--depth', '1']
+    if ref and ref != 'HEAD' and ref != commit:
+        clone += ['--branch', ref.split('refs/heads/')[-1].split('refs/tags/')[-1]]
+    git(clone + [upstream, tree], local=local)
+    head = git(['rev-parse', 'HEAD'], cwd=tree).stdout.strip()
+    if head != commit:
+        # upstream moved between ls-remote and clone, or ref was a bare commit id
+        git(['fetch', '--depth', '1', 'origin', commit], cwd=tree, local=local)
+        git(['checkout', '-q', '--detach', commit], cwd=tree)
+    log("Initializing submodules (recursive, shallow)")
+    git(['submodule', 'update', '--init', '--recursive', '--depth', '1'], cwd=tree, local=local, check=False)
+    structural = [r for r in REQUIRED if r != JSONFFI_REL]
+    if missing_required(tree, structural):
+        log("Critical submodules missing CMakeLists; performing full submodule update")
+        git(['submodule', 'sync', '--recursive'], cwd=tree, local=local, check=False)
+        git(['submodule', 'update', '--init', '--recursive'], cwd=tree, local=local, check=False)
+    submodules = {}
+    status = git(['submodule', 'status', '--recursive'], cwd=tree, check=False).stdout
+    for line in status.splitlines():
+        parts = line[1:].split()
+        if len(parts) >= 2:
+            submodules[parts[1]] = parts[0]
+    commit_time = int(git(['log', '-1', '--format=%ct'], cwd=tree).stdout.strip())
+    return submodules, commit_time
+
+
+def apply_patches(tree, log=print):
+    src = patch_source()
+    target = os.path.join(tree, JSONFFI_REL)
+    if src:
+        log(f"Using {os.path.relpath(src, REPO_ROOT)} as source patch")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(src, target)
+    else:
+        log("No local patch found to copy into mlc-llm-source")
+    if os.path.isfile(target) and os.path.isfile(MARKER_SCRIPT):
+        subprocess.run(['bash', MARKER_SCRIPT, target, os.devnull], check=False)
+    return os.path.relpath(src, REPO_ROOT) if src else None
+
+
+def prepare(store, upstream, dest, ref=None, log=print):
+    """Restore the snapshot for (upstream ref, patch inputs) into `dest`, building it first if needed."""
+    commit = resolve_commit(upstream, ref)
+    patches = patch_hash()
+    key = snapshot_key(commit, patches)
+    meta = store.load(key)
+    if meta:
+        ok, message = restore(store, meta, dest)
+        if ok:
+            return 'restored', meta, message
+        log(f"⚠️  snapshot {key} unusable ({message}); rebuilding it")
+        store.remove(key)
+
+    work = tempfile.mkdtemp(prefix='source-snapshot-')
+    try:
+        tree = os.path.join(work, 'src')
+        submodules, commit_time = clone_tree(upstream, commit, tree, ref, log)
+        source = apply_patches(tree, log)
+        missing = missing_required(tree)
+        if missing:
+            raise RuntimeError(f"prepared tree is missing {', '.join(missing)}")
+        meta = store.put(key, tree, {'upstream': upstream, 'commit': commit, 'submodules': submodules,
+                                     'patch_hash': patches, 'patch_source': source, 'commit_time': commit_time})
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    ok, message = restore(store, meta, dest)
+    if not ok:
+        raise RuntimeError(f"fresh snapshot {key} failed to restore: {message}")
+    return 'built', meta, message
+
+
+def prune(store, keep):
+    removed = []
+    for meta in store.snapshots()[:-keep] if keep else store.snapshots():
+        store.remove(meta['key'])
+        removed.append(meta['key'])
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Snapshot cache for the prepared mlc-llm-source tree')
+    parser.add_argument('command', choices=('key', 'prepare', 'restore', 'list', 'prune'))
+    parser.add_argument('--upstream', default=None, help=f'git URL or local repository (default {DEFAULT_UPSTREAM})')
+    parser.add_argument('--ref', default=None, help='branch, tag or commit (default HEAD)')
+    parser.add_argument('--dest', default=os.path.join(REPO_ROOT, 'mlc-llm-source'))
+    parser.add_argument('--store', default=None, help='default ~/.cache/mlc_source_snapshot')
+    parser.add_argument('--key', default=None, help='restore: snapshot key')
+    parser.add_argument('--latest', action='store_true', help='restore: newest snapshot for the current patch inputs')
+    parser.add_argument('--keep', type=int, default=2, help='prune: number of newest snapshots to keep')
+    args = parser.parse_args()
+
+    store = SourceStore(args.store)
+    upstream = args.upstream or default_upstream()
+    try:
+        if args.command == 'key':
+            print(snapshot_key(resolve_commit(upstream, args.ref), patch_hash()))
+        elif args.command == 'prepare':
+            start = time.perf_counter()
+            how, meta, message = prepare(store, upstream, args.dest, args.ref)
+            print(f"✅ mlc-llm-source {how} from snapshot {meta['key']} ({message}, "
+                  f"{len(meta['submodules'])} submodules, {time.perf_counter() - start:.1f}s)")
+            for path, commit in sorted(meta['submodules'].items()):
+                print(f"   {commit[:12]} {path}")
+        elif args.command == 'restore':
+            if args.latest:
+                patches = patch_hash()
+                matching = [m for m in store.snapshots() if m['patch_hash'] == patches]
+                meta = matching[-1] if matching else None
+            else:
+                meta = store.load(args.key) if args.key else None
+            if not meta:
+                print("No matching source snapshot", file=sys.stderr)
+                return 1
+            ok, message = restore(store, meta, args.dest)
+            print(f"{'✅' if ok else '❌'} {meta['key']}: {message}", file=None if ok else sys.stderr)
+            return 0 if ok else 1
+        elif args.command == 'list':
+            for meta in store.snapshots():
+                print(f"{meta['key']}  {meta['size'] / (1 << 20):8.1f} MB  {meta['members']:>7} entries  "
+                      f"{meta['commit'][:12]}  {meta.get('patch_source') or '-'}")
+        else:
+            for key in prune(store, args.keep):
+                print(f"🗑️  removed {key}")
+    except (RuntimeError, OSError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Tests for compile_sweep.py, run against the stub mlc_llm in testdata/stub_mlc_llm.
+
+Usage:
+    python3 .github/scripts/test_compile_sweep.py [-v]
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import compile_sweep
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STUB_PATH = os.path.join(HERE, 'testdata', 'stub_mlc_llm')
+# Qwen3-4B-like shape, so memory_planner can order the variants
+CONFIG = {
+    'quantization': 'q4f16_1',
+    'context_window_size': 2048,
+    'prefill_chunk_size': 64,
+    'model_config': {
+        'num_hidden_layers': 36, 'hidden_size': 2560, 'intermediate_size': 9728,
+        'num_attention_heads': 32, 'num_key_value_heads': 8, 'head_dim': 128,
+        'vocab_size': 151936, 'tie_word_embeddings': True, 'max_position_embeddings': 40960,
+        'context_window_size': 2048, 'prefill_chunk_size': 64,
+    },
+}
+
+
+class SweepTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = self._tmp.name
+        self.config = os.path.join(self.tmp, 'model', 'mlc-chat-config.json')
+        os.makedirs(os.path.dirname(self.config))
+        with open(self.config, 'w') as f:
+            json.dump(CONFIG, f)
+        self.out_dir = os.path.join(self.tmp, 'sweep')
+        env = {'PYTHONPATH': STUB_PATH, 'STUB_MB_PER_1K': '4', 'STUB_SECONDS': '0.3'}
+        patcher = mock.patch.dict(os.environ, env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self._tmp.cleanup)
+
+    def jobs(self, grid, base=None):
+        variants = compile_sweep.expand_grid(grid, dict(compile_sweep.BASE_OVERRIDES, **(base or {})))
+        return [compile_sweep.Job(compile_sweep.variant_name(v, list(grid)), v, self.out_dir) for v in variants]
+
+    def run_scheduler(self, jobs, slots, mem_budget, mem_per_job):
+        messages = []
+        scheduler = compile_sweep.Scheduler(self.config, 'auto', slots, 1, mem_budget, mem_per_job,
+                                            python=sys.executable, log=messages.append)
+        rows = scheduler.run(jobs)
+        running = [int(m) for m in re.findall(r'\(running (\d+),', '\n'.join(messages))]
+        return scheduler, rows, running
+
+
+class LargestFirstTest(SweepTestCase):
+    def test_orders_by_estimated_memory(self):
+        jobs = self.jobs({'context_window_size': [1024, 8192, 4096], 'prefill_chunk_size': [32, 128]})
+        ordered = compile_sweep.largest_first(jobs, self.config)
+        self.assertEqual([j.name for j in ordered[:2]], ['ctx8192-pf128', 'ctx8192-pf32'])
+        self.assertEqual([j.name for j in ordered[-2:]], ['ctx1024-pf128', 'ctx1024-pf32'])
+
+    def test_missing_keys_come_from_the_config(self):
+        # no context in the grid or the base overrides: the config's 2048 is used for every variant
+        jobs = self.jobs({'prefill_chunk_size': [16, 512, 128]})
+        ordered = compile_sweep.largest_first(jobs, self.config)
+        self.assertEqual([j.name for j in ordered], ['pf512', 'pf128', 'pf16'])
+
+
+class SchedulerTest(SweepTestCase):
+    def test_rows_and_failing_variant(self):
+        jobs = self.jobs({'context_window_size': [1024, 4096], 'prefill_chunk_size': [32, 128]})
+        # enough memory per context that the child's own allocation, not the forked parent, sets its peak
+        env = {'STUB_FAIL': 'context_window_size=1024;prefill_chunk_size=128', 'STUB_MB_PER_1K': '32'}
+        with mock.patch.dict(os.environ, env):
+            _, rows, _ = self.run_scheduler(compile_sweep.largest_first(jobs, self.config), 4, 64 << 30, 64 << 20)
+        by_name = {r['variant']: r for r in rows}
+        self.assertEqual(set(by_name), {j.name for j in jobs})
+        failed = by_name['ctx1024-pf128']
+        self.assertEqual(failed['rc'], 2)
+        self.assertIsNone(failed['tar_bytes'])
+        with open(failed['log']) as f:
+            self.assertIn('TVMError', f.read())
+        for name in ('ctx1024-pf32', 'ctx4096-pf32', 'ctx4096-pf128'):
+            row = by_name[name]
+            ctx, pf = (int(n) for n in re.findall(r'\d+', name))
+            self.assertEqual(row['rc'], 0, name)
+            self.assertEqual((row['devc_bytes'], row['lib0_bytes']), (pf * 16, ctx * 16))
+            self.assertGreater(row['peak_rss'], 0)
+        self.assertGreater(by_name['ctx4096-pf32']['peak_rss'], by_name['ctx1024-pf32']['peak_rss'])
+
+    def test_cpu_slots_cap_concurrency(self):
+        jobs = self.jobs({'context_window_size': [512, 1024, 1536, 2048]})
+        _, rows, running = self.run_scheduler(jobs, 2, 64 << 30, 16 << 20)
+        self.assertEqual(max(running), 2)
+        self.assertTrue(all(r['rc'] == 0 for r in rows))
+
+    def test_memory_budget_serializes_and_learns_peak(self):
+        jobs = self.jobs({'context_window_size': [4096, 2048, 1024]})
+        # room for one reservation of mem_per_job, not two
+        scheduler, rows, running = self.run_scheduler(jobs, 4, 96 << 20, 64 << 20)
+        self.assertEqual(max(running), 1)
+        largest = max(r['peak_rss'] for r in rows)
+        self.assertEqual(scheduler.largest_peak, largest)
+        self.assertEqual(scheduler.estimate, max(64 << 20, int(largest * 1.1)))
+
+
+class MainTest(SweepTestCase):
+    def test_cli_writes_tables_and_fails_on_a_failed_variant(self):
+        env = dict(os.environ, STUB_FAIL='context_window_size=4096')
+        proc = subprocess.run(
+            [sys.executable, os.path.join(HERE, 'compile_sweep.py'), os.path.dirname(self.config),
+             '--grid', 'context_window_size=1024,4096', '--out-dir', self.out_dir, '--cpus', '2',
+             '--mem-per-job', '32M', '--python', sys.executable],
+            capture_output=True, text=True, env=env, timeout=120)
+        self.assertEqual(proc.returncode, 1, proc.stdout + proc.stderr)
+        with open(os.path.join(self.out_dir, 'sweep.json')) as f:
+            data = json.load(f)
+        self.assertEqual({r['variant']: r['rc'] for r in data['results']}, {'ctx1024': 0, 'ctx4096': 2})
+        with open(os.path.join(self.out_dir, 'sweep.csv')) as f:
+            self.assertEqual(len(f.read().strip().splitlines()), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
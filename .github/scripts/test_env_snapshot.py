@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Tests for env_snapshot.py: capture -> restore -> patch on a fake site-packages tree.
+
+Usage:
+    python3 .github/scripts/test_env_snapshot.py [-v]
+"""
+import hashlib
+import os
+import stat
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import env_snapshot
+from bool_rules import BOOL_RULES, TOP_P_PIVOT
+from patch_manifest import PatchManifest
+from tree_patcher import atomic_write_bytes, expand_targets, patch_tree
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PIVOT_SOURCE = '''
+def kernel():
+    pred_shared = T.alloc_buffer((1,), "bool", scope="shared")
+    done = _var("bool")
+'''
+# relpath -> content; the mlc dist and an unrelated dist share google/
+MLC_FILES = {
+    'mlc_llm/__init__.py': '',
+    'mlc_llm/op/__init__.py': '',
+    TOP_P_PIVOT: PIVOT_SOURCE,
+    'mlc_llm/compiler_pass/attach_sampler.py': 'x = batch_spec_verify(vocab_size)\n',
+    'google/mlc_shared.py': 'SHARED = 1\n',
+}
+OTHER_FILES = {
+    'google/protobuf/__init__.py': 'PROTO = 1\n',
+}
+
+
+def make_dist(site_pkg, name, version, files, requires=()):
+    for rel, text in files.items():
+        path = os.path.join(site_pkg, *rel.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+    dist_info = f"{name.replace('-', '_')}-{version}.dist-info"
+    os.makedirs(os.path.join(site_pkg, dist_info))
+    with open(os.path.join(site_pkg, dist_info, 'METADATA'), 'w') as f:
+        f.write(f'Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n')
+        for req in requires:
+            f.write(f'Requires-Dist: {req}\n')
+    with open(os.path.join(site_pkg, dist_info, 'RECORD'), 'w') as f:
+        for rel in list(files) + [f'{dist_info}/METADATA', f'{dist_info}/RECORD']:
+            f.write(f'{rel},,\n')
+    return dist_info
+
+
+def sha256_file(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class EnvSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.site = os.path.join(self._tmp.name, 'site-packages')
+        self.store = env_snapshot.SnapshotStore(os.path.join(self._tmp.name, 'store'))
+        make_dist(self.site, 'mlc-llm-nightly-cpu', '0.1.dev1', MLC_FILES)
+        make_dist(self.site, 'protobuf', '4.0', OTHER_FILES)
+        # bytecode the patch scripts compile next to a recorded module, plus an unrelated one
+        pycache = os.path.join(self.site, 'mlc_llm', '__pycache__')
+        os.makedirs(pycache)
+        for name in ('__init__.cpython-311.pyc', 'unrelated.cpython-311.pyc'):
+            with open(os.path.join(pycache, name), 'wb') as f:
+                f.write(b'pyc')
+
+    def path(self, rel):
+        return os.path.join(self.site, *rel.split('/'))
+
+    def capture(self):
+        snapshot = env_snapshot.capture(self.site, self.store, wanted=('mlc-llm-nightly-cpu',))
+        self.assertIsNotNone(snapshot)
+        return snapshot
+
+    def assert_store_intact(self, snapshot):
+        for entry in snapshot['files']:
+            if 'sha256' in entry:
+                obj = self.store.object_path(entry['sha256'], entry['x'])
+                self.assertEqual(sha256_file(obj), entry['sha256'], entry['path'])
+
+    def test_capture_takes_recorded_files_only(self):
+        paths = {e['path'] for e in self.capture()['files']}
+        self.assertTrue(set(MLC_FILES) <= paths)
+        self.assertIn('mlc_llm/__pycache__/__init__.cpython-311.pyc', paths)
+        self.assertNotIn('mlc_llm/__pycache__/unrelated.cpython-311.pyc', paths)
+        self.assertFalse(any(p.startswith(('google/protobuf', 'protobuf-')) for p in paths))
+
+    def test_restore_copies_by_default(self):
+        snapshot = self.capture()
+        os.unlink(self.path('mlc_llm/op/__init__.py'))
+        with open(self.path('google/mlc_shared.py'), 'w') as f:
+            f.write('BROKEN = 1\n')
+        self.assertTrue(env_snapshot.verify(self.site, snapshot))
+
+        counts = env_snapshot.restore(self.site, self.store, snapshot)
+        self.assertEqual(set(counts), {'copy'})
+        self.assertEqual(env_snapshot.verify(self.site, snapshot), [])
+        st = os.stat(self.path(TOP_P_PIVOT))
+        self.assertEqual(st.st_nlink, 1)
+        self.assertEqual(stat.S_IMODE(st.st_mode), 0o644)
+        # the other distribution in the shared directory is untouched
+        with open(self.path('google/protobuf/__init__.py')) as f:
+            self.assertEqual(f.read(), 'PROTO = 1\n')
+
+    def test_patch_after_restore_leaves_store_intact(self):
+        snapshot = self.capture()
+        env_snapshot.restore(self.site, self.store, snapshot)
+
+        manifest = PatchManifest(self.site, 'test', BOOL_RULES.fingerprint())
+        reports = patch_tree(manifest, BOOL_RULES, expand_targets(self.site, BOOL_RULES, ['mlc_llm']))
+        self.assertIn('patched', {r.status for r in reports})
+        with open(self.path(TOP_P_PIVOT)) as f:
+            self.assertNotIn('"bool"', f.read())
+        # an old-style in-place writer (patch_attach_sampler before its fix) works on a copy too
+        with open(self.path('mlc_llm/compiler_pass/attach_sampler.py'), 'w') as f:
+            f.write('x = batch_spec_verify()\n')
+        self.assert_store_intact(snapshot)
+
+    def test_link_restore_shares_read_only_objects(self):
+        snapshot = self.capture()
+        counts = env_snapshot.restore(self.site, self.store, snapshot, link=True)
+        self.assertIn('link', counts)
+        pivot = self.path(TOP_P_PIVOT)
+        self.assertEqual(os.stat(pivot).st_nlink, 2)
+        self.assertEqual(stat.S_IMODE(os.stat(pivot).st_mode), 0o444)
+        # replacing writers are safe: the link is swapped for a new file
+        atomic_write_bytes(pivot, b'patched = True\n')
+        self.assertEqual(os.stat(pivot).st_nlink, 1)
+        self.assert_store_intact(snapshot)
+
+    def test_archive_round_trip(self):
+        snapshot = env_snapshot.capture(self.site, self.store, wanted=('mlc-llm-nightly-cpu',), archive=True)
+        os.unlink(self.path(TOP_P_PIVOT))
+        counts = env_snapshot.restore(self.site, self.store, snapshot, use_archive=True)
+        self.assertEqual(counts, {'archive': len(snapshot['files'])})
+        self.assertEqual(env_snapshot.verify(self.site, snapshot), [])
+
+    def test_cli_capture_and_restore(self):
+        env = dict(os.environ, MLC_ENV_SNAPSHOT_STORE=self.store.root)
+        script = os.path.join(HERE, 'env_snapshot.py')
+        common = ['--site-packages', self.site]
+        proc = subprocess.run([sys.executable, script, 'capture', '--dist', 'mlc-llm-nightly-cpu', *common],
+                              capture_output=True, text=True, env=env)
+        self.assertEqual(proc.returncode, 0, proc.stdout + proc.stderr)
+        os.unlink(self.path(TOP_P_PIVOT))
+        proc = subprocess.run([sys.executable, script, 'restore', '--latest', '--any-version', *common],
+                              capture_output=True, text=True, env=env)
+        self.assertEqual(proc.returncode, 0, proc.stdout + proc.stderr)
+        self.assertIn('copy', proc.stdout)
+        proc = subprocess.run([sys.executable, script, 'verify', '--latest', *common],
+                              capture_output=True, text=True, env=env)
+        self.assertEqual(proc.returncode, 0, proc.stdout + proc.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Tests for mirror_fetch.py against a local HTTP server standing in for GitHub.
+
+Usage:
+    python3 .github/scripts/test_mirror_fetch.py [-v]
+"""
+import hashlib
+import http.server
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import mirror_fetch
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+JSONFFI_PATH = '/mlc-ai/mlc-llm/main/cpp/json_ffi/json_ffi_engine.cc'
+
+
+class Upstream(http.server.ThreadingHTTPServer):
+    """Serves `files` ({path: bytes}) with strong ETags; `delay` stalls every answer."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.files = {}
+        self.delay = 0.0
+        self.requests = []
+
+    @property
+    def base(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, self.headers.get('If-None-Match')))
+        time.sleep(server.delay)
+        body = server.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        etag = '"%s"' % hashlib.sha256(body).hexdigest()[:16]
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_args):
+        pass
+
+
+class MirrorFetchTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.server = Upstream()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.server.files[JSONFFI_PATH] = b'// engine v1\n'
+        self.mirror = mirror_fetch.Mirror(os.path.join(self._tmp.name, 'mirror'))
+        self.url = self.server.base + JSONFFI_PATH
+
+    def fetch(self, **kwargs):
+        kwargs.setdefault('deadline', 5)
+        return mirror_fetch.fetch([self.url], mirror=self.mirror, validate=bool, **kwargs)
+
+    def test_network_fetch_fills_the_mirror(self):
+        result = self.fetch()
+        self.assertEqual((result.source, result.data), ('network', b'// engine v1\n'))
+        self.assertEqual(self.mirror.get(result.sha256), b'// engine v1\n')
+        self.assertEqual(self.mirror.record(self.url)['sha256'], result.sha256)
+
+    def test_unchanged_upstream_revalidates_with_etag(self):
+        first = self.fetch()
+        second = self.fetch()
+        self.assertEqual((second.source, second.sha256), ('revalidated', first.sha256))
+        self.assertIsNotNone(self.server.requests[-1][1])
+
+    def test_mirror_is_returned_at_once_and_refreshed_in_background(self):
+        self.fetch()
+        self.server.files[JSONFFI_PATH] = b'// engine v2\n'
+        self.server.delay = 1.0
+        result = self.fetch(stale_while_revalidate=True)
+        self.assertEqual((result.source, result.data), ('mirror', b'// engine v1\n'))
+        self.assertLess(result.elapsed, 0.5)
+        self.assertTrue(mirror_fetch.wait_revalidations(timeout=5))
+        self.server.delay = 0.0
+        # the background request updated the mirror for the next run
+        self.assertEqual(self.fetch(offline=True).data, b'// engine v2\n')
+
+    def test_pinned_hash_skips_the_network(self):
+        sha = self.fetch().sha256
+        seen = len(self.server.requests)
+        result = self.fetch(expected_sha256=sha)
+        self.assertEqual((result.source, len(self.server.requests)), ('mirror', seen))
+
+    def test_sha256_mismatch_is_rejected(self):
+        errors = {}
+        result = self.fetch(expected_sha256='0' * 64, errors=errors)
+        self.assertIsNone(result)
+        self.assertIn('sha256 mismatch', errors[self.url])
+
+    def test_stale_copy_when_upstream_hangs(self):
+        self.fetch()
+        self.server.delay = 2.0
+        errors = {}
+        result = self.fetch(deadline=0.5, errors=errors)
+        self.assertEqual(result.source, 'stale')
+        self.assertLess(result.elapsed, 1.5)
+        self.assertIn(self.url, errors)
+
+    def test_cli_jsonffi_writes_out(self):
+        out = os.path.join(self._tmp.name, 'out', 'json_ffi_engine.cc')
+        env = dict(os.environ, MLC_RAW_BASE=self.server.base, MLC_FETCH_MIRROR=self.mirror.root)
+        env.pop('GITHUB_REPOSITORY', None)
+        proc = subprocess.run([sys.executable, os.path.join(HERE, 'mirror_fetch.py'), '--jsonffi', '--out', out,
+                               '--deadline', '5'], capture_output=True, text=True, env=env)
+        self.assertEqual(proc.returncode, 0, proc.stdout + proc.stderr)
+        with open(out, 'rb') as f:
+            self.assertEqual(f.read(), b'// engine v1\n')
+        with mock.patch.dict(os.environ, {'MLC_RAW_BASE': self.server.base}):
+            self.assertEqual(mirror_fetch.jsonffi_urls()[0], self.url)
+
+
+if __name__ == '__main__':
+    unittest.main()
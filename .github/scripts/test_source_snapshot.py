@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Tests for source_snapshot.py against a local bare upstream with two submodules (no network).
+
+Usage:
+    python3 .github/scripts/test_source_snapshot.py [-v]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import source_snapshot
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GIT_ENV = {
+    'GIT_AUTHOR_NAME': 'test', 'GIT_AUTHOR_EMAIL': 'test@example.com',
+    'GIT_COMMITTER_NAME': 'test', 'GIT_COMMITTER_EMAIL': 'test@example.com',
+    'GIT_CONFIG_GLOBAL': os.devnull, 'GIT_CONFIG_NOSYSTEM': '1',
+}
+
+
+def run_git(args, cwd):
+    subprocess.run(['git', '-c', 'init.defaultBranch=main', '-c', 'protocol.file.allow=always'] + args,
+                   cwd=cwd, check=True, capture_output=True, env=dict(os.environ, **GIT_ENV))
+
+
+def make_bare_repo(root, name, files, submodules=()):
+    """Commit `files` (+ `submodules` as (path, bare url)) in a work tree and return a bare clone's path."""
+    work = os.path.join(root, name + '-work')
+    os.makedirs(work)
+    run_git(['init', '-q'], work)
+    for rel, text in files.items():
+        path = os.path.join(work, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+    for path, url in submodules:
+        run_git(['submodule', 'add', '-q', url, path], work)
+    run_git(['add', '-A'], work)
+    run_git(['commit', '-q', '-m', 'initial'], work)
+    bare = os.path.join(root, name + '.git')
+    run_git(['clone', '-q', '--bare', work, bare], root)
+    return bare, work
+
+
+def quiet(*_args):
+    pass
+
+
+class SourceSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.root = self._tmp.name
+        # source_snapshot's git() calls see the same throwaway identity/config
+        patcher = mock.patch.dict(os.environ, GIT_ENV)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        tvm, _ = make_bare_repo(self.root, 'tvm', {'CMakeLists.txt': 'project(tvm)\n'})
+        tok, _ = make_bare_repo(self.root, 'tokenizers', {'CMakeLists.txt': 'project(tok)\n'})
+        self.upstream, self.work = make_bare_repo(
+            self.root, 'mlc-llm',
+            {'CMakeLists.txt': 'project(mlc)\n', source_snapshot.JSONFFI_REL: '// upstream\n'},
+            [('3rdparty/tvm', tvm), ('3rdparty/tokenizers-cpp', tok)])
+        self.store = source_snapshot.SourceStore(os.path.join(self.root, 'store'))
+
+    def prepare(self, dest_name, store=None):
+        return source_snapshot.prepare(store or self.store, self.upstream, os.path.join(self.root, dest_name),
+                                       log=quiet)
+
+    def test_prepare_builds_then_restores(self):
+        how, meta, _ = self.prepare('src1')
+        self.assertEqual(how, 'built')
+        dest = os.path.join(self.root, 'src1')
+        self.assertEqual(source_snapshot.missing_required(dest), [])
+        self.assertFalse(os.path.exists(os.path.join(dest, '.git')))
+        self.assertEqual(set(meta['submodules']), {'3rdparty/tvm', '3rdparty/tokenizers-cpp'})
+        with open(os.path.join(dest, source_snapshot.METADATA_NAME)) as f:
+            self.assertEqual(json.load(f)['key'], meta['key'])
+        # the json_ffi patch from the repo replaced the upstream file
+        with open(os.path.join(dest, source_snapshot.JSONFFI_REL)) as f:
+            self.assertNotEqual(f.read(), '// upstream\n')
+
+        how, again, _ = self.prepare('src2')
+        self.assertEqual((how, again['key']), ('restored', meta['key']))
+
+    def test_key_follows_upstream_commit(self):
+        key = source_snapshot.snapshot_key(source_snapshot.resolve_commit(self.upstream), source_snapshot.patch_hash())
+        _, meta, _ = self.prepare('src')
+        self.assertEqual(meta['key'], key)
+        with open(os.path.join(self.work, 'README'), 'w') as f:
+            f.write('new\n')
+        run_git(['add', 'README'], self.work)
+        run_git(['commit', '-q', '-m', 'second'], self.work)
+        run_git(['push', '-q', self.upstream, 'HEAD:main'], self.work)
+        newer = source_snapshot.snapshot_key(source_snapshot.resolve_commit(self.upstream), source_snapshot.patch_hash())
+        self.assertNotEqual(newer, key)
+
+    def test_archives_are_deterministic(self):
+        _, first, _ = self.prepare('src1')
+        other = source_snapshot.SourceStore(os.path.join(self.root, 'store2'))
+        _, second, _ = self.prepare('src2', other)
+        self.assertEqual(first['sha256'], second['sha256'])
+
+    def test_corrupt_archive_is_rejected_and_rebuilt(self):
+        _, meta, _ = self.prepare('src')
+        marker = os.path.join(self.root, 'src', 'keep-me')
+        open(marker, 'w').close()
+        with open(self.store.archive_path(meta['key']), 'r+b') as f:
+            f.seek(600)
+            byte = f.read(1)
+            f.seek(600)
+            f.write(bytes([byte[0] ^ 0xff]))
+        ok, message = source_snapshot.restore(self.store, meta, os.path.join(self.root, 'src'))
+        self.assertFalse(ok)
+        self.assertTrue(os.path.exists(marker), message)  # dest untouched
+        how, rebuilt, _ = self.prepare('src')
+        self.assertEqual((how, rebuilt['sha256']), ('built', meta['sha256']))
+        self.assertFalse(os.path.exists(marker))
+
+    def test_cli_key_and_restore_latest(self):
+        env = dict(os.environ, MLC_SOURCE_SNAPSHOT_STORE=self.store.root)
+        script = os.path.join(HERE, 'source_snapshot.py')
+        key = subprocess.run([sys.executable, script, 'key', '--upstream', self.upstream],
+                             capture_output=True, text=True, env=env, check=True).stdout.strip()
+        subprocess.run([sys.executable, script, 'prepare', '--upstream', self.upstream,
+                        '--dest', os.path.join(self.root, 'a')], capture_output=True, env=env, check=True)
+        proc = subprocess.run([sys.executable, script, 'restore', '--latest', '--dest', os.path.join(self.root, 'b')],
+                              capture_output=True, text=True, env=env)
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertIn(key, proc.stdout)
+        self.assertEqual(source_snapshot.missing_required(os.path.join(self.root, 'b')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,7 @@
+"""
+Stand-in for the `mlc_llm` package, for exercising compile_sweep.py and
+compile_gpu_lib_only_fallback.py on Linux without TVM or Metal.
+
+Put .github/scripts/testdata/stub_mlc_llm on PYTHONPATH and run
+`python -m mlc_llm compile ...`; see __main__.py for what it does.
+"""
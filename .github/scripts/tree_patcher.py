@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Concurrent scan-and-patch of site-packages trees with a RuleSet.
+
+Every candidate file is read once, all rules in scope are applied in a single
+pass (see rewrite_rules.py), and a changed file is written exactly once via a
+temp file + rename in the same directory, so readers never see a half-written
+module. Files without any rule in scope are never opened, which keeps a scan
+of the whole `mlc_llm` and `tvm` trees cheap. Per-file wall time is reported
+for every file that was actually processed.
+
+Workers are threads. They overlap the file reads and writes, but the regex
+rewriting holds the GIL, so it does not run in parallel: the saving over the
+old per-rule loops comes from the single read / single write per file and
+from skipping out-of-scope files. The files are small, so process workers
+would spend more on start-up and pickling the RuleSet than on the rewrite.
+
+Manifest bookkeeping (patch_manifest.py) stays on the calling thread; workers
+only read, rewrite and write.
+"""
+import contextlib
+import glob
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class FileReport:
+    """What happened to one file: status, RewriteResult (if read) and seconds."""
+
+    __slots__ = ('relpath', 'status', 'result', 'seconds', 'error')
+
+    def __init__(self, relpath, status, result=None, seconds=0.0, error=None):
+        self.relpath = relpath
+        self.status = status
+        self.result = result
+        self.seconds = seconds
+        self.error = error
+
+
+@contextlib.contextmanager
+def atomic_writer(path, mode=0o644):
+    """Yield a binary file object on a sibling temp file of `path`.
+
+    When the block exits normally the temp file is moved onto `path` with
+    os.replace(); when it raises, the temp file is removed and `path` is left
+    untouched. The original file mode is preserved when the file already
+    exists; a new file gets `mode`. Missing parent directories are created.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+        try:
+            os.chmod(tmp, os.stat(path).st_mode & 0o7777)
+        except FileNotFoundError:
+            os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_bytes(path, data, mode=0o644):
+    """Write `data` to `path` through atomic_writer()."""
+    with atomic_writer(path, mode) as f:
+        f.write(data)
+
+
+def _rewrite_worker(path, rules, relpath):
+    start = time.perf_counter()
+    try:
+        with open(path, 'rb') as f:
+            before = f.read()
+    except FileNotFoundError:
+        return 'missing', None, None, None, time.perf_counter() - start
+    result = rules.rewrite(before.decode('utf-8'), relpath)
+    after = result.text.encode('utf-8') if result.changed else before
+    if result.changed:
+        atomic_write_bytes(path, after)
+    return ('patched' if result.changed else 'unchanged'), result, before, after, time.perf_counter() - start
+
+
+def rewrite_file(manifest, rules, relpath):
+    """Patch a single file on the calling thread. Returns a FileReport."""
+    if manifest.is_fresh(relpath):
+        return FileReport(relpath, 'fresh')
+    status, result, before, after, seconds = _rewrite_worker(manifest.abspath(relpath), rules, relpath)
+    if result is not None:
+        manifest.record(relpath, before, after, verified=result.verified)
+    return FileReport(relpath, status, result, seconds)
+
+
+def expand_targets(site_pkg, rules, patterns):
+    """Expand site-packages-relative globs / files / directories into relpaths
+    that have at least one rule in scope. Directories are walked recursively."""
+    found = []
+    seen = set()
+
+    def add(relpath):
+        if relpath not in seen and rules.rules_for(relpath):
+            seen.add(relpath)
+            found.append(relpath)
+
+    for pattern in patterns:
+        abs_pattern = os.path.join(site_pkg, *pattern.split('/'))
+        if os.path.isdir(abs_pattern):
+            for root, dirs, files in os.walk(abs_pattern):
+                dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+                for name in sorted(files):
+                    if name.endswith('.py'):
+                        add(os.path.relpath(os.path.join(root, name), site_pkg).replace(os.sep, '/'))
+            continue
+        for path in sorted(glob.glob(abs_pattern)):
+            if os.path.isfile(path):
+                add(os.path.relpath(path, site_pkg).replace(os.sep, '/'))
+    return found
+
+
+def patch_tree(manifest, rules, relpaths, workers=None):
+    """Patch `relpaths` on a thread pool. Returns FileReports in input order."""
+    reports = {}
+    pending = []
+    for relpath in relpaths:
+        if manifest.is_fresh(relpath):
+            reports[relpath] = FileReport(relpath, 'fresh')
+        else:
+            pending.append(relpath)
+
+    if pending:
+        workers = workers or min(32, (os.cpu_count() or 1) + 4, len(pending))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                relpath: pool.submit(_rewrite_worker, manifest.abspath(relpath), rules, relpath)
+                for relpath in pending
+            }
+            for relpath, future in futures.items():
+                try:
+                    status, result, before, after, seconds = future.result()
+                except (OSError, UnicodeDecodeError) as e:
+                    reports[relpath] = FileReport(relpath, 'error', error=str(e))
+                    continue
+                if result is not None:
+                    manifest.record(relpath, before, after, verified=result.verified)
+                reports[relpath] = FileReport(relpath, status, result, seconds)
+
+    return [reports[r] for r in relpaths]
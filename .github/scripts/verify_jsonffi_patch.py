@@ -3,23 +3,18 @@ import os
 import sys
 from pathlib import Path
 
+from jsonffi_locator import find_jsonffi_sources
+from marker_search import DEFAULT_MARKERS, first_marker, search_files
+
 
 REPO_ROOT = Path(__file__).resolve().parents[2]
 
 
 def find_candidate_files():
-    candidates = []
-    # Search common site-packages/sys.prefix layout (text files in package sources)
+    # site-packages and sys.prefix in one pruned, cached walk (site-packages lives
+    # inside sys.prefix, so it is not walked twice)
     site_pkg = Path(sys.prefix) / 'lib' / f'python{sys.version_info.major}.{sys.version_info.minor}' / 'site-packages'
-    for root_dir, dirs, files in os.walk(site_pkg):
-        for name in files:
-            if name == 'json_ffi_engine.cc':
-                candidates.append(os.path.join(root_dir, name))
-    # Also scan entire sys.prefix for any copies (venv layouts vary)
-    for root_dir, dirs, files in os.walk(sys.prefix):
-        for name in files:
-            if name == 'json_ffi_engine.cc':
-                candidates.append(os.path.join(root_dir, name))
+    candidates = find_jsonffi_sources([str(site_pkg), sys.prefix])
     # Repo-local fallback (mlc-llm-source or .github/patches)
     local1 = REPO_ROOT / 'mlc-llm-source' / 'cpp' / 'json_ffi' / 'json_ffi_engine.cc'
     local2 = REPO_ROOT / '.github' / 'patches' / 'json_ffi_engine.cc'
@@ -38,24 +33,15 @@ def find_candidate_files():
     seen = set()
     res = []
     for p in candidates:
-        if p and p not in seen:
-            seen.add(p)
+        key = os.path.realpath(p) if p else p
+        if p and key not in seen:
+            seen.add(key)
             res.append(p)
     return res
 
 
 def check_marker_in_file(path, markers=None):
-    if markers is None:
-        markers = ['jsonffi_contains_replacement', 'MLCJSONFFIEngineForceLink_v1']
-    try:
-        with open(path, 'r', encoding='utf-8', errors='replace') as fh:
-            data = fh.read()
-            for m in markers:
-                if m in data:
-                    return m
-    except Exception:
-        return None
-    return None
+    return first_marker(path, tuple(markers or DEFAULT_MARKERS))
 
 
 def main():
@@ -75,8 +61,10 @@ def main():
     for p in found:
         print(' -', p)
 
+    # all candidates are searched in one parallel, memory-mapped pass up front
+    results = search_files(found, DEFAULT_MARKERS, stop_when_all_found=True)
     any_ok = False
-    for p in found:
+    for p, result in zip(found, results):
         print('\n--- Inspecting file:', p, '---')
         try:
             with open(p, 'r', encoding='utf-8', errors='replace') as fh:
@@ -86,9 +74,14 @@ def main():
                     print(l.rstrip())
         except Exception as e:
             print('  read failed:', e)
-        marker_found = check_marker_in_file(p)
+        hits = {}
+        for h in result['hits']:
+            hits.setdefault(h['marker'], h)
+        marker_found = next((m for m in DEFAULT_MARKERS if m in hits), None)
         if marker_found:
-            print(f'🔍 Verification OK: marker "{marker_found}" found in: {p}')
+            hit = hits[marker_found]
+            print(f'🔍 Verification OK: marker "{marker_found}" found in: {p} '
+                  f'(line {hit["line"]}, offset {hit["offset"]})')
             any_ok = True
         else:
             print('Marker not found in:', p)
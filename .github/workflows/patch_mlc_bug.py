@@ -7,20 +7,15 @@ Fixes: "cannot make const for type bool" error during iOS compilation
 import site
 import os
 import re
+import sys
 
-def main():
-    site_packages = site.getsitepackages()[0]
-    buggy_file = os.path.join(site_packages, "mlc_llm", "op", "batch_spec_verify.py")
-    
-    if not os.path.exists(buggy_file):
-        print(f"File not found: {buggy_file}")
-        return
-    
-    print(f"Patching: {buggy_file}")
-    
-    with open(buggy_file, "r") as f:
-        content = f.read()
-    
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "scripts"))
+from patch_manifest import PatchManifest, file_version
+
+RELPATH = "mlc_llm/op/batch_spec_verify.py"
+
+
+def patch_content(content):
     print("=== Before patch (relevant lines) ===")
     for i, line in enumerate(content.split('\n'), 1):
         if 'alloc_buffer' in line or 'done[' in line:
@@ -37,13 +32,29 @@ def main():
     content = re.sub(r'done\[0\]\s*=\s*False', 'done[0] = 0', content)
     content = re.sub(r'done\[0\]\s*=\s*True', 'done[0] = 1', content)
     
-    with open(buggy_file, "w") as f:
-        f.write(content)
-    
     print("\n=== After patch (relevant lines) ===")
     for i, line in enumerate(content.split('\n'), 1):
         if 'alloc_buffer' in line or 'done[' in line:
             print(f"{i}: {line}")
+    return content
+
+
+def main():
+    site_packages = site.getsitepackages()[0]
+    manifest = PatchManifest(site_packages, "workflows_patch_mlc_bug", file_version(__file__))
+    buggy_file = manifest.abspath(RELPATH)
+    
+    if manifest.is_fresh(RELPATH):
+        print(f"Already patched (manifest match, skipped): {buggy_file}")
+        return
+    
+    if not os.path.exists(buggy_file):
+        print(f"File not found: {buggy_file}")
+        return
+    
+    print(f"Patching: {buggy_file}")
+    manifest.patch(RELPATH, patch_content)
+    manifest.save()
     
     print("\nPatch applied successfully!")
 